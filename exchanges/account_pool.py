@@ -0,0 +1,148 @@
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_lock = threading.Lock()
+_pools = {}
+_leases = {}
+
+
+@dataclass(frozen=True)
+class Credentials:
+    api_key: str
+    secret: str
+
+
+class AccountLease:
+    """
+    One sub-account held by this process until `release`, or until the process exits.
+    """
+
+    def __init__(self, pool: "AccountPool", credentials: Credentials, fd: int = None) -> None:
+        self.pool = pool
+        self.venue = pool.venue
+        self.credentials = credentials
+        self._fd = fd
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self.pool._release(self.credentials)
+
+
+class AccountPool:
+    """
+    Sub-account credentials of one exchange, each leased to one process at a time.
+
+    A lease is an exclusive flock on the lock file of the sub-account in `directory`, so the worker processes of a
+    parallel run never trade on the same sub-account and a crashed worker frees its sub-account with its process.
+    Without fcntl the leases only exclude the threads of one process.
+    """
+
+    def __init__(self, venue: str, accounts: list, directory: str, timeout: float = 600) -> None:
+        self.venue = venue
+        self.accounts = accounts
+        self.directory = directory
+        self.timeout = timeout
+        self._held = set()
+        self._lock = threading.Lock()
+
+    def lease(self) -> AccountLease:
+        """
+        Leases the first free sub-account, waiting up to `timeout` seconds for one.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            for credentials in self.accounts:
+                lease = self._try_lease(credentials)
+                if lease is not None:
+                    print("Leased {} sub-account {}".format(self.venue, credentials.api_key[:6]))
+                    return lease
+            if time.monotonic() > deadline:
+                raise TimeoutError("No free {} sub-account within {}s".format(self.venue, self.timeout))
+            time.sleep(0.2)
+
+    def _try_lease(self, credentials: Credentials) -> AccountLease:
+        with self._lock:
+            if credentials in self._held:
+                return None
+            fd = None
+            if fcntl is not None:
+                fd = os.open(self._path(credentials), os.O_RDWR | os.O_CREAT, 0o600)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    os.close(fd)
+                    return None
+            self._held.add(credentials)
+            return AccountLease(self, credentials, fd)
+
+    def _release(self, credentials: Credentials) -> None:
+        with self._lock:
+            self._held.discard(credentials)
+
+    def _path(self, credentials: Credentials) -> str:
+        # The key names the file without being written to disk
+        digest = hashlib.sha1(credentials.api_key.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.directory, "{}.{}.lease".format(self.venue, digest))
+
+
+def pool_accounts(config: dict, venue: str) -> list:
+    """
+    Returns the sub-account credentials of `venue` listed under `<venue>Api.subAccounts` in config.
+    """
+    api_config = (config or {}).get("{}Api".format(venue)) or {}
+    return [Credentials(x["apiKey"], x["secretKey"]) for x in api_config.get("subAccounts") or []
+            if x and x.get("apiKey")]
+
+
+def get_account_pool(config: dict, venue: str) -> AccountPool:
+    """
+    Returns the process wide pool of `venue`, None when config lists no sub-accounts for it.
+    """
+    with _lock:
+        if venue not in _pools:
+            accounts = pool_accounts(config, venue)
+            pool_config = (config or {}).get("accountPool") or {}
+            _pools[venue] = AccountPool(venue, accounts, pool_config.get("path", "../account-leases"),
+                                        pool_config.get("timeout", 600)) if accounts else None
+        return _pools[venue]
+
+
+def lease_account(config: dict, venue: str) -> Credentials:
+    """
+    Returns the sub-account of `venue` leased to this process, leasing one on first use. None without a pool.
+    """
+    pool = get_account_pool(config, venue)
+    if pool is None:
+        return None
+    with _lock:
+        lease = _leases.get(venue)
+    if lease is None:
+        lease = pool.lease()
+        with _lock:
+            _leases[venue] = lease
+    return lease.credentials
+
+
+def release_accounts() -> list:
+    """
+    Gives the sub-accounts leased by this process back to their pools and returns their venues. Clients and cached
+    settings of those venues belong to the released sub-account and must be dropped by the caller.
+    """
+    with _lock:
+        leases = list(_leases.values())
+        _leases.clear()
+    for lease in leases:
+        lease.release()
+    return [x.venue for x in leases]
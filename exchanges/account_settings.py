@@ -0,0 +1,72 @@
+import threading
+from dataclasses import dataclass, field
+
+ISOLATED = "isolated"
+CROSS = "cross"
+
+_lock = threading.Lock()
+_cache = None
+
+
+@dataclass
+class SymbolSettings:
+    margin_mode: str
+    buy_leverage: int
+    sell_leverage: int
+
+
+@dataclass
+class AccountSettings:
+    hedged: bool
+    symbols: dict = field(default_factory=dict)
+
+    def symbol(self, symbol: str) -> SymbolSettings:
+        # A missing symbol was not read, so it can not be told apart from the defaults
+        settings = self.symbols.get(symbol)
+        if settings is None:
+            raise KeyError("No account settings read for {}".format(symbol))
+        return settings
+
+
+class AccountSettingsCache:
+    """
+    Last known position mode, margin modes and leverages of every exchange account.
+
+    The settings are read from the exchange once and then kept in sync by the caller after every change it makes, so
+    restoring the defaults only costs calls for what really differs. Tests changing settings by hand must invalidate
+    the entry of their exchange.
+    """
+
+    def __init__(self) -> None:
+        self._settings = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, reader) -> AccountSettings:
+        """
+        Returns the cached settings of `key`, calling `reader()` to read them from the exchange on a miss.
+        """
+        with self._lock:
+            settings = self._settings.get(key)
+        if settings is None:
+            settings = reader()
+            with self._lock:
+                self._settings[key] = settings
+        return settings
+
+    def invalidate(self, key: str = None) -> None:
+        with self._lock:
+            if key is None:
+                self._settings.clear()
+            else:
+                self._settings.pop(key, None)
+
+
+def get_settings_cache() -> AccountSettingsCache:
+    """
+    Returns the process wide account settings cache.
+    """
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = AccountSettingsCache()
+        return _cache
@@ -0,0 +1,169 @@
+import os
+import shutil
+import time
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+from exchanges.klines import INTERVALS_MS, SOURCES, KlineSeries, KlineStore, fetch_klines
+
+# Directory of the finished chunks of a series, next to its columns in the store
+CHECKPOINTS = "backfill"
+
+
+@dataclass
+class BackfillResult:
+    exchange: str
+    symbol: str
+    interval: str
+    chunks: int = 0
+    resumed: int = 0
+    fetched: int = 0
+    requests: int = 0
+    bars: int = 0
+    failed: list = field(default_factory=list)
+
+
+def plan_chunks(store: KlineStore, exchange: str, symbol: str, interval: str, start_ms: int, end_ms: int) -> list:
+    """
+    Splits [start_ms, end_ms] into (start, end) windows of one page of bars each, leaving out the windows whose bars
+    are all stored already. The window of the last stored bar is fetched again, the bar was possibly still open when
+    it was stored (as in update_klines). Windows are aligned to multiples of the page span, so a window and its
+    checkpoint are the same whatever the start and end of a run are, only the first and the last window are cut to the
+    range.
+    """
+    interval_ms = INTERVALS_MS[interval]
+    page_ms = SOURCES[exchange].max_limit * interval_ms
+    stored = store.load(exchange, symbol, interval, start_ms, end_ms).open_time
+    last = store.last_open_time(exchange, symbol, interval)
+
+    chunks = []
+    chunk_start = start_ms - start_ms % interval_ms
+    while chunk_start <= end_ms:
+        chunk_end = min(end_ms, chunk_start - chunk_start % page_ms + page_ms - interval_ms)
+        expected = (chunk_end - chunk_start) // interval_ms + 1
+        if (bisect_right(stored, chunk_end) - bisect_left(stored, chunk_start) < expected
+                or last is not None and chunk_start <= last <= chunk_end):
+            chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end + interval_ms
+    return chunks
+
+
+class Backfill:
+    """
+    Fetches long kline histories as one page sized chunks, concurrently. `get` is expected to go through the rate
+    limits of the exchanges (exchanges/rate_limit.py), the workers then share the budget of every exchange.
+
+    Chunks complete in any order, each one is saved as its own checkpoint file first. Once every chunk of a series is
+    done they are stitched in open time order, deduplicated against the stored bars and written to the store in one
+    go. After a crash a backfill of the series skips the checkpointed chunks and only fetches the missing ones, a
+    rerun up to a later end (now) fetches the last chunk again as it grew. A chunk whose last bar is still open is
+    kept in memory for the stitch instead of being checkpointed, a rerun fetches it again with the bar closed.
+    """
+
+    def __init__(self, store: KlineStore, get, workers: int = 16, retries: int = 2) -> None:
+        self.store = store
+        self.get = get
+        self.workers = workers
+        self.retries = retries
+        # Chunks with a bar still open by result id, stitched but never checkpointed
+        self._open = {}
+
+    def run(self, series: list, end_ms: int = None) -> list:
+        """
+        Backfills (exchange, symbol, interval, start_ms) series up to `end_ms`, now by default, and returns a
+        BackfillResult per series.
+        """
+        end_ms = end_ms if end_ms is not None else int(time.time() * 1000)
+        results = []
+        queues = []
+        self._open.clear()
+        for exchange, symbol, interval, start_ms in series:
+            result = BackfillResult(exchange, symbol, interval)
+            checkpoints = self._checkpoints(result)
+            chunks = plan_chunks(self.store, exchange, symbol, interval, start_ms, end_ms)
+            result.chunks = len(chunks)
+            pending = [x for x in chunks if not os.path.exists(self._chunk_path(checkpoints, x))]
+            result.resumed = len(chunks) - len(pending)
+            results.append(result)
+            queues.append([(result, chunk) for chunk in pending])
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="backfill") as executor:
+            # Interleave the exchanges, so every rate limit is kept busy instead of the workers queueing on one
+            futures = {executor.submit(self._fetch, result, chunk): (result, chunk)
+                       for result, chunk in _round_robin(queues)}
+            for future in as_completed(futures):
+                result, chunk = futures[future]
+                try:
+                    requests, series = future.result()
+                    result.requests += requests
+                    result.fetched += 1
+                    if series is not None:
+                        self._open.setdefault(id(result), []).append(series)
+                except Exception as e:
+                    print("{} {} {} chunk {} failed: {}".format(result.exchange, result.symbol, result.interval,
+                                                                chunk, e))
+                    result.failed.append(chunk)
+
+        for result in results:
+            if not result.failed:
+                result.bars = self._stitch(result)
+        return results
+
+    def _fetch(self, result: BackfillResult, chunk: tuple) -> tuple:
+        """
+        Fetches a chunk and checkpoints it. Returns the number of requests, with the series when its last bar was
+        still open and it is not checkpointed.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                series, requests = fetch_klines(self.get, result.exchange, result.symbol, result.interval, *chunk)
+                break
+            except Exception:
+                if attempt == self.retries:
+                    raise
+                time.sleep(attempt + 1)
+
+        if chunk[1] + INTERVALS_MS[result.interval] > time.time() * 1000:
+            return requests, series
+
+        checkpoints = self._checkpoints(result)
+        os.makedirs(checkpoints, exist_ok=True)
+        path = self._chunk_path(checkpoints, chunk)
+        with open(path + ".tmp", "wb") as stream:
+            series.tofile(stream)
+        os.replace(path + ".tmp", path)
+        return requests, None
+
+    def _stitch(self, result: BackfillResult) -> int:
+        checkpoints = self._checkpoints(result)
+        series = KlineSeries()
+        if os.path.isdir(checkpoints):
+            # A grown last chunk sorts after its earlier checkpoint, its bars win
+            for name in sorted((x for x in os.listdir(checkpoints) if x.endswith(".bin")), key=_chunk_bounds):
+                with open(os.path.join(checkpoints, name), "rb") as stream:
+                    series = series.merge(KlineSeries.fromfile(stream))
+        for chunk in self._open.pop(id(result), []):
+            series = series.merge(chunk)
+        self.store.write(result.exchange, result.symbol, result.interval, series)
+        if os.path.isdir(checkpoints):
+            shutil.rmtree(checkpoints)
+        return len(series)
+
+    def _checkpoints(self, result: BackfillResult) -> str:
+        return os.path.join(self.store.path(result.exchange, result.symbol, result.interval), CHECKPOINTS)
+
+    @staticmethod
+    def _chunk_path(checkpoints: str, chunk: tuple) -> str:
+        return os.path.join(checkpoints, "{}-{}.bin".format(*chunk))
+
+
+def _chunk_bounds(name: str) -> tuple:
+    return tuple(int(x) for x in name[:-len(".bin")].split("-"))
+
+
+def _round_robin(queues: list):
+    for index in range(max((len(x) for x in queues), default=0)):
+        for queue in queues:
+            if index < len(queue):
+                yield queue[index]
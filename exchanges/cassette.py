@@ -0,0 +1,176 @@
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import threading
+from urllib.parse import parse_qsl, urlsplit
+
+from requests import Response
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError
+from requests.structures import CaseInsensitiveDict
+
+RECORD = "record"
+REPLAY = "replay"
+
+# Parameters which change on every call without changing its meaning, the BTCEX chart bounds follow the clock
+IGNORED_PARAMS = {"signature", "sign", "timestamp", "recvWindow", "recv_window", "expiry", "nonce",
+                  "newClientOrderId", "clOrdID", "orderLinkId", "start_timestamp", "end_timestamp"}
+
+# Headers which do not describe the recorded body anymore, requests already decoded it
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "set-cookie"}
+
+_lock = threading.Lock()
+_cassettes = {}
+
+
+class Cassette:
+    """
+    On-disk recording of HTTP interactions, one gzip compressed JSON file per host.
+
+    Interactions are indexed by a hash of method, host, path and the normalized query / body parameters, so replay is a
+    dict lookup. Signatures, timestamps and random client order ids are left out of the hash. Repeated calls with the
+    same hash are replayed in the recorded order, the last one is served again once they run out.
+    """
+
+    def __init__(self, directory: str, mode: str) -> None:
+        self.directory = directory
+        self.mode = mode
+        self._interactions = {}
+        self._cursors = {}
+        self._loaded = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(method: str, url: str, body=None) -> str:
+        parts = urlsplit(url)
+        params = dict(parse_qsl(parts.query, keep_blank_values=True))
+        params.update(_body_params(body))
+        normalized = "&".join("{}={}".format(name, params[name]) for name in sorted(params)
+                              if name not in IGNORED_PARAMS)
+        identity = "{} {}{}?{}".format(method.upper(), parts.netloc, parts.path, normalized)
+        return hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+    def record(self, request, response: Response) -> None:
+        host = urlsplit(request.url).netloc
+        entry = {
+            "method": request.method,
+            "url": request.url,
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": {name: value for name, value in response.headers.items()
+                        if name.lower() not in DROPPED_HEADERS},
+            "body": response.content.decode("utf-8", errors="replace"),
+        }
+        with self._lock:
+            self._host(host).setdefault(self.key(request.method, request.url, request.body), []).append(entry)
+
+    def play(self, request) -> dict:
+        host = urlsplit(request.url).netloc
+        key = self.key(request.method, request.url, request.body)
+        with self._lock:
+            entries = self._host(host).get(key)
+            if not entries:
+                return None
+            cursor = self._cursors.get(key, 0)
+            self._cursors[key] = cursor + 1
+            return entries[min(cursor, len(entries) - 1)]
+
+    def save(self) -> None:
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            for host, interactions in self._interactions.items():
+                with gzip.open(self._path(host), "wt", encoding="utf-8") as stream:
+                    json.dump({"version": 1, "host": host, "interactions": interactions}, stream,
+                              separators=(",", ":"))
+
+    def _host(self, host: str) -> dict:
+        if host not in self._loaded:
+            self._loaded.add(host)
+            self._interactions[host] = {}
+            if self.mode == REPLAY and os.path.exists(self._path(host)):
+                with gzip.open(self._path(host), "rt", encoding="utf-8") as stream:
+                    self._interactions[host] = json.load(stream)["interactions"]
+        return self._interactions[host]
+
+    def _path(self, host: str) -> str:
+        return os.path.join(self.directory, "{}.json.gz".format(host.replace(":", "_")))
+
+
+class CassetteAdapter(HTTPAdapter):
+    """
+    Transport adapter of a requests session which records every interaction to, or replays it from, a cassette.
+    Recorded calls are sent by the adapter it wraps, with its connection pool.
+    """
+
+    def __init__(self, cassette: Cassette, adapter: HTTPAdapter = None) -> None:
+        super().__init__()
+        self.cassette = cassette
+        self.adapter = adapter or HTTPAdapter()
+
+    def send(self, request, **kwargs) -> Response:
+        if self.cassette.mode == REPLAY:
+            entry = self.cassette.play(request)
+            if entry is None:
+                raise ConnectionError("No recorded interaction for {} {}".format(request.method, request.url),
+                                      request=request)
+            return self._response(request, entry)
+
+        response = self.adapter.send(request, **kwargs)
+        self.cassette.record(request, response)
+        return response
+
+    def close(self) -> None:
+        self.adapter.close()
+
+    @staticmethod
+    def _response(request, entry: dict) -> Response:
+        response = Response()
+        response.status_code = entry["status"]
+        response.reason = entry["reason"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response._content = entry["body"].encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+
+def get_cassette(directory: str, mode: str) -> Cassette:
+    """
+    Returns the process wide cassette of `directory`. A recording cassette is saved when the process exits.
+    """
+    directory = os.path.abspath(directory)
+    with _lock:
+        if directory not in _cassettes:
+            cassette = _cassettes[directory] = Cassette(directory, mode)
+            if mode == RECORD:
+                atexit.register(cassette.save)
+        return _cassettes[directory]
+
+
+def install_cassette(session, cassette: Cassette) -> None:
+    """
+    Mounts the cassette on every url of a requests session around the adapter mounted there (e.g. the pooled one of
+    the public client), unless it is already mounted under the rate limits or the call timer.
+    """
+    for prefix in ("http://", "https://"):
+        wrapper = session.get_adapter(prefix)
+        while wrapper is not None and not isinstance(wrapper, CassetteAdapter):
+            wrapper = getattr(wrapper, "adapter", None)
+        if wrapper is None:
+            session.mount(prefix, CassetteAdapter(cassette, session.get_adapter(prefix)))
+
+
+def _body_params(body) -> dict:
+    if not body:
+        return {}
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="replace")
+    if body.lstrip().startswith("{"):
+        try:
+            return {name: json.dumps(value, sort_keys=True) for name, value in json.loads(body).items()}
+        except ValueError:
+            return {"": body}
+    return dict(parse_qsl(body, keep_blank_values=True))
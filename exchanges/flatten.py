@@ -0,0 +1,118 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_lock = threading.Lock()
+_executor = None
+
+
+def flatten_binance(exchange) -> None:
+    """
+    Cancels every open order and closes every position of a Binance USDT-M account.
+
+    Open orders and positions of all symbols are read with one call each, the cancels and reduce-only closes are sent
+    concurrently and one final round-trip verifies the account is flat.
+    """
+    open_orders, positions = _gather([exchange.fapiPrivateGetOpenOrders, exchange.fapiPrivateV2GetPositionRisk])
+
+    calls = [_call(exchange.fapiPrivateDeleteAllOpenOrders, {"symbol": symbol})
+             for symbol in sorted({x["symbol"] for x in open_orders})]
+    for position in positions:
+        amount = float(position["positionAmt"])
+        if amount == 0:
+            continue
+
+        request = {"symbol": position["symbol"],
+                   "side": "SELL" if amount > 0 else "BUY",
+                   "type": "MARKET",
+                   "quantity": position["positionAmt"].lstrip("-")}
+        if position.get("positionSide", "BOTH") == "BOTH":
+            request["reduceOnly"] = "true"
+        else:
+            request["positionSide"] = position["positionSide"]
+        calls.append(_call(exchange.fapiPrivatePostOrder, request))
+    _gather(calls)
+
+    open_orders, positions = _gather([exchange.fapiPrivateGetOpenOrders, exchange.fapiPrivateV2GetPositionRisk])
+    _verify(open_orders, [x for x in positions if float(x["positionAmt"]) != 0])
+
+
+def flatten_bybit(client, category: str = "linear", settle_coin: str = "USDT") -> None:
+    """
+    Cancels every open order and closes every position of a Bybit account, settle coin wide.
+    """
+    _, positions = _gather([_call(client.cancel_all_orders, category=category, settleCoin=settle_coin),
+                            _call(client.get_positions, category=category, settleCoin=settle_coin)])
+
+    _gather([_call(client.place_order,
+                   category=category,
+                   symbol=position["symbol"],
+                   orderType="Market",
+                   side="Sell" if position["side"] == "Buy" else "Buy",
+                   qty=position["size"],
+                   positionIdx=position["positionIdx"],
+                   reduceOnly=True)
+             for position in positions["result"]["list"] if float(position["size"]) != 0])
+
+    open_orders, positions = _gather([_call(client.get_open_orders, category=category, settleCoin=settle_coin),
+                                      _call(client.get_positions, category=category, settleCoin=settle_coin)])
+    _verify(open_orders["result"]["list"], [x for x in positions["result"]["list"] if float(x["size"]) != 0])
+
+
+def flatten_phemex(exchange, symbols: list) -> None:
+    """
+    Cancels every active and untriggered order and closes every position of `symbols` on a Phemex USDT-M account.
+    """
+    calls = [_call(exchange.fetch_positions, symbols=symbols)]
+    for symbol in symbols:
+        calls.append(_call(exchange.cancel_all_orders, symbol))
+        calls.append(_call(exchange.cancel_all_orders, symbol, params={"untriggered": True}))
+    positions = _gather(calls)[0]
+
+    closes = []
+    for position in positions:
+        position_info = position["info"]
+        if position_info["side"] == "None":
+            continue
+
+        params = {"reduceOnly": True}
+        if position_info.get("posSide", "Merged") != "Merged":
+            params = {"posSide": position_info["posSide"]}
+        closes.append(_call(exchange.create_order,
+                            symbol=position_info["symbol"],
+                            type="market",
+                            side="Sell" if position_info["side"] == "Buy" else "Buy",
+                            amount=position_info["size"],
+                            params=params))
+    _gather(closes)
+
+    results = _gather([_call(exchange.fetch_positions, symbols=symbols)] +
+                      [_call(exchange.fetch_open_orders, symbol) for symbol in symbols])
+    _verify([order for orders in results[1:] for order in orders],
+            [x for x in results[0] if x["info"]["side"] != "None"])
+
+
+def _call(function, *args, **kwargs):
+    return lambda: function(*args, **kwargs)
+
+
+def _gather(calls: list) -> list:
+    """
+    Runs the zero argument `calls` concurrently and returns their results in order, the first error is raised.
+    """
+    if len(calls) <= 1:
+        return [call() for call in calls]
+    futures = [_get_executor().submit(call) for call in calls]
+    return [future.result() for future in futures]
+
+
+def _verify(open_orders: list, positions: list) -> None:
+    if open_orders or positions:
+        raise Exception("Account is not flat, open orders: {}, positions: {}".format(open_orders, positions))
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="flatten")
+        return _executor
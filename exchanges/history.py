@@ -0,0 +1,273 @@
+import json
+import math
+import os
+import platform
+import sqlite3
+import subprocess
+import threading
+import time
+import uuid
+from importlib import metadata
+
+_lock = threading.Lock()
+_stores = {}
+
+RUN_ENV = "CRYPTO_TESTS_RUN_ID"
+PACKAGES = ("ccxt", "pybit", "requests", "aiohttp", "websockets")
+PERCENTILES = (50, 90, 99)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    kind TEXT NOT NULL,
+    target TEXT,
+    label TEXT,
+    created REAL NOT NULL,
+    git_sha TEXT,
+    versions TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    exchange TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    p50 REAL,
+    p90 REAL,
+    p99 REAL,
+    mean REAL,
+    samples TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_run ON results (run_id, exchange, operation);
+"""
+
+
+class HistoryStore:
+    """
+    SQLite store of the latencies of benchmark and test suite runs, kept to compare runs over time.
+
+    A run is one benchmark or one suite, with the git commit and the versions of the exchange libraries it ran with.
+    Its results are latency samples (ms) per exchange and operation, with their percentiles. A run may get the results
+    of one operation several times (per test, per worker process), they are merged when read. Processes of one run
+    find it by its key, e.g. the workers of a parallel run share the key in $CRYPTO_TESTS_RUN_ID.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._lock, self._connection:
+            self._connection.executescript(SCHEMA)
+
+    def start_run(self, kind: str, target: str = None, key: str = None, label: str = None) -> int:
+        """
+        Returns the id of the run with `key`, a new run when there is none (or no key).
+        """
+        key = key or new_run_key()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR IGNORE INTO runs (key, kind, target, label, created, git_sha, versions) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, kind, target, label, time.time(), git_sha(), json.dumps(versions())))
+            return self._connection.execute("SELECT id FROM runs WHERE key = ?", (key,)).fetchone()["id"]
+
+    def add(self, run_id: int, exchange: str, operation: str, samples: list, errors: int = 0) -> None:
+        """
+        Appends latency `samples` (seconds) of `operation` on `exchange` to a run.
+        """
+        milliseconds = [round(x * 1000, 3) for x in samples]
+        summary = summarize(milliseconds)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO results (run_id, exchange, operation, count, errors, p50, p90, p99, mean, samples) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, exchange, operation, len(milliseconds), errors, summary["p50"], summary["p90"],
+                 summary["p99"], summary["mean"], json.dumps(milliseconds)))
+
+    def runs(self, kind: str = None, limit: int = 20) -> list:
+        """
+        Returns the latest runs, newest first, as dicts.
+        """
+        query = ("SELECT runs.*, COUNT(results.run_id) AS results FROM runs "
+                 "LEFT JOIN results ON results.run_id = runs.id")
+        arguments = []
+        if kind is not None:
+            query += " WHERE kind = ?"
+            arguments.append(kind)
+        query += " GROUP BY runs.id ORDER BY runs.id DESC LIMIT ?"
+        with self._lock:
+            rows = self._connection.execute(query, arguments + [limit]).fetchall()
+        return [_run(x) for x in rows]
+
+    def run(self, run_id: int) -> dict:
+        with self._lock:
+            row = self._connection.execute("SELECT *, 0 AS results FROM runs WHERE id = ?", (run_id,)).fetchone()
+        if row is None:
+            raise KeyError("No run {} in {}".format(run_id, self.path))
+        return _run(row)
+
+    def results(self, run_id: int) -> dict:
+        """
+        Returns {(exchange, operation): {"samples": [...], "errors": n}} of a run, merged over its result rows.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT exchange, operation, errors, samples FROM results WHERE run_id = ?", (run_id,)).fetchall()
+        results = {}
+        for row in rows:
+            result = results.setdefault((row["exchange"], row["operation"]), {"samples": [], "errors": 0})
+            result["samples"].extend(json.loads(row["samples"]))
+            result["errors"] += row["errors"]
+        return results
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class RunRecorder:
+    """
+    Appends results to one run of the store in `path`, the run is created with the first results. Called like
+    HistoryStore.add without the run id, so it serves as the `history` of the call timer.
+    """
+
+    def __init__(self, path: str, kind: str, target: str = None, key: str = None, label: str = None) -> None:
+        self.path = path
+        self.kind = kind
+        self.target = target
+        self.key = key
+        self.label = label
+        self.run_id = None
+
+    def __call__(self, exchange: str, operation: str, samples: list, errors: int = 0) -> None:
+        store = get_history_store(self.path)
+        if self.run_id is None:
+            self.run_id = store.start_run(self.kind, self.target, self.key, self.label)
+        store.add(self.run_id, exchange, operation, samples, errors)
+
+
+def compare(baseline: dict, candidate: dict, alpha: float = 0.01, threshold: float = 0.1,
+            min_samples: int = 5) -> list:
+    """
+    Compares the results of two runs operation by operation. An operation regressed when its median latency grew by
+    more than `threshold` (0.1 is 10 %) and the Mann-Whitney U test rejects equal distributions at `alpha`, it
+    improved in the opposite case. Operations with fewer than `min_samples` samples in a run are not judged.
+    """
+    rows = []
+    for key in sorted(set(baseline) & set(candidate)):
+        before = baseline[key]["samples"]
+        after = candidate[key]["samples"]
+        row = {"exchange": key[0], "operation": key[1], "baselineCount": len(before), "candidateCount": len(after),
+               "baselineP50": percentile(sorted(before), 50), "candidateP50": percentile(sorted(after), 50),
+               "baselineP99": percentile(sorted(before), 99), "candidateP99": percentile(sorted(after), 99),
+               "change": None, "pValue": None, "verdict": "too few samples"}
+        if len(before) >= min_samples and len(after) >= min_samples:
+            row["pValue"] = mann_whitney_u(before, after)
+            if row["baselineP50"]:
+                row["change"] = round(row["candidateP50"] / row["baselineP50"] - 1, 4)
+            significant = row["pValue"] < alpha and row["change"] is not None and abs(row["change"]) > threshold
+            if not significant:
+                row["verdict"] = "unchanged"
+            else:
+                row["verdict"] = "regression" if row["change"] > 0 else "improvement"
+        rows.append(row)
+    return rows
+
+
+def mann_whitney_u(first: list, second: list) -> float:
+    """
+    Two-sided p-value of the Mann-Whitney U test of two samples, normal approximation with tie and continuity
+    correction. Latencies are skewed and have outliers, the test compares ranks instead of means.
+    """
+    n1, n2 = len(first), len(second)
+    ranked = sorted([(x, 0) for x in first] + [(x, 1) for x in second])
+    ranks = [0.0] * len(ranked)
+    ties = 0.0
+    i = 0
+    while i < len(ranked):
+        j = i
+        while j + 1 < len(ranked) and ranked[j + 1][0] == ranked[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        ties += (j - i + 1) ** 3 - (j - i + 1)
+        i = j + 1
+    u = sum(rank for rank, (_, group) in zip(ranks, ranked) if group == 0) - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (abs(u - n1 * n2 / 2) - 0.5) / math.sqrt(variance)
+    return min(1.0, math.erfc(max(z, 0.0) / math.sqrt(2)))
+
+
+def percentile(samples: list, percent: float) -> float:
+    """
+    Nearest-rank percentile of already sorted `samples`, None without samples.
+    """
+    if not samples:
+        return None
+    return samples[max(1, int(math.ceil(percent / 100 * len(samples)))) - 1]
+
+
+def summarize(samples: list) -> dict:
+    """
+    Returns count, p50/p90/p99, max and mean of latencies in milliseconds, None without samples. The benchmark prints
+    and the store keeps the same numbers.
+    """
+    ordered = sorted(samples)
+    summary = {"count": len(ordered)}
+    for percent in PERCENTILES:
+        summary["p{}".format(percent)] = round(percentile(ordered, percent), 3) if ordered else None
+    summary["max"] = round(ordered[-1], 3) if ordered else None
+    summary["mean"] = round(sum(ordered) / len(ordered), 3) if ordered else None
+    return summary
+
+
+def versions() -> dict:
+    """
+    Returns the versions of Python and of the installed exchange and HTTP libraries.
+    """
+    result = {"python": platform.python_version()}
+    for package in PACKAGES:
+        try:
+            result[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            pass
+    return result
+
+
+def git_sha() -> str:
+    try:
+        completed = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                                   timeout=5)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return completed.stdout.strip() or None
+
+
+def new_run_key() -> str:
+    return uuid.uuid4().hex
+
+
+def _run(row) -> dict:
+    run = dict(row)
+    run["versions"] = json.loads(run["versions"])
+    return run
+
+
+def get_history_store(path: str) -> HistoryStore:
+    """
+    Returns the history store of `path`, one connection per process.
+    """
+    path = os.path.abspath(path)
+    with _lock:
+        if path not in _stores:
+            _stores[path] = HistoryStore(path)
+        return _stores[path]
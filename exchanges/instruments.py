@@ -0,0 +1,275 @@
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from urllib.parse import urlsplit
+
+from exchanges.json_stream import dumps, find_object, iter_array, loads
+
+_lock = threading.Lock()
+_registry = None
+
+
+@dataclass(frozen=True)
+class Instrument:
+    """
+    Trading rules of one contract, normalized across the exchanges.
+    """
+    exchange: str
+    symbol: str
+    contract_type: str
+    settle_currency: str
+    tick_size: float
+    step_size: float
+    min_qty: float
+    max_qty: float
+    max_leverage: float = None
+    # Seconds between two funding payments
+    funding_interval: int = None
+    # Listing time, epoch milliseconds
+    listed: int = None
+
+
+@dataclass(frozen=True)
+class InstrumentSource:
+    """
+    Instrument list of one exchange: url, the arrays of the payload holding the contracts, a later array replacing
+    contracts of an earlier one, and the member naming a contract.
+    """
+    url: str
+    arrays: tuple
+    normalize: object
+    symbol_key: str = "symbol"
+
+
+def _filters(info: dict) -> dict:
+    return {x["filterType"]: x for x in info.get("filters", [])}
+
+
+def _int(value) -> int:
+    return int(value) if value not in (None, "") else None
+
+
+def binance_instrument(info: dict) -> Instrument:
+    filters = _filters(info)
+    lot_size = filters.get("LOT_SIZE", {})
+    return Instrument(
+        exchange="binance",
+        symbol=info["symbol"],
+        contract_type=info.get("contractType"),
+        settle_currency=info.get("marginAsset"),
+        tick_size=float(filters.get("PRICE_FILTER", {}).get("tickSize", 0)),
+        step_size=float(lot_size.get("stepSize", 0)),
+        min_qty=float(lot_size.get("minQty", 0)),
+        max_qty=float(lot_size.get("maxQty", 0)),
+        # Leverage brackets and funding intervals are not part of exchangeInfo
+        listed=_int(info.get("onboardDate")))
+
+
+def bybit_instrument(info: dict) -> Instrument:
+    lot_size = info["lotSizeFilter"]
+    return Instrument(
+        exchange="bybit",
+        symbol=info["symbol"],
+        contract_type=info.get("contractType"),
+        settle_currency=info.get("settleCoin"),
+        tick_size=float(info["priceFilter"]["tickSize"]),
+        step_size=float(lot_size["qtyStep"]),
+        min_qty=float(lot_size["minOrderQty"]),
+        max_qty=float(lot_size["maxOrderQty"]),
+        max_leverage=float(info["leverageFilter"]["maxLeverage"]),
+        # Published in minutes
+        funding_interval=(_int(info.get("fundingInterval")) or 0) * 60 or None,
+        listed=_int(info.get("launchTime")))
+
+
+def phemex_instrument(info: dict) -> Instrument:
+    if info.get("type") == "Perpetual":
+        step_size, max_qty = info["lotSize"], info["maxOrderQty"]
+    elif info.get("type") == "PerpetualV2" and "qtyStepSize" in info:
+        step_size, max_qty = info["qtyStepSize"], info["maxOrderQtyRq"]
+    else:
+        # The USDT perpetuals are listed again, with their full rules, under perpProductsV2
+        return None
+    return Instrument(
+        exchange="phemex",
+        symbol=info["symbol"],
+        contract_type=info["type"],
+        settle_currency=info.get("settleCurrency"),
+        tick_size=float(info["tickSize"]),
+        step_size=float(step_size),
+        min_qty=float(step_size),
+        max_qty=float(max_qty),
+        max_leverage=float(info["maxLeverage"]) if "maxLeverage" in info else None,
+        funding_interval=_int(info.get("fundingInterval")),
+        listed=_int(info.get("listTime")))
+
+
+def btcex_instrument(info: dict) -> Instrument:
+    return Instrument(
+        exchange="btcex",
+        symbol=info["instrument_name"],
+        contract_type=info.get("kind"),
+        settle_currency=info.get("base_currency"),
+        tick_size=float(info.get("tick_size", 0)),
+        step_size=float(info["min_qty"]),
+        min_qty=float(info["min_qty"]),
+        max_qty=None,
+        max_leverage=float(info["leverage"]) if "leverage" in info else None,
+        listed=_int(info.get("creation_timestamp")))
+
+
+# The urls are the ones the suites test against
+SOURCES = {
+    "binance": InstrumentSource("https://fapi.binance.com/fapi/v1/exchangeInfo", ("symbols",), binance_instrument),
+    # One page of 1000 holds every linear contract
+    "bybit": InstrumentSource("https://api-testnet.bybit.com/v5/market/instruments-info?category=linear&limit=1000",
+                              ("list",), bybit_instrument),
+    "phemex": InstrumentSource("https://testnet-api.phemex.com/public/products", ("products", "perpProductsV2"),
+                               phemex_instrument),
+    "btcex": InstrumentSource("https://api.btcex.com/api/v1/public/get_instruments?currency=PERPETUAL"
+                              "&base_currency=USDT", ("result",), btcex_instrument, symbol_key="instrument_name"),
+}
+
+
+class InstrumentRegistry:
+    """
+    Instrument list of every exchange, downloaded once and indexed by symbol.
+
+    The lists are cached in memory and in `directory` for `ttl` seconds, as compact records plus the payload as
+    received. An expired list is revalidated with If-None-Match / If-Modified-Since, a 304 answer keeps the cached
+    one for another `ttl`. The files are named by exchange and host, so lists and ETags of the simulator and of the
+    exchanges never stand in for each other. The payload is never decoded as a whole: the contracts are decoded one at
+    a time while they are normalized, and `info` decodes only the object of the requested contract.
+    `request(url, headers)` performs a GET and returns the requests response.
+    """
+
+    def __init__(self, request, directory: str = None, ttl: float = 3600, urls: dict = None) -> None:
+        self.request = request
+        self.directory = directory
+        self.ttl = ttl
+        self.urls = {exchange: source.url for exchange, source in SOURCES.items()}
+        self.urls.update(urls or {})
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def instrument(self, exchange: str, symbol: str) -> Instrument:
+        instrument = self.instruments(exchange).get(symbol)
+        if instrument is None:
+            raise KeyError("{} has no instrument {}".format(exchange, symbol))
+        return instrument
+
+    def instruments(self, exchange: str) -> dict:
+        return self._entry(exchange)["instruments"]
+
+    def info(self, exchange: str, symbol: str) -> dict:
+        """
+        Returns the record of `symbol` as the exchange publishes it.
+        """
+        entry = self._entry(exchange)
+        if entry.get("body") is None:
+            with open(self._path(exchange, "body"), encoding="utf-8") as stream:
+                entry["body"] = stream.read()
+
+        source = SOURCES[exchange]
+        for array in reversed(source.arrays):
+            info = find_object(entry["body"], source.symbol_key, symbol, after=array)
+            if info is not None:
+                return info
+        raise KeyError("{} has no instrument {}".format(exchange, symbol))
+
+    def invalidate(self, exchange: str = None) -> None:
+        with self._lock:
+            for name in [exchange] if exchange else list(self._cache):
+                self._cache.pop(name, None)
+                for kind in ("instruments", "body"):
+                    if self.directory and os.path.exists(self._path(name, kind)):
+                        os.remove(self._path(name, kind))
+
+    def _entry(self, exchange: str) -> dict:
+        with self._lock:
+            entry = self._cache.get(exchange)
+            if entry is None or entry["expires"] <= time.time():
+                entry = self._cache[exchange] = self._refresh(exchange, entry or self._read(exchange))
+            return entry
+
+    def _refresh(self, exchange: str, entry: dict) -> dict:
+        if entry is not None and entry["expires"] > time.time():
+            return entry
+
+        headers = {}
+        if entry is not None and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry is not None and entry.get("lastModified"):
+            headers["If-Modified-Since"] = entry["lastModified"]
+
+        response = self.request(self.urls[exchange], headers)
+        if response.status_code == 304 and entry is not None:
+            print("{} instruments not modified".format(exchange))
+            entry["expires"] = time.time() + self.ttl
+            self._write(exchange, entry)
+            return entry
+
+        response.raise_for_status()
+        body = response.content.decode("utf-8")
+        source = SOURCES[exchange]
+        instruments = {}
+        for array in source.arrays:
+            for info in iter_array(body, array):
+                instrument = source.normalize(info)
+                if instrument is not None:
+                    instruments[instrument.symbol] = instrument
+        entry = {"expires": time.time() + self.ttl,
+                 "etag": response.headers.get("ETag"),
+                 "lastModified": response.headers.get("Last-Modified"),
+                 "instruments": instruments,
+                 "body": body}
+        self._write(exchange, entry, body)
+        return entry
+
+    def _read(self, exchange: str) -> dict:
+        if not self.directory or not os.path.exists(self._path(exchange, "instruments")):
+            return None
+        with open(self._path(exchange, "instruments"), "rb") as stream:
+            entry = loads(stream.read())
+        entry["instruments"] = {x["symbol"]: Instrument(**x) for x in entry["instruments"]}
+        # Read on the first info call only
+        entry["body"] = None
+        return entry
+
+    def _write(self, exchange: str, entry: dict, body: str = None) -> None:
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        if body is not None:
+            self._replace(self._path(exchange, "body"), body)
+        document = {"expires": entry["expires"], "etag": entry["etag"], "lastModified": entry["lastModified"],
+                    "instruments": [asdict(x) for x in entry["instruments"].values()]}
+        self._replace(self._path(exchange, "instruments"), dumps(document))
+
+    @staticmethod
+    def _replace(path: str, text: str) -> None:
+        with open(path + ".tmp", "w", encoding="utf-8") as stream:
+            stream.write(text)
+        os.replace(path + ".tmp", path)
+
+    def _path(self, exchange: str, kind: str) -> str:
+        # The host only, the simulator listens on another port every run
+        host = urlsplit(self.urls[exchange]).hostname
+        return os.path.join(self.directory, "{}.{}.{}.json".format(exchange, host, kind))
+
+
+def get_instrument_registry(request, config: dict = None, urls: dict = None) -> InstrumentRegistry:
+    """
+    Returns the process wide instrument registry, built from the `instruments` config section and the instrument
+    `urls` in place of the exchange ones on first use.
+    """
+    global _registry
+    with _lock:
+        if _registry is None:
+            instruments_config = (config or {}).get("instruments") or {}
+            _registry = InstrumentRegistry(request,
+                                           directory=instruments_config.get("path"),
+                                           ttl=instruments_config.get("ttl", 3600),
+                                           urls=urls)
+        return _registry
@@ -0,0 +1,83 @@
+import json
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_decoder = json.JSONDecoder()
+
+
+def loads(data):
+    """
+    Decodes a whole JSON document, with orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value) -> str:
+    if orjson is not None:
+        return orjson.dumps(value).decode("utf-8")
+    return json.dumps(value, separators=(",", ":"))
+
+
+def iter_array(data: str, key: str):
+    """
+    Yields the elements of the first array stored under `key` in the JSON text `data`, one decoded element at a time.
+
+    Nothing around the array is decoded and only one element is alive at a time, so walking the symbol list of a
+    multi megabyte payload never holds more than the text itself and the current element.
+    """
+    match = re.search(r'"{}"\s*:\s*\['.format(re.escape(key)), data)
+    if match is None:
+        raise ValueError("No array {} in payload: {}".format(key, data[:200]))
+
+    index = _WHITESPACE.match(data, match.end()).end()
+    if data[index:index + 1] == "]":
+        return
+    while True:
+        element, index = _decoder.raw_decode(data, index)
+        yield element
+        index = _WHITESPACE.match(data, index).end()
+        if data[index:index + 1] == "]":
+            return
+        if data[index:index + 1] != ",":
+            raise ValueError("Malformed array {} at offset {}".format(key, index))
+        index = _WHITESPACE.match(data, index + 1).end()
+
+
+def find_object(data: str, key: str, value, after: str = None) -> dict:
+    """
+    Returns the first object of the JSON text `data` which has the member `key` equal to `value`, None if there is
+    none. With `after` the search starts at the member of that name.
+
+    The member is found with a plain text search and only the object around it is decoded: the nearest opening
+    brace before the match whose object spans the match and holds the member is the one.
+    """
+    start = 0
+    if after is not None:
+        match = re.search(r'"{}"\s*:'.format(re.escape(after)), data)
+        if match is None:
+            return None
+        start = match.end()
+
+    needle = re.compile(r'"{}"\s*:\s*{}(?=\s*[,}}])'.format(re.escape(key), re.escape(json.dumps(value))))
+    for match in needle.finditer(data, start):
+        brace = data.rfind("{", start, match.start())
+        while brace != -1:
+            try:
+                candidate, end = _decoder.raw_decode(data, brace)
+            except ValueError:
+                # A brace inside a string
+                candidate, end = None, brace
+            if end > match.start():
+                # The innermost object around the match, the outer ones are never decoded
+                if isinstance(candidate, dict) and candidate.get(key) == value:
+                    return candidate
+                break
+            brace = data.rfind("{", start, brace)
+    return None
@@ -0,0 +1,329 @@
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+
+from exchanges.order_book import PHEMEX_PRICE_SCALE
+
+INTERVALS_MS = {
+    "1m": 60 * 1000,
+    "5m": 5 * 60 * 1000,
+    "15m": 15 * 60 * 1000,
+    "1h": 60 * 60 * 1000,
+    "4h": 4 * 60 * 60 * 1000,
+    "1d": 24 * 60 * 60 * 1000,
+}
+
+# Column name and array typecode, open times are epoch milliseconds
+COLUMNS = (("open_time", "q"), ("open", "d"), ("high", "d"), ("low", "d"), ("close", "d"), ("volume", "d"))
+
+
+class KlineSeries:
+    """
+    Bars of one exchange / symbol / interval as contiguous columns, sorted by open time without duplicates.
+    """
+
+    __slots__ = tuple(name for name, _ in COLUMNS)
+
+    def __init__(self, columns: dict = None) -> None:
+        for name, typecode in COLUMNS:
+            setattr(self, name, (columns or {}).get(name, array(typecode)))
+
+    @classmethod
+    def from_rows(cls, rows) -> "KlineSeries":
+        """
+        Builds a series from (open_time, open, high, low, close, volume) rows in any order, the last duplicate wins.
+        """
+        unique = {}
+        for row in rows:
+            unique[int(row[0])] = row
+        series = cls()
+        for open_time in sorted(unique):
+            series._append(open_time, *unique[open_time][1:6])
+        return series
+
+    def __len__(self) -> int:
+        return len(self.open_time)
+
+    @property
+    def first_open_time(self) -> int:
+        return self.open_time[0] if self.open_time else None
+
+    @property
+    def last_open_time(self) -> int:
+        return self.open_time[-1] if self.open_time else None
+
+    def columns(self) -> dict:
+        return {name: getattr(self, name) for name, _ in COLUMNS}
+
+    def rows(self):
+        return zip(*(getattr(self, name) for name, _ in COLUMNS))
+
+    def between(self, start_ms: int = None, end_ms: int = None) -> "KlineSeries":
+        """
+        Returns the bars opened in [start_ms, end_ms].
+        """
+        first = bisect_left(self.open_time, start_ms) if start_ms is not None else 0
+        last = bisect_right(self.open_time, end_ms) if end_ms is not None else len(self)
+        return KlineSeries({name: column[first:last] for name, column in self.columns().items()})
+
+    def merge(self, other: "KlineSeries") -> "KlineSeries":
+        """
+        Returns the union of both series, bars of `other` replace bars of this series with the same open time.
+        """
+        if not other:
+            return self
+        if not self or other.first_open_time > self.last_open_time:
+            return KlineSeries({name: column + getattr(other, name) for name, column in self.columns().items()})
+        return KlineSeries.from_rows(list(self.rows()) + list(other.rows()))
+
+    def tofile(self, stream) -> None:
+        array("q", [len(self)]).tofile(stream)
+        for column in self.columns().values():
+            column.tofile(stream)
+
+    @classmethod
+    def fromfile(cls, stream) -> "KlineSeries":
+        rows = array("q")
+        rows.fromfile(stream, 1)
+        series = cls()
+        for column in series.columns().values():
+            column.fromfile(stream, rows[0])
+        return series
+
+    def _append(self, open_time: int, open_, high, low, close, volume) -> None:
+        self.open_time.append(open_time)
+        self.open.append(float(open_))
+        self.high.append(float(high))
+        self.low.append(float(low))
+        self.close.append(float(close))
+        self.volume.append(float(volume))
+
+    def __repr__(self) -> str:
+        return "KlineSeries(bars={}, first={}, last={})".format(len(self), self.first_open_time, self.last_open_time)
+
+
+class KlineStore:
+    """
+    On-disk kline store, one directory per exchange / symbol / interval with one raw binary file per column.
+
+    Columns are written with array.tofile and read back with array.fromfile, so loading a series is a plain read of
+    contiguous memory. Bars newer than the stored ones are appended to the column files, only out of order writes
+    rewrite a series. The last stored open time is read from the tail of the open time file, without loading it.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def path(self, exchange: str, symbol: str, interval: str) -> str:
+        return os.path.join(self.directory, exchange, symbol, interval)
+
+    def last_open_time(self, exchange: str, symbol: str, interval: str) -> int:
+        path = self.path(exchange, symbol, interval)
+        rows = self._rows(path)
+        if rows == 0:
+            return None
+        column = array("q")
+        with open(os.path.join(path, "open_time"), "rb") as stream:
+            stream.seek((rows - 1) * column.itemsize)
+            column.fromfile(stream, 1)
+        return column[0]
+
+    def load(self, exchange: str, symbol: str, interval: str, start_ms: int = None,
+             end_ms: int = None) -> KlineSeries:
+        path = self.path(exchange, symbol, interval)
+        with self._key_lock(path):
+            series = self._load(path)
+        return series.between(start_ms, end_ms) if start_ms is not None or end_ms is not None else series
+
+    def write(self, exchange: str, symbol: str, interval: str, series: KlineSeries) -> None:
+        """
+        Stores `series`, replacing stored bars with the same open time.
+        """
+        if not series:
+            return
+        path = self.path(exchange, symbol, interval)
+        with self._key_lock(path):
+            os.makedirs(path, exist_ok=True)
+            rows = self._rows(path)
+            last = self.last_open_time(exchange, symbol, interval)
+            if last is None or series.first_open_time > last:
+                self._append(path, series, rows)
+            elif series.first_open_time == last:
+                # The last stored bar was still open when it was fetched
+                self._append(path, series, rows - 1)
+            else:
+                self._rewrite(path, self._load(path).merge(series))
+
+    def _load(self, path: str) -> KlineSeries:
+        rows = self._rows(path)
+        columns = {}
+        for name, typecode in COLUMNS:
+            columns[name] = array(typecode)
+            if rows:
+                with open(os.path.join(path, name), "rb") as stream:
+                    columns[name].fromfile(stream, rows)
+        return KlineSeries(columns)
+
+    @staticmethod
+    def _rows(path: str) -> int:
+        """
+        Number of complete bars, a crash in the middle of an append leaves some columns longer than the others.
+        """
+        rows = None
+        for name, typecode in COLUMNS:
+            file = os.path.join(path, name)
+            size = os.path.getsize(file) if os.path.exists(file) else 0
+            count = size // array(typecode).itemsize
+            rows = count if rows is None else min(rows, count)
+        return rows
+
+    @staticmethod
+    def _append(path: str, series: KlineSeries, rows: int) -> None:
+        for name, column in series.columns().items():
+            file = os.path.join(path, name)
+            with open(file, "ab") as stream:
+                stream.truncate(rows * column.itemsize)
+                column.tofile(stream)
+
+    @staticmethod
+    def _rewrite(path: str, series: KlineSeries) -> None:
+        for name, column in series.columns().items():
+            file = os.path.join(path, name)
+            with open(file + ".tmp", "wb") as stream:
+                column.tofile(stream)
+            os.replace(file + ".tmp", file)
+
+    def _key_lock(self, path: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(path, threading.Lock())
+
+
+@dataclass(frozen=True)
+class KlineSource:
+    """
+    Public kline endpoint of one exchange: url, largest page and how to ask for and read a page. Symbols are the
+    BTCUSDT style names, `instrument` maps them to the name of the exchange where it differs.
+    """
+    url: str
+    max_limit: int
+    intervals: dict
+    params: object
+    convert: object
+    instrument: object = None
+
+    def request(self, symbol: str, interval: str, start_ms: int, end_ms: int, limit: int) -> dict:
+        instrument = self.instrument(symbol) if self.instrument is not None else symbol
+        return self.params(instrument, self.intervals[interval], start_ms, end_ms, limit)
+
+
+def binance_klines(response: list) -> KlineSeries:
+    """
+    Converts a Binance /fapi/v1/klines response, [open time, open, high, low, close, volume, ...] rows.
+    """
+    return KlineSeries.from_rows(response)
+
+
+def bybit_klines(response: dict) -> KlineSeries:
+    """
+    Converts a Bybit /v5/market/kline response, the rows under result.list are newest first.
+    """
+    return KlineSeries.from_rows(response["result"]["list"])
+
+
+def phemex_klines(response: dict, price_scale: float = PHEMEX_PRICE_SCALE) -> KlineSeries:
+    """
+    Converts a Phemex v2 kline response. The rows are [open time s, interval, last close, open, high, low, close,
+    volume, turnover] with Ep prices.
+    """
+    return KlineSeries.from_rows((row[0] * 1000, float(row[3]) / price_scale, float(row[4]) / price_scale,
+                                  float(row[5]) / price_scale, float(row[6]) / price_scale, row[7])
+                                 for row in response["data"]["rows"])
+
+
+def btcex_klines(response: dict) -> KlineSeries:
+    """
+    Converts a BTCEX tradingview chart data response, the bars are dicts with the open time in seconds as tick.
+    """
+    return KlineSeries.from_rows((int(bar["tick"]) * 1000, bar["open"], bar["high"], bar["low"], bar["close"],
+                                  bar["volume"])
+                                 for bar in response["result"])
+
+
+SOURCES = {
+    "binance": KlineSource(
+        url="https://fapi.binance.com/fapi/v1/klines",
+        # 1000 bars weigh 5, 1500 bars weigh 10, so pages of 1000 bars are the cheapest per bar
+        max_limit=1000,
+        intervals={name: name for name in INTERVALS_MS},
+        params=lambda symbol, interval, start_ms, end_ms, limit: {
+            "symbol": symbol, "interval": interval, "startTime": start_ms, "endTime": end_ms, "limit": limit},
+        convert=binance_klines),
+    "bybit": KlineSource(
+        url="https://api.bybit.com/v5/market/kline",
+        max_limit=1000,
+        intervals={"1m": "1", "5m": "5", "15m": "15", "1h": "60", "4h": "240", "1d": "D"},
+        params=lambda symbol, interval, start_ms, end_ms, limit: {
+            "category": "linear", "symbol": symbol, "interval": interval, "start": start_ms, "end": end_ms,
+            "limit": limit},
+        convert=bybit_klines),
+    "phemex": KlineSource(
+        url="https://api.phemex.com/exchange/public/md/v2/kline",
+        max_limit=1000,
+        intervals={name: interval_ms // 1000 for name, interval_ms in INTERVALS_MS.items()},
+        params=lambda symbol, interval, start_ms, end_ms, limit: {
+            "symbol": symbol, "resolution": interval, "from": start_ms // 1000, "to": end_ms // 1000,
+            "limit": limit},
+        convert=phemex_klines),
+    "btcex": KlineSource(
+        url="https://api.btcex.com/api/v1/public/get_tradingview_chart_data",
+        max_limit=1000,
+        intervals={"1m": "1", "5m": "5", "15m": "15", "1h": "60", "1d": "1D"},
+        params=lambda symbol, interval, start_ms, end_ms, limit: {
+            "instrument_name": symbol, "resolution": interval, "start_timestamp": start_ms // 1000,
+            "end_timestamp": end_ms // 1000},
+        convert=btcex_klines,
+        instrument=lambda symbol: "{}-{}-PERPETUAL".format(symbol[:-4], symbol[-4:])),
+}
+
+
+def fetch_klines(get, exchange: str, symbol: str, interval: str, start_ms: int, end_ms: int = None) -> tuple:
+    """
+    Fetches the bars of [start_ms, end_ms] page by page and returns them with the number of requests made.
+
+    `get(url, params)` returns the parsed JSON response. Every page asks for an explicit window of at most
+    `max_limit` bars, so the venues which fill a page backwards from the end time do not skip bars either.
+    """
+    source = SOURCES[exchange]
+    interval_ms = INTERVALS_MS[interval]
+    end_ms = end_ms if end_ms is not None else int(time.time() * 1000)
+    start_ms -= start_ms % interval_ms
+
+    series = KlineSeries()
+    requests = 0
+    while start_ms <= end_ms:
+        window_end = min(end_ms, start_ms + (source.max_limit - 1) * interval_ms)
+        page = source.convert(get(source.url, source.request(symbol, interval, start_ms, window_end,
+                                                             source.max_limit)))
+        requests += 1
+        series = series.merge(page.between(start_ms, window_end))
+        start_ms = window_end + interval_ms
+    return series, requests
+
+
+def update_klines(store: KlineStore, get, exchange: str, symbol: str, interval: str, since_ms: int,
+                  end_ms: int = None) -> tuple:
+    """
+    Brings a stored series up to date and returns the number of fetched bars and requests.
+
+    A series is fetched from `since_ms` the first time. Afterwards only the bars from the last stored one on are
+    fetched, the last stored bar is fetched again because it was possibly still open.
+    """
+    last = store.last_open_time(exchange, symbol, interval)
+    series, requests = fetch_klines(get, exchange, symbol, interval, last if last is not None else since_ms, end_ms)
+    store.write(exchange, symbol, interval, series)
+    return len(series), requests
@@ -0,0 +1,139 @@
+from array import array
+from bisect import bisect_left
+from operator import neg
+
+from exchanges.order_book import OrderBook
+
+
+class SequenceGap(Exception):
+    """
+    Raised when a diff does not follow the book it is applied to: diffs were lost and the book has to be rebuilt
+    from a fresh snapshot.
+    """
+
+
+class _Side:
+    """
+    One side of a book as sorted price / size columns, best level first.
+
+    A level is found by bisect, changed in place, and inserted or removed with an array insert / delete, a memmove
+    of contiguous doubles. Columns handed out by a snapshot are shared and copied before the next change.
+    """
+
+    __slots__ = ("prices", "sizes", "descending", "shared")
+
+    def __init__(self, descending: bool) -> None:
+        self.prices = array("d")
+        self.sizes = array("d")
+        self.descending = descending
+        self.shared = False
+
+    def reset(self, levels: list) -> None:
+        levels = sorted(levels, reverse=self.descending)
+        self.prices = array("d", [price for price, size in levels if size])
+        self.sizes = array("d", [size for price, size in levels if size])
+        self.shared = False
+
+    def update(self, levels: list) -> None:
+        if self.shared:
+            self.prices = array("d", self.prices)
+            self.sizes = array("d", self.sizes)
+            self.shared = False
+
+        prices = self.prices
+        sizes = self.sizes
+        descending = self.descending
+        for price, size in levels:
+            if descending:
+                index = bisect_left(prices, -price, key=neg)
+            else:
+                index = bisect_left(prices, price)
+            if index < len(prices) and prices[index] == price:
+                if size:
+                    sizes[index] = size
+                else:
+                    del prices[index]
+                    del sizes[index]
+            elif size:
+                prices.insert(index, price)
+                sizes.insert(index, size)
+
+    def columns(self, depth: int = None) -> tuple:
+        if depth is not None:
+            return self.prices[:depth], self.sizes[:depth]
+        self.shared = True
+        return self.prices, self.sizes
+
+
+class LocalOrderBook:
+    """
+    Order book of one symbol kept up to date from a snapshot and the diffs which follow it.
+
+    `reset` installs a snapshot, `update` applies a diff after checking its sequence against the book:
+    - `previous` is the sequence of the diff before it (Binance pu, BTCEX prev_change_id) and has to match the book,
+    - `first` is the first update of a diff covering several (Binance U), the first diff after an overlapping REST
+      snapshot only has to cover the snapshot sequence,
+    - without either the sequence only has to grow (Bybit u, Phemex sequence).
+    Diffs already contained in the book are skipped, a missing diff raises SequenceGap.
+
+    `snapshot` returns an OrderBook sharing the current columns instead of copying them, the book copies a side only
+    when it changes after a snapshot. With `depth` only the best levels are copied.
+    """
+
+    __slots__ = ("symbol", "bids", "asks", "sequence", "timestamp", "_linked")
+
+    def __init__(self, symbol: str) -> None:
+        self.symbol = symbol
+        self.bids = _Side(descending=True)
+        self.asks = _Side(descending=False)
+        self.sequence = None
+        self.timestamp = None
+        self._linked = False
+
+    @property
+    def synced(self) -> bool:
+        return self.sequence is not None
+
+    def reset(self, bids: list, asks: list, sequence: int, timestamp: int = None, overlapping: bool = False) -> None:
+        """
+        Replaces the book with a snapshot. A snapshot of a stream is followed by the diff right after it, an
+        `overlapping` one (REST) may be overlapped by the first diff applied to it.
+        """
+        self.bids.reset(bids)
+        self.asks.reset(asks)
+        self.sequence = sequence
+        self.timestamp = timestamp
+        self._linked = not overlapping
+
+    def update(self, bids: list, asks: list, sequence: int, first: int = None, previous: int = None,
+               timestamp: int = None) -> bool:
+        """
+        Applies a diff, size 0 removes a level. Returns False when the diff is already contained in the book.
+        """
+        if self.sequence is None:
+            raise SequenceGap("{} has no snapshot to apply diff {} to".format(self.symbol, sequence))
+        if sequence is not None and sequence <= self.sequence:
+            return False
+        if self._linked and previous is not None:
+            if previous != self.sequence:
+                raise SequenceGap("{} diff {} follows {}, book is at {}".format(
+                    self.symbol, sequence, previous, self.sequence))
+        elif first is not None and first > self.sequence + 1:
+            raise SequenceGap("{} diff {} starts at {}, book is at {}".format(
+                self.symbol, sequence, first, self.sequence))
+
+        self.bids.update(bids)
+        self.asks.update(asks)
+        self.sequence = sequence
+        self.timestamp = timestamp
+        self._linked = True
+        return True
+
+    def snapshot(self, depth: int = None) -> OrderBook:
+        bid_prices, bid_sizes = self.bids.columns(depth)
+        ask_prices, ask_sizes = self.asks.columns(depth)
+        return OrderBook(self.symbol, bid_prices, bid_sizes, ask_prices, ask_sizes, self.timestamp)
+
+    def __repr__(self) -> str:
+        return "LocalOrderBook(symbol={}, sequence={}, levels={}/{})".format(
+            self.symbol, self.sequence, len(self.bids.prices), len(self.asks.prices))
@@ -0,0 +1,118 @@
+import importlib.util
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from exchanges.rate_limit import install_rate_limits, rate_limits_for_url
+
+_lock = threading.Lock()
+_client = None
+
+
+class PublicClient:
+    """
+    Shared HTTP client for public market data endpoints.
+
+    Connections are kept alive in a pool per host, so only the first call to a host pays the TCP and TLS handshake.
+    Responses are negotiated gzip compressed. With `http2` the calls go through httpx, if it is installed with the
+    http2 extra, otherwise the client stays on HTTP/1.1.
+    """
+
+    def __init__(self, connect_timeout: float = 5.0, read_timeout: float = 10.0, pool_size: int = 10,
+                 http2: bool = False) -> None:
+        self.timeout = (connect_timeout, read_timeout)
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+        self._rate_limited = False
+        self._http2 = None
+        if http2:
+            self._http2 = self._http2_client(connect_timeout, read_timeout, pool_size)
+
+        self.session = requests.Session()
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method: str, url: str, headers: dict = None, data=None, params: dict = None):
+        started = time.perf_counter()
+        try:
+            if self._http2 is not None:
+                return self._http2.request(method, url, headers=headers, data=data or None, params=params)
+            return self.session.request(method, url, headers=headers, data=data, params=params, timeout=self.timeout)
+        finally:
+            self._record(url, time.perf_counter() - started)
+
+    def get(self, url: str, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def use_rate_limits(self, directory: str = None) -> None:
+        """
+        Routes every call, on both transports, through the rate limits of the exchanges.
+        """
+        if self._rate_limited:
+            return
+        self._rate_limited = True
+        install_rate_limits(self.session, directory)
+        if self._http2 is not None:
+            hooks = self._http2.event_hooks
+            hooks["request"].append(lambda request: _acquire(request.method, str(request.url), directory))
+            self._http2.event_hooks = hooks
+
+    def use_http1(self, reason: str) -> None:
+        """
+        Sends every call through the requests session from now on. The cassette and the call timer are adapters of
+        the session, calls over HTTP/2 would bypass them.
+        """
+        if self._http2 is None:
+            return
+        print("Public client falls back to HTTP/1.1, {}".format(reason))
+        self._http2.close()
+        self._http2 = None
+
+    def close(self) -> None:
+        self.session.close()
+        if self._http2 is not None:
+            self._http2.close()
+
+    def _record(self, url: str, elapsed: float) -> None:
+        host = urlsplit(url).netloc
+        with self._stats_lock:
+            calls, total = self.stats.get(host, (0, 0.0))
+            self.stats[host] = (calls + 1, total + elapsed)
+
+    @staticmethod
+    def _http2_client(connect_timeout: float, read_timeout: float, pool_size: int):
+        if importlib.util.find_spec("httpx") is None or importlib.util.find_spec("h2") is None:
+            print("HTTP/2 needs httpx[http2], public client falls back to HTTP/1.1")
+            return None
+
+        import httpx
+
+        return httpx.Client(http2=True,
+                            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size))
+
+
+def _acquire(method: str, url: str, directory: str) -> None:
+    limits = rate_limits_for_url(url, directory)
+    if limits is not None:
+        limits.acquire(method, url)
+
+
+def get_public_client(config: dict = None) -> PublicClient:
+    """
+    Returns the process wide public market data client, built from the `publicHttp` config section on first use.
+    """
+    global _client
+    with _lock:
+        if _client is None:
+            http_config = (config or {}).get("publicHttp") or {}
+            _client = PublicClient(connect_timeout=http_config.get("connectTimeout", 5.0),
+                                   read_timeout=http_config.get("readTimeout", 10.0),
+                                   pool_size=http_config.get("poolSize", 10),
+                                   http2=http_config.get("http2", False))
+        return _client
@@ -0,0 +1,494 @@
+import asyncio
+import functools
+import itertools
+import threading
+from dataclasses import dataclass
+
+from exchanges.json_stream import dumps, loads
+from exchanges.local_book import LocalOrderBook, SequenceGap
+from exchanges.market_data import get_public_client
+from exchanges.order_book import OrderBook
+
+_lock = threading.Lock()
+_stream = None
+
+
+@dataclass
+class BookEvent:
+    """
+    Order book update. A snapshot replaces the book, otherwise the levels are changes, a size of 0 removes a level.
+    `first_sequence` and `previous_sequence` chain the diffs where the exchange publishes them, see LocalOrderBook.
+    """
+    exchange: str
+    symbol: str
+    snapshot: bool
+    bids: list
+    asks: list
+    sequence: int = None
+    timestamp: int = None
+    first_sequence: int = None
+    previous_sequence: int = None
+
+
+@dataclass
+class TradeEvent:
+    exchange: str
+    symbol: str
+    price: float
+    size: float
+    side: str
+    timestamp: int = None
+
+
+def _pairs(levels: list) -> list:
+    return [(float(price), float(size)) for price, size in levels]
+
+
+class BinanceProtocol:
+    """
+    USDT-M futures streams: diff depth chained by U / u / pu, synchronized with a REST snapshot, and aggregated
+    trades. Binance pings the connection itself, the ping frames are answered by the websockets library.
+    """
+    name = "binance"
+    url = "wss://fstream.binance.com/stream"
+    heartbeat = None
+
+    def subscribe(self, symbols: list, request_id: int) -> dict:
+        streams = []
+        for symbol in symbols:
+            streams.extend(["{}@depth@100ms".format(symbol.lower()), "{}@aggTrade".format(symbol.lower())])
+        return {"method": "SUBSCRIBE", "params": streams, "id": request_id}
+
+    def ping(self, request_id: int) -> dict:
+        return None
+
+    def snapshot_request(self, symbol: str) -> tuple:
+        return "https://fapi.binance.com/fapi/v1/depth", {"symbol": symbol, "limit": 1000}
+
+    def parse_snapshot(self, symbol: str, response: dict) -> BookEvent:
+        return BookEvent(self.name, symbol, True, _pairs(response["bids"]), _pairs(response["asks"]),
+                         response["lastUpdateId"], response.get("T"))
+
+    def parse(self, message: dict) -> list:
+        data = message.get("data")
+        if not data:
+            return []
+        if data.get("e") == "depthUpdate":
+            return [BookEvent(self.name, data["s"], False, _pairs(data["b"]), _pairs(data["a"]), data["u"], data["T"],
+                              first_sequence=data["U"], previous_sequence=data["pu"])]
+        if data.get("e") == "aggTrade":
+            return [TradeEvent(self.name, data["s"], float(data["p"]), float(data["q"]),
+                               "sell" if data["m"] else "buy", data["T"])]
+        return []
+
+
+class BybitProtocol:
+    """
+    V5 linear public streams: 50 level order book snapshot then deltas, and public trades. Bybit closes connections
+    without a ping message for 20 seconds.
+    """
+    name = "bybit"
+    url = "wss://stream-testnet.bybit.com/v5/public/linear"
+    heartbeat = 20
+
+    def subscribe(self, symbols: list, request_id: int) -> dict:
+        topics = []
+        for symbol in symbols:
+            topics.extend(["orderbook.50.{}".format(symbol), "publicTrade.{}".format(symbol)])
+        return {"op": "subscribe", "args": topics, "req_id": str(request_id)}
+
+    def ping(self, request_id: int) -> dict:
+        return {"op": "ping", "req_id": str(request_id)}
+
+    def snapshot_request(self, symbol: str) -> tuple:
+        return "https://api-testnet.bybit.com/v5/market/orderbook", {"category": "linear", "symbol": symbol,
+                                                                     "limit": 50}
+
+    def parse_snapshot(self, symbol: str, response: dict) -> BookEvent:
+        result = response["result"]
+        return BookEvent(self.name, symbol, True, _pairs(result["b"]), _pairs(result["a"]), result["u"], result["ts"])
+
+    def parse(self, message: dict) -> list:
+        topic = message.get("topic", "")
+        if topic.startswith("orderbook."):
+            data = message["data"]
+            return [BookEvent(self.name, data["s"], message["type"] == "snapshot", _pairs(data["b"]),
+                              _pairs(data["a"]), data["u"], message["ts"])]
+        if topic.startswith("publicTrade."):
+            return [TradeEvent(self.name, x["s"], float(x["p"]), float(x["v"]), x["S"].lower(), x["T"])
+                    for x in message["data"]]
+        return []
+
+
+class PhemexProtocol:
+    """
+    USDT perpetual streams (orderbook_p, trade_p) with real valued prices: snapshot then incremental updates.
+    Phemex expects a server.ping at least every 30 seconds.
+    """
+    name = "phemex"
+    url = "wss://testnet-api.phemex.com/ws"
+    heartbeat = 15
+
+    def subscribe(self, symbols: list, request_id: int) -> list:
+        return [{"id": request_id, "method": "orderbook_p.subscribe", "params": list(symbols)},
+                {"id": request_id + 1, "method": "trade_p.subscribe", "params": list(symbols)}]
+
+    def ping(self, request_id: int) -> dict:
+        return {"id": request_id, "method": "server.ping", "params": []}
+
+    def snapshot_request(self, symbol: str) -> tuple:
+        return "https://testnet-api.phemex.com/md/v2/orderbook", {"symbol": symbol}
+
+    def parse_snapshot(self, symbol: str, response: dict) -> BookEvent:
+        result = response["result"]
+        book = result["orderbook_p"]
+        return BookEvent(self.name, symbol, True, _pairs(book["bids"]), _pairs(book["asks"]), result["sequence"],
+                         result["timestamp"] // 1000000)
+
+    def parse(self, message: dict) -> list:
+        if "orderbook_p" in message:
+            book = message["orderbook_p"]
+            return [BookEvent(self.name, message["symbol"], message["type"] == "snapshot",
+                              _pairs(book.get("bids", [])), _pairs(book.get("asks", [])), message["sequence"],
+                              message["timestamp"] // 1000000)]
+        if "trades_p" in message:
+            return [TradeEvent(self.name, message["symbol"], float(price), float(size), side.lower(),
+                               timestamp // 1000000)
+                    for timestamp, side, price, size in message["trades_p"]]
+        return []
+
+
+class BtcexProtocol:
+    """
+    JSON-RPC subscriptions to the raw book (snapshot then changes) and trade channels, kept alive with /public/ping.
+    """
+    name = "btcex"
+    url = "wss://api.btcex.com/ws/api/v1"
+    heartbeat = 15
+
+    def subscribe(self, symbols: list, request_id: int) -> dict:
+        channels = []
+        for symbol in symbols:
+            instrument_name = self._instrument_name(symbol)
+            channels.extend(["book.{}.raw".format(instrument_name), "trades.{}.raw".format(instrument_name)])
+        return {"jsonrpc": "2.0", "id": request_id, "method": "/public/subscribe", "params": {"channels": channels}}
+
+    def ping(self, request_id: int) -> dict:
+        return {"jsonrpc": "2.0", "id": request_id, "method": "/public/ping"}
+
+    def snapshot_request(self, symbol: str) -> tuple:
+        return "https://api.btcex.com/api/v1/public/get_order_book", {"instrument_name": self._instrument_name(symbol),
+                                                                      "depth": 100}
+
+    def parse_snapshot(self, symbol: str, response: dict) -> BookEvent:
+        result = response["result"]
+        return BookEvent(self.name, symbol, True, _pairs(result["bids"]), _pairs(result["asks"]), result["change_id"],
+                         int(result["timestamp"]))
+
+    def parse(self, message: dict) -> list:
+        if message.get("method") != "subscription":
+            return []
+        channel = message["params"]["channel"]
+        data = message["params"]["data"]
+        if channel.startswith("book."):
+            return [BookEvent(self.name, self._symbol(data["instrument_name"]), data["type"] == "snapshot",
+                              [(float(price), float(size)) for _, price, size in data["bids"]],
+                              [(float(price), float(size)) for _, price, size in data["asks"]],
+                              data["change_id"], data["timestamp"], previous_sequence=data.get("prev_change_id"))]
+        if channel.startswith("trades."):
+            return [TradeEvent(self.name, self._symbol(x["instrument_name"]), float(x["price"]), float(x["amount"]),
+                               x["direction"], x["timestamp"])
+                    for x in data]
+        return []
+
+    @staticmethod
+    def _symbol(instrument_name: str) -> str:
+        return "".join(instrument_name.split("-")[:2])
+
+    @staticmethod
+    def _instrument_name(symbol: str) -> str:
+        return "{}-{}-PERPETUAL".format(symbol[:-4], symbol[-4:])
+
+
+PROTOCOLS = {protocol.name: protocol for protocol in (BinanceProtocol, BybitProtocol, PhemexProtocol, BtcexProtocol)}
+
+
+class MarketDataStream:
+    """
+    WebSocket market data of every exchange, one connection per exchange, on an event loop in a background thread.
+
+    Subscribed symbols get their order book and trade streams. Every message is normalized into BookEvent /
+    TradeEvent and handed to the consumers in the stream thread, one of them keeps a LocalOrderBook per symbol which
+    `book` reads from any thread. A book starts from the snapshot of the stream, or from a REST snapshot fetched with
+    `get(url, params)` on diff only streams. When a diff does not follow the book, the book is dropped, the diffs are
+    buffered while a REST snapshot is fetched and replayed on top of it. Dropped connections are reopened with
+    exponential backoff and resubscribed, the books of the exchange are discarded until they are synchronized again.
+    A background task (heartbeat, subscription, resynchronization) failing closes the connection of its exchange,
+    which is then reopened the same way.
+    """
+
+    def __init__(self, urls: dict = None, get=None, reconnect_delay: float = 0.5,
+                 max_reconnect_delay: float = 30.0) -> None:
+        self.protocols = {name: protocol() for name, protocol in PROTOCOLS.items()}
+        self.urls = {name: protocol.url for name, protocol in self.protocols.items()}
+        self.urls.update(urls or {})
+        self.get = get or _http_get
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.stats = {"messages": 0, "reconnects": 0, "gaps": 0, "resyncs": 0, "errors": 0}
+        self._consumers = [self._update_book]
+        self._symbols = {}
+        self._connections = {}
+        self._tasks = {}
+        self._books = {}
+        # Diffs received while a REST snapshot is fetched, per (exchange, symbol)
+        self._pending = {}
+        self._request_ids = itertools.count(1)
+        self._condition = threading.Condition()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+
+    def add_consumer(self, consumer) -> None:
+        """
+        Calls `consumer(event)` for every event, in the stream thread. It must not block.
+        """
+        self._consumers.append(consumer)
+
+    def subscribe(self, exchange: str, symbol: str) -> None:
+        loop = self._start()
+        loop.call_soon_threadsafe(self._subscribe, exchange, symbol)
+
+    def book(self, exchange: str, symbol: str, depth: int = None) -> OrderBook:
+        """
+        Returns the current book of a subscribed symbol, None before its first snapshot.
+        """
+        with self._condition:
+            book = self._books.get((exchange, symbol))
+            return book.snapshot(depth) if book is not None else None
+
+    def wait_for_book(self, exchange: str, symbol: str, timeout: float = 10.0, depth: int = None) -> OrderBook:
+        """
+        Subscribes `symbol` if needed and returns its book once both sides are known.
+        """
+        self.subscribe(exchange, symbol)
+        with self._condition:
+            ready = self._condition.wait_for(lambda: self._ready(exchange, symbol), timeout)
+            if not ready:
+                raise TimeoutError("No {} {} order book within {}s".format(exchange, symbol, timeout))
+            return self._books[(exchange, symbol)].snapshot(depth)
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._cancel(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._thread = None
+            self._loop = None
+
+    def _start(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._thread is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="market-data-stream", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def _ready(self, exchange: str, symbol: str) -> bool:
+        book = self._books.get((exchange, symbol))
+        return book is not None and len(book.bids.prices) > 0 and len(book.asks.prices) > 0
+
+    def _update_book(self, event) -> None:
+        if not isinstance(event, BookEvent):
+            return
+        key = (event.exchange, event.symbol)
+        if event.snapshot:
+            book = LocalOrderBook(event.symbol)
+            book.reset(event.bids, event.asks, event.sequence, event.timestamp)
+            self._pending.pop(key, None)
+            with self._condition:
+                self._books[key] = book
+                self._condition.notify_all()
+            return
+        if key in self._pending:
+            self._pending[key].append(event)
+            return
+
+        with self._condition:
+            book = self._books.get(key)
+            if book is not None:
+                try:
+                    book.update(event.bids, event.asks, event.sequence, event.first_sequence, event.previous_sequence,
+                                event.timestamp)
+                    self._condition.notify_all()
+                    return
+                except SequenceGap as e:
+                    print("Resynchronize {} order book: {}".format(event.exchange, e))
+                    self.stats["gaps"] += 1
+                    del self._books[key]
+        self._pending[key] = [event]
+        self.stats["resyncs"] += 1
+        self._spawn(event.exchange, self._synchronize(event.exchange, event.symbol, self._pending[key]))
+
+    async def _synchronize(self, exchange: str, symbol: str, pending: list) -> None:
+        """
+        Builds the book of `symbol` from a REST snapshot and the `pending` diffs, until the snapshot is recent enough
+        for the first pending diff. Gives up once `pending` is superseded, by a stream snapshot or a disconnect.
+        """
+        key = (exchange, symbol)
+        protocol = self.protocols[exchange]
+        url, params = protocol.snapshot_request(symbol)
+        delay = self.reconnect_delay
+        while self._pending.get(key) is pending:
+            try:
+                snapshot = protocol.parse_snapshot(symbol, await asyncio.get_running_loop().run_in_executor(
+                    None, self.get, url, params))
+            except Exception as e:
+                snapshot = None
+                print("{} {} order book snapshot failed: {}".format(exchange, symbol, e))
+            if self._pending.get(key) is not pending:
+                return
+
+            if snapshot is not None:
+                book = LocalOrderBook(symbol)
+                book.reset(snapshot.bids, snapshot.asks, snapshot.sequence, snapshot.timestamp, overlapping=True)
+                try:
+                    for event in pending:
+                        book.update(event.bids, event.asks, event.sequence, event.first_sequence,
+                                    event.previous_sequence, event.timestamp)
+                except SequenceGap as e:
+                    print("{} order book snapshot is behind the stream: {}".format(exchange, e))
+                except Exception as e:
+                    # A malformed diff, the next snapshot starts over
+                    print("{} {} order book synchronization failed: {!r}".format(exchange, symbol, e))
+                    self.stats["errors"] += 1
+                else:
+                    del self._pending[key]
+                    with self._condition:
+                        self._books[key] = book
+                        self._condition.notify_all()
+                    return
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _subscribe(self, exchange: str, symbol: str) -> None:
+        symbols = self._symbols.setdefault(exchange, [])
+        if symbol in symbols:
+            return
+        symbols.append(symbol)
+        if exchange not in self._tasks:
+            self._tasks[exchange] = self._spawn(exchange, self._run(exchange))
+        elif exchange in self._connections:
+            self._spawn(exchange, self._send_subscribe(exchange, [symbol]))
+
+    def _spawn(self, exchange: str, coroutine) -> asyncio.Future:
+        task = asyncio.ensure_future(coroutine)
+        task.add_done_callback(functools.partial(self._task_done, exchange))
+        return task
+
+    def _task_done(self, exchange: str, task: asyncio.Future) -> None:
+        # Retrieves the exception of a background task, it would otherwise only be reported at interpreter exit
+        if task.cancelled() or task.exception() is None:
+            return
+        print("{} market data task failed: {!r}".format(exchange, task.exception()))
+        self.stats["errors"] += 1
+        if self._tasks.get(exchange) is task:
+            # The reader itself ended, it is started again after the longest backoff
+            self._tasks[exchange] = self._spawn(exchange, self._restart(exchange))
+            return
+        connection = self._connections.get(exchange)
+        if connection is not None:
+            # Ends the reader loop, which reconnects, resubscribes and resynchronizes the books
+            self._spawn(exchange, connection.close())
+
+    async def _restart(self, exchange: str) -> None:
+        self.stats["reconnects"] += 1
+        await asyncio.sleep(self.max_reconnect_delay)
+        await self._run(exchange)
+
+    async def _send_subscribe(self, exchange: str, symbols: list) -> None:
+        messages = self.protocols[exchange].subscribe(symbols, next(self._request_ids))
+        for message in messages if isinstance(messages, list) else [messages]:
+            await self._connections[exchange].send(dumps(message))
+
+    async def _run(self, exchange: str) -> None:
+        # Imported on the first connection, test runs without streams do not pay for websockets
+        from websockets.asyncio.client import connect
+        from websockets.exceptions import WebSocketException
+
+        protocol = self.protocols[exchange]
+        delay = self.reconnect_delay
+        while True:
+            heartbeat = None
+            try:
+                async with connect(self.urls[exchange], ping_interval=20, ping_timeout=20, max_size=None) as connection:
+                    self._connections[exchange] = connection
+                    delay = self.reconnect_delay
+                    await self._send_subscribe(exchange, list(self._symbols[exchange]))
+                    if protocol.heartbeat:
+                        heartbeat = self._spawn(exchange, self._heartbeat(exchange, protocol.heartbeat))
+                    async for raw in connection:
+                        self.stats["messages"] += 1
+                        for event in protocol.parse(loads(raw)):
+                            self._publish(event)
+            except (OSError, WebSocketException, asyncio.TimeoutError) as e:
+                print("{} market data stream disconnected: {}".format(exchange, e))
+            except Exception as e:
+                # A malformed frame or an unexpected message must not end the stream of the venue, the books are
+                # discarded and resynchronized after the reconnect. Cancellation is not an Exception, it ends the task
+                print("{} market data stream failed: {!r}".format(exchange, e))
+                self.stats["errors"] += 1
+            finally:
+                if heartbeat is not None:
+                    heartbeat.cancel()
+                self._connections.pop(exchange, None)
+                self._discard_books(exchange)
+
+            self.stats["reconnects"] += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _heartbeat(self, exchange: str, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self._connections[exchange].send(dumps(self.protocols[exchange].ping(next(self._request_ids))))
+
+    def _publish(self, event) -> None:
+        for consumer in self._consumers:
+            try:
+                consumer(event)
+            except Exception as e:
+                print("Market data consumer {} failed: {}".format(consumer, e))
+
+    def _discard_books(self, exchange: str) -> None:
+        for key in [x for x in self._pending if x[0] == exchange]:
+            del self._pending[key]
+        with self._condition:
+            for key in [x for x in self._books if x[0] == exchange]:
+                del self._books[key]
+
+    async def _cancel(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+
+def _http_get(url: str, params: dict) -> dict:
+    return get_public_client().get(url, params=params).json()
+
+
+def get_market_data_stream(urls: dict = None, get=None) -> MarketDataStream:
+    """
+    Returns the process wide market data stream, `urls` replaces the WebSocket url of an exchange and `get` the REST
+    snapshot call on first use.
+    """
+    global _stream
+    with _lock:
+        if _stream is None:
+            _stream = MarketDataStream(urls=urls, get=get)
+        return _stream
@@ -0,0 +1,157 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, repeat
+from operator import itemgetter, neg, truediv
+
+BID = "bid"
+ASK = "ask"
+
+# Phemex contract order books are published as integer Ep prices, scaled by 10^4
+PHEMEX_PRICE_SCALE = 10000
+
+_price = itemgetter(0)
+_size = itemgetter(1)
+
+
+class OrderBook:
+    """
+    Venue independent order book snapshot.
+
+    Each side is kept as two contiguous `array("d")` columns, prices and sizes, best level first: bids descending and
+    asks ascending. The queries are bisects, slices and C level reductions over the columns, so nothing walks the
+    nested level lists of the raw payloads again once a snapshot is converted.
+    """
+
+    __slots__ = ("symbol", "timestamp", "bid_prices", "bid_sizes", "ask_prices", "ask_sizes")
+
+    def __init__(self, symbol: str, bid_prices: array, bid_sizes: array, ask_prices: array, ask_sizes: array,
+                 timestamp: int = None) -> None:
+        self.symbol = symbol
+        self.timestamp = timestamp
+        self.bid_prices = bid_prices
+        self.bid_sizes = bid_sizes
+        self.ask_prices = ask_prices
+        self.ask_sizes = ask_sizes
+
+    @classmethod
+    def from_levels(cls, symbol: str, bids: list, asks: list, price_scale: float = 1, timestamp: int = None):
+        """
+        Builds a book from [price, size, ...] levels as the venues publish them, numbers or numeric strings.
+        """
+        bid_prices, bid_sizes = _columns(bids, price_scale)
+        ask_prices, ask_sizes = _columns(asks, price_scale)
+        return cls(symbol, bid_prices, bid_sizes, ask_prices, ask_sizes, timestamp)
+
+    @property
+    def best_bid(self) -> float:
+        return self.bid_prices[0] if self.bid_prices else None
+
+    @property
+    def best_ask(self) -> float:
+        return self.ask_prices[0] if self.ask_prices else None
+
+    @property
+    def spread(self) -> float:
+        if not self.bid_prices or not self.ask_prices:
+            return None
+        return self.ask_prices[0] - self.bid_prices[0]
+
+    @property
+    def mid(self) -> float:
+        if not self.bid_prices or not self.ask_prices:
+            return None
+        return (self.ask_prices[0] + self.bid_prices[0]) / 2
+
+    def prices(self, side: str) -> array:
+        return self.bid_prices if side == BID else self.ask_prices
+
+    def sizes(self, side: str) -> array:
+        return self.bid_sizes if side == BID else self.ask_sizes
+
+    def depth_at_price(self, side: str, price: float) -> float:
+        """
+        Returns the size resting exactly at `price` on `side`, 0.0 if there is no such level.
+        """
+        prices = self.prices(side)
+        if side == BID:
+            index = bisect_left(prices, -price, key=neg)
+        else:
+            index = bisect_left(prices, price)
+        if index < len(prices) and prices[index] == price:
+            return self.sizes(side)[index]
+        return 0.0
+
+    def cumulative_size(self, side: str, price: float = None) -> float:
+        """
+        Returns the total size on `side` at `price` or better, the whole side without a price.
+        """
+        return sum(self.sizes(side)[:self._levels_to(side, price)])
+
+    def cumulative_sizes(self, side: str) -> array:
+        """
+        Returns the running total of sizes on `side`, best level first.
+        """
+        return array("d", accumulate(self.sizes(side)))
+
+    def price_for_size(self, side: str, size: float) -> float:
+        """
+        Returns the worst price a market order of `size` against `side` would reach, None if the book is too thin.
+        """
+        cumulative = self.cumulative_sizes(side)
+        index = bisect_left(cumulative, size)
+        return self.prices(side)[index] if index < len(cumulative) else None
+
+    def _levels_to(self, side: str, price: float) -> int:
+        if price is None:
+            return len(self.prices(side))
+        if side == BID:
+            return bisect_right(self.bid_prices, -price, key=neg)
+        return bisect_right(self.ask_prices, price)
+
+    def __repr__(self) -> str:
+        return "OrderBook(symbol={}, bid={}, ask={}, levels={}/{})".format(
+            self.symbol, self.best_bid, self.best_ask, len(self.bid_prices), len(self.ask_prices))
+
+
+def from_binance(response: dict, symbol: str = None) -> OrderBook:
+    """
+    Converts a Binance /api/v3/depth or /fapi/v1/depth response.
+    """
+    return OrderBook.from_levels(symbol, response["bids"], response["asks"],
+                                 timestamp=response.get("E", response.get("T")))
+
+
+def from_bybit(response: dict) -> OrderBook:
+    """
+    Converts a Bybit /v5/market/orderbook response, the levels are under result.b and result.a.
+    """
+    result = response["result"]
+    return OrderBook.from_levels(result["s"], result["b"], result["a"], timestamp=result.get("ts"))
+
+
+def from_phemex(response: dict, price_scale: float = PHEMEX_PRICE_SCALE) -> OrderBook:
+    """
+    Converts a Phemex /md/orderbook response, the integer Ep prices are unscaled by `price_scale`.
+    """
+    result = response["result"]
+    book = result["book"]
+    return OrderBook.from_levels(result["symbol"], book["bids"], book["asks"], price_scale=price_scale,
+                                 timestamp=result.get("timestamp"))
+
+
+def from_btcex(response: dict) -> OrderBook:
+    """
+    Converts a BTCEX /api/v1/public/get_order_book response.
+    """
+    result = response["result"]
+    timestamp = result.get("timestamp")
+    return OrderBook.from_levels(result["instrument_name"], result["bids"], result["asks"],
+                                 timestamp=int(timestamp) if timestamp is not None else None)
+
+
+def _columns(levels: list, price_scale: float) -> tuple:
+    prices = array("d", map(float, map(_price, levels)))
+    sizes = array("d", map(float, map(_size, levels)))
+    if price_scale != 1:
+        prices = array("d", map(truediv, prices, repeat(price_scale)))
+    return prices, sizes
@@ -0,0 +1,187 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+
+CPROFILE = "cprofile"
+SAMPLE = "sample"
+
+
+class StackSampler:
+    """
+    Samples the stack of one thread every `interval` seconds from a background thread and counts the distinct stacks.
+    Unlike cProfile it adds no cost to the calls of the sampled thread, and waits on the network show up as the
+    frames blocked in the socket reads.
+    """
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self._labels = {}
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                label = self._labels.get(frame.f_code)
+                if label is None:
+                    label = self._labels[frame.f_code] = _label(frame.f_code)
+                stack.append(label)
+                frame = frame.f_back
+            stack = ";".join(reversed(stack))
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """
+        Returns the stacks in the collapsed format of flamegraph.pl and speedscope, one `root;...;leaf count` a line.
+        """
+        return "".join("{} {}\n".format(x, y) for x, y in sorted(self.stacks.items()))
+
+    def top(self, limit: int) -> list:
+        """
+        Returns [(frame, own samples, total samples)] of the `limit` frames with the most samples of their own.
+        """
+        own = {}
+        total = {}
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] = own.get(frames[-1], 0) + count
+            for frame in set(frames):
+                total[frame] = total.get(frame, 0) + count
+        return [(x, y, total[x]) for x, y in sorted(own.items(), key=lambda x: -x[1])[:limit]]
+
+
+class TestProfiler:
+    """
+    Profiles the thread running one test, with cProfile or with the stack sampler, and optionally its memory with
+    tracemalloc. The results are written to `path` as <test id>.prof (cProfile, for pstats and snakeviz),
+    <test id>.collapsed (sampler, for flamegraph.pl and speedscope) and a readable <test id>.txt with the top frames
+    and the largest allocations.
+    """
+
+    def __init__(self, path: str, mode: str = SAMPLE, interval: float = 0.005, memory: bool = False,
+                 top: int = 25) -> None:
+        self.path = path
+        self.mode = mode
+        self.interval = interval
+        self.memory = memory
+        self.top = top
+        self.test = None
+        self._profile = None
+        self._sampler = None
+        self._started = None
+        self._tracing = False
+        self._memory_start = None
+
+    def start(self, test: str) -> None:
+        self.test = test
+        if self.memory:
+            # Another tracer (a surrounding profiler run) keeps its own start
+            self._tracing = not tracemalloc.is_tracing()
+            if self._tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._memory_start = _own_allocations_removed(tracemalloc.take_snapshot())
+        if self.mode == CPROFILE:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._sampler = StackSampler(threading.get_ident(), self.interval)
+            self._sampler.start()
+        self._started = time.perf_counter()
+
+    def stop(self) -> dict:
+        """
+        Stops profiling, writes the profile files of the test and prints where they are. Returns the summary.
+        """
+        seconds = time.perf_counter() - self._started
+        if self._profile is not None:
+            self._profile.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        snapshot = peak = None
+        if self.memory:
+            snapshot = _own_allocations_removed(tracemalloc.take_snapshot())
+            _, peak = tracemalloc.get_traced_memory()
+            if self._tracing:
+                tracemalloc.stop()
+
+        os.makedirs(self.path, exist_ok=True)
+        base = os.path.join(self.path, _file_name(self.test))
+        summary = {"test": self.test, "mode": self.mode, "seconds": round(seconds, 6), "files": []}
+        report = io.StringIO()
+        report.write("Profile of {} ({}, {:.3f}s)\n\n".format(self.test, self.mode, seconds))
+        if self._profile is not None:
+            self._profile.dump_stats(base + ".prof")
+            summary["files"].append(base + ".prof")
+            stats = pstats.Stats(self._profile, stream=report)
+            summary["cpuSeconds"] = round(stats.total_tt, 6)
+            stats.sort_stats("cumulative").print_stats(self.top)
+        if self._sampler is not None:
+            with open(base + ".collapsed", "w") as stream:
+                stream.write(self._sampler.collapsed())
+            summary["files"].append(base + ".collapsed")
+            summary["samples"] = self._sampler.samples
+            report.write("{} samples every {}s, frames by own samples:\n".format(self._sampler.samples, self.interval))
+            report.write("{:>8} {:>8}  frame\n".format("own", "total"))
+            for frame, own, total in self._sampler.top(self.top):
+                report.write("{:>8} {:>8}  {}\n".format(own, total, frame))
+        if snapshot is not None:
+            summary["peakBytes"] = peak
+            report.write("\nPeak traced memory {:.1f} KiB, largest new allocations by line:\n".format(peak / 1024))
+            for difference in snapshot.compare_to(self._memory_start, "lineno")[:self.top]:
+                report.write("{}\n".format(difference))
+        with open(base + ".txt", "w") as stream:
+            stream.write(report.getvalue())
+        summary["files"].append(base + ".txt")
+
+        print("Profile of {}: {:.3f}s{}{}, written to {}.*".format(
+            self.test, seconds,
+            ", {} samples".format(summary["samples"]) if "samples" in summary else "",
+            ", peak memory {:.1f} KiB".format(peak / 1024) if peak is not None else "", base))
+        return summary
+
+
+def _own_allocations_removed(snapshot):
+    # The snapshots and stacks of the profiler itself are not allocations of the test
+    return snapshot.filter_traces([tracemalloc.Filter(False, x) for x in (tracemalloc.__file__, __file__)])
+
+
+def _label(code) -> str:
+    # module:function:line of the def, the separators of the collapsed format (';' and the last space) stay out
+    label = "{}:{}:{}".format(_module(code.co_filename), code.co_name, code.co_firstlineno)
+    return label.replace(" ", "_").replace(";", "_")
+
+
+def _module(filename: str) -> str:
+    if not filename.endswith(".py"):
+        return filename
+    name = filename[:-3]
+    for path in sorted((x for x in sys.path if x), key=len, reverse=True):
+        if name.startswith(path + os.sep):
+            return name[len(path) + 1:].replace(os.sep, ".")
+    return os.path.basename(name)
+
+
+def _file_name(test: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", test)
@@ -0,0 +1,397 @@
+import asyncio
+import contextvars
+import mmap
+import os
+import struct
+import threading
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+from requests.adapters import HTTPAdapter
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Budgets of every venue: name -> (amount, period in seconds). Every request draws from "weight", the per IP request
+# weight, and some also from per account order counts or per endpoint limits.
+LIMITS = {
+    "binance": {"weight": (2400, 60), "orders": (300, 10), "orders-minute": (1200, 60)},
+    "binance-spot": {"weight": (6000, 60)},
+    "bybit": {"weight": (600, 5),
+              "create-order": (10, 1), "cancel-all": (10, 1), "order-realtime": (50, 1),
+              "set-leverage": (10, 1), "switch-mode": (10, 1), "switch-isolated": (10, 1), "trading-stop": (10, 1),
+              "position-list": (50, 1), "wallet-balance": (50, 1)},
+    "phemex": {"weight": (5000, 300), "contract": (500, 60), "others": (100, 60)},
+    "btcex": {"weight": (20, 1)},
+}
+
+# Hosts of the real exchanges, calls to any other host (the simulator) are not limited
+HOSTS = {
+    "fapi.binance.com": "binance",
+    "dapi.binance.com": "binance",
+    "testnet.binancefuture.com": "binance",
+    "api.binance.com": "binance-spot",
+    "testnet.binance.vision": "binance-spot",
+    "api.bybit.com": "bybit",
+    "api-testnet.bybit.com": "bybit",
+    "api.phemex.com": "phemex",
+    "testnet-api.phemex.com": "phemex",
+    "api.btcex.com": "btcex",
+}
+
+
+def _by_limit(default_limit: int, weights: tuple):
+    """
+    Weight of a call growing with its `limit` parameter, `weights` are (largest limit, weight) pairs.
+    """
+    def cost(params: dict) -> int:
+        limit = int(params.get("limit", default_limit))
+        for largest, weight in weights:
+            if largest is None or limit <= largest:
+                return weight
+    return cost
+
+
+def _with_symbol(weight: int, weight_without: int):
+    def cost(params: dict) -> int:
+        return weight if params.get("symbol") else weight_without
+    return cost
+
+
+# Cost of the endpoints per budget, a cost is a number or a function of the query parameters. Any other call costs a
+# weight of 1.
+COSTS = {
+    "binance": {
+        ("GET", "/fapi/v1/depth"): {"weight": _by_limit(500, ((50, 2), (100, 5), (500, 10), (None, 20)))},
+        ("GET", "/fapi/v1/klines"): {"weight": _by_limit(500, ((99, 1), (499, 2), (1000, 5), (None, 10)))},
+        ("GET", "/fapi/v2/account"): {"weight": 5},
+        ("GET", "/fapi/v2/balance"): {"weight": 5},
+        ("GET", "/fapi/v2/positionRisk"): {"weight": 5},
+        ("GET", "/fapi/v1/openOrders"): {"weight": _with_symbol(1, 40)},
+        ("GET", "/fapi/v1/allOrders"): {"weight": 5},
+        ("GET", "/fapi/v1/positionSide/dual"): {"weight": 30},
+        ("POST", "/fapi/v1/order"): {"weight": 0, "orders": 1, "orders-minute": 1},
+        ("POST", "/fapi/v1/batchOrders"): {"weight": 5, "orders": 5, "orders-minute": 5},
+    },
+    "binance-spot": {
+        ("GET", "/api/v3/depth"): {"weight": _by_limit(100, ((100, 5), (500, 25), (1000, 50), (None, 250)))},
+        ("GET", "/api/v3/klines"): {"weight": 2},
+        ("GET", "/api/v3/exchangeInfo"): {"weight": 20},
+    },
+    "bybit": {
+        ("POST", "/v5/order/create"): {"weight": 1, "create-order": 1},
+        ("POST", "/v5/order/cancel-all"): {"weight": 1, "cancel-all": 1},
+        ("GET", "/v5/order/realtime"): {"weight": 1, "order-realtime": 1},
+        ("POST", "/v5/position/set-leverage"): {"weight": 1, "set-leverage": 1},
+        ("POST", "/v5/position/switch-mode"): {"weight": 1, "switch-mode": 1},
+        ("POST", "/v5/position/switch-isolated"): {"weight": 1, "switch-isolated": 1},
+        ("POST", "/v5/position/trading-stop"): {"weight": 1, "trading-stop": 1},
+        ("GET", "/v5/position/list"): {"weight": 1, "position-list": 1},
+        ("GET", "/v5/account/wallet-balance"): {"weight": 1, "wallet-balance": 1},
+    },
+    "phemex": {
+        ("POST", "/g-orders"): {"weight": 1, "contract": 1},
+        ("PUT", "/g-orders/create"): {"weight": 1, "contract": 1},
+        ("DELETE", "/g-orders/all"): {"weight": 1, "contract": 1},
+        ("GET", "/g-orders/activeList"): {"weight": 1, "contract": 1},
+        ("PUT", "/g-positions/leverage"): {"weight": 1, "contract": 1},
+        ("PUT", "/g-positions/switch-pos-mode-sync"): {"weight": 1, "contract": 1},
+        ("GET", "/g-accounts/accountPositions"): {"weight": 1, "contract": 1},
+        ("GET", "/spot/wallets"): {"weight": 1, "others": 1},
+    },
+}
+
+USED = "used"
+REMAINING = "remaining"
+
+# Response headers reporting the state of a budget on the exchange side, a None budget is the own budget of the
+# endpoint
+FEEDBACK = {
+    "binance": (("X-MBX-USED-WEIGHT-1M", "weight", USED),
+                ("X-MBX-ORDER-COUNT-10S", "orders", USED),
+                ("X-MBX-ORDER-COUNT-1M", "orders-minute", USED)),
+    "binance-spot": (("X-MBX-USED-WEIGHT-1M", "weight", USED),),
+    "bybit": (("X-Bapi-Limit-Status", None, REMAINING),),
+}
+
+_lock = threading.Lock()
+_limits = {}
+# Response status and headers of the running call of an async client
+_async_call = contextvars.ContextVar("rate_limit_call", default=None)
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket, refilled continuously at `rate` tokens per second up to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, weight: float = 1) -> float:
+        """
+        Takes `weight` tokens, sleeping until they are available, and returns the time waited.
+        """
+        waited = 0.0
+        while True:
+            with self._locked():
+                tokens, now = self._refill()
+                if tokens >= weight:
+                    self._store(tokens - weight, now)
+                    return waited
+                delay = (weight - tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def limit(self, tokens: float) -> None:
+        """
+        Lowers the available tokens to `tokens`, e.g. what the exchange reports as left of its window.
+        """
+        with self._locked():
+            available, now = self._refill()
+            self._store(min(available, tokens), now)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Empties the bucket for `seconds`, after a 429 with Retry-After.
+        """
+        self.limit(-seconds * self.rate)
+
+    def _refill(self) -> tuple:
+        tokens, updated = self._load()
+        now = self._now()
+        return min(self.capacity, tokens + max(0.0, now - updated) * self.rate), now
+
+    def _locked(self):
+        return self._lock
+
+    def _load(self) -> tuple:
+        return self._tokens, self._updated
+
+    def _store(self, tokens: float, updated: float) -> None:
+        self._tokens = tokens
+        self._updated = updated
+
+    @staticmethod
+    def _now() -> float:
+        return time.monotonic()
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    Token bucket whose state lives in a small file mapped into memory by every process using `path`. Updates are
+    serialized by an exclusive flock on the file, so all workers on the machine draw from the same budget.
+    """
+
+    _STATE = struct.Struct("dd")
+
+    def __init__(self, rate: float, capacity: float, path: str) -> None:
+        super().__init__(rate, capacity)
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < self._STATE.size:
+                os.write(self._fd, self._STATE.pack(capacity, self._now()))
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, self._STATE.size)
+
+    def _locked(self):
+        return _FileLock(self._lock, self._fd)
+
+    def _load(self) -> tuple:
+        return self._STATE.unpack_from(self._map)
+
+    def _store(self, tokens: float, updated: float) -> None:
+        self._STATE.pack_into(self._map, 0, tokens, updated)
+
+    @staticmethod
+    def _now() -> float:
+        # Shared by processes, the monotonic clock of each one may start anywhere
+        return time.time()
+
+
+class _FileLock:
+    """
+    Thread lock plus flock: a flock is held per open file, it does not exclude the threads of one process.
+    """
+
+    def __init__(self, lock: threading.Lock, fd: int) -> None:
+        self.lock = lock
+        self.fd = fd
+
+    def __enter__(self) -> None:
+        self.lock.acquire()
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *args) -> None:
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.lock.release()
+
+
+class RateLimits:
+    """
+    Request budgets of one venue and the cost of its endpoints.
+
+    Each budget is a token bucket holding a tenth of the budget as burst and refilled at the rate which keeps the
+    burst plus the refill of one period within the budget, so no window of the exchange, fixed or sliding, ever sees
+    more than the budget. The buckets are shared by all processes when `directory` is given. Responses tighten the
+    buckets with the usage the exchange reports, and a 429 / 418 empties them for its Retry-After.
+    """
+
+    def __init__(self, venue: str, directory: str = None) -> None:
+        self.venue = venue
+        self.buckets = {}
+        if directory and fcntl is None:
+            print("Shared rate limits need fcntl, {} budgets are per process".format(venue))
+            directory = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        for budget, (amount, period) in LIMITS[venue].items():
+            burst = max(1.0, amount / 10)
+            rate = (amount - burst) / period
+            if directory:
+                path = os.path.join(directory, "{}.{}.bucket".format(venue, budget))
+                self.buckets[budget] = SharedTokenBucket(rate, burst, path)
+            else:
+                self.buckets[budget] = TokenBucket(rate, burst)
+
+    def cost(self, method: str, url: str) -> dict:
+        parts = urlsplit(url)
+        costs = COSTS.get(self.venue, {}).get((method.upper(), parts.path))
+        if costs is None:
+            return {"weight": 1}
+        params = dict(parse_qsl(parts.query))
+        return {budget: cost(params) if callable(cost) else cost for budget, cost in costs.items()}
+
+    def acquire(self, method: str, url: str) -> float:
+        """
+        Waits until every budget the call draws from has room for it and returns the time waited. The endpoint and
+        order budgets are taken first, the shared weight is not held while waiting for them.
+        """
+        waited = 0.0
+        for budget, cost in sorted(self.cost(method, url).items(), key=lambda x: x[0] == "weight"):
+            if cost:
+                waited += self.buckets[budget].acquire(cost)
+        return waited
+
+    def update(self, method: str, url: str, status: int, headers) -> None:
+        if status in (418, 429):
+            retry_after = float(headers.get("Retry-After") or 1)
+            print("{} rate limit hit, pause {}s".format(self.venue, retry_after))
+            for bucket in self.buckets.values():
+                bucket.pause(retry_after)
+            return
+
+        for header, budget, kind in FEEDBACK.get(self.venue, ()):
+            value = headers.get(header)
+            if value is None:
+                continue
+            if budget is None:
+                budget = next((x for x in self.cost(method, url) if x != "weight"), None)
+                if budget is None:
+                    continue
+            left = float(value) if kind == REMAINING else LIMITS[self.venue][budget][0] - float(value)
+            self.buckets[budget].limit(left)
+
+
+class RateLimitAdapter(HTTPAdapter):
+    """
+    Transport adapter of a requests session which waits for the budget of every call to a real exchange before
+    handing it to the adapter it wraps.
+    """
+
+    def __init__(self, adapter: HTTPAdapter, directory: str = None) -> None:
+        super().__init__()
+        self.adapter = adapter
+        self.directory = directory
+
+    def send(self, request, **kwargs):
+        limits = rate_limits_for_url(request.url, self.directory)
+        if limits is None:
+            return self.adapter.send(request, **kwargs)
+        limits.acquire(request.method, request.url)
+        response = self.adapter.send(request, **kwargs)
+        limits.update(request.method, request.url, response.status_code, response.headers)
+        return response
+
+    def close(self) -> None:
+        self.adapter.close()
+
+
+def install_rate_limits(session, directory: str = None) -> None:
+    """
+    Routes every call of a requests session (ccxt, pybit, public market data) through the rate limits.
+    """
+    for prefix in ("http://", "https://"):
+        adapter = session.get_adapter(prefix)
+        if not isinstance(adapter, RateLimitAdapter):
+            session.mount(prefix, RateLimitAdapter(adapter, directory))
+
+
+def install_async_rate_limits(exchange, directory: str = None) -> None:
+    """
+    Routes every call of a ccxt.async_support client through the rate limits, replacing the throttle of ccxt. The
+    wait runs in the default executor, the event loop keeps serving the other calls.
+
+    ccxt raises on a 418 / 429 (DDoSProtection, RateLimitExceeded) before the response reaches the caller, the status
+    and headers of every response are therefore taken in `on_rest_response` and the budgets are updated before the
+    error is re-raised, like the RateLimitAdapter of the sync clients does. They are kept per call in a context
+    variable, not read from `last_response_headers`, which belongs to whichever call of the client finished last
+    when calls run concurrently (asyncio.gather).
+    """
+    fetch = exchange.fetch
+
+    def on_rest_response(code, reason, url, method, response_headers, *args):
+        call = _async_call.get()
+        if call is not None:
+            call["status"] = code
+            call["headers"] = response_headers
+        # The class of the client may change after this (call timing), it is looked up on every response
+        return type(exchange).on_rest_response(exchange, code, reason, url, method, response_headers, *args)
+
+    async def limited_fetch(url, method="GET", headers=None, body=None):
+        limits = rate_limits_for_url(url, directory)
+        if limits is None:
+            return await fetch(url, method, headers, body)
+        await asyncio.get_running_loop().run_in_executor(None, limits.acquire, method, url)
+        # Every call runs in a task of its own, the context variable holds the response of this call only
+        call = {"status": None, "headers": {}}
+        token = _async_call.set(call)
+        try:
+            response = await fetch(url, method, headers, body)
+        except Exception:
+            if call["status"] is not None:
+                limits.update(method, url, call["status"], call["headers"] or {})
+            raise
+        finally:
+            _async_call.reset(token)
+        limits.update(method, url, call["status"] or 200, call["headers"] or {})
+        return response
+
+    exchange.fetch = limited_fetch
+    exchange.on_rest_response = on_rest_response
+    exchange.enableRateLimit = False
+
+
+def rate_limits_for_url(url: str, directory: str = None) -> RateLimits:
+    venue = HOSTS.get(urlsplit(url).hostname)
+    return get_rate_limits(venue, directory) if venue is not None else None
+
+
+def get_rate_limits(venue: str, directory: str = None) -> RateLimits:
+    """
+    Returns the process wide rate limits of `venue`, shared through `directory` with the other processes when it
+    is given on first use.
+    """
+    with _lock:
+        if venue not in _limits:
+            _limits[venue] = RateLimits(venue, directory)
+        return _limits[venue]
@@ -0,0 +1,57 @@
+import copy
+import threading
+
+_lock = threading.Lock()
+_registry = None
+
+
+class ClientRegistry:
+    """
+    Builds every exchange client once per process and hands out isolated views of it.
+
+    A view is a shallow copy of the warm client: it shares the loaded markets and the HTTP connection pool, but
+    gets its own copy of `options`, so a test changing client options does not leak into the next one.
+    """
+
+    def __init__(self) -> None:
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def client(self, key: str, factory):
+        """
+        Returns the shared client stored under `key`, calling `factory()` to build it on first use.
+        """
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = factory()
+            return self._clients[key]
+
+    def view(self, key: str, factory):
+        client = self.client(key, factory)
+        view = copy.copy(client)
+        if isinstance(getattr(client, "options", None), dict):
+            view.options = copy.deepcopy(client.options)
+        return view
+
+    def keys(self) -> list:
+        with self._lock:
+            return list(self._clients)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._clients.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clients.clear()
+
+
+def get_registry() -> ClientRegistry:
+    """
+    Returns the process wide client registry.
+    """
+    global _registry
+    with _lock:
+        if _registry is None:
+            _registry = ClientRegistry()
+        return _registry
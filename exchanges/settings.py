@@ -0,0 +1,312 @@
+import difflib
+import os
+import threading
+from collections.abc import Mapping
+from urllib.parse import urlsplit
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+_lock = threading.Lock()
+_settings = {}
+
+CONFIG_ENV = "CRYPTO_TESTS_CONFIG"
+ENV_PREFIX = "CRYPTO_TESTS_"
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "config.yaml")
+
+NUMBER = "number"
+URL = "url"
+PATH = "path"
+
+
+class SettingsError(ValueError):
+    pass
+
+
+class Field:
+    """
+    One value of the config schema: its type (bool, int, str, NUMBER, URL, PATH or a list of one section), the value
+    used when it is not set and the allowed range or choices.
+    """
+
+    def __init__(self, kind, default=None, choices: tuple = None, minimum: float = None, maximum: float = None) -> None:
+        self.kind = kind
+        self.default = default
+        self.choices = choices
+        self.minimum = minimum
+        self.maximum = maximum
+
+
+ACCOUNT = {
+    "apiKey": Field(str),
+    "secretKey": Field(str),
+}
+
+
+def _api_section(**fields) -> dict:
+    section = dict(ACCOUNT)
+    section.update(fields)
+    section["subAccounts"] = Field([ACCOUNT], default=())
+    return section
+
+
+# Defaults are what the code does without the value, relative paths are taken from the directory of the config file
+SCHEMA = {
+    "bybitApi": _api_section(testnet=Field(bool, True)),
+    "phemexApi": _api_section(),
+    "binanceApi": _api_section(url=Field(URL)),
+    "timing": {
+        "enabled": Field(bool, False),
+        "path": Field(PATH, "timings"),
+    },
+    "history": {
+        "enabled": Field(bool, False),
+        "path": Field(PATH, "history.sqlite"),
+    },
+    "profiling": {
+        "enabled": Field(bool, False),
+        "mode": Field(str, "sample", choices=("sample", "cprofile")),
+        "interval": Field(NUMBER, 0.005, minimum=0.0001),
+        "memory": Field(bool, False),
+        "path": Field(PATH, "profiles"),
+    },
+    "accountPool": {
+        "path": Field(PATH, "account-leases"),
+        "timeout": Field(NUMBER, 600, minimum=0),
+    },
+    "publicHttp": {
+        "connectTimeout": Field(NUMBER, 5, minimum=0),
+        "readTimeout": Field(NUMBER, 10, minimum=0),
+        "poolSize": Field(int, 10, minimum=1),
+        "http2": Field(bool, False),
+    },
+    "cassette": {
+        "mode": Field(str, "none", choices=("none", "record", "replay")),
+        "path": Field(PATH, "cassettes"),
+    },
+    "rateLimit": {
+        "enabled": Field(bool, True),
+        "path": Field(PATH, "rate-limits"),
+    },
+    "instruments": {
+        "ttl": Field(NUMBER, 3600, minimum=0),
+        "path": Field(PATH),
+    },
+    "simulator": {
+        "enabled": Field(bool, False),
+        "host": Field(str, "127.0.0.1"),
+        "port": Field(int, 0, minimum=0, maximum=65535),
+        "latency": Field(NUMBER, 0, minimum=0),
+    },
+}
+
+
+class Settings(Mapping):
+    """
+    Read-only, validated config. Sections are Settings as well and lists are tuples, values are read as items
+    (`settings["simulator"]["enabled"]`), with `get` or as attributes (`settings.simulator.enabled`).
+    """
+
+    __slots__ = ("_values",)
+
+    def __init__(self, values: dict) -> None:
+        object.__setattr__(self, "_values", values)
+
+    def __getitem__(self, key: str):
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __getattr__(self, name: str):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError("Settings are read-only, use replace")
+
+    def __reduce__(self):
+        return Settings, (self._values,)
+
+    def __repr__(self) -> str:
+        return "Settings({!r})".format(self.to_dict())
+
+    def to_dict(self) -> dict:
+        return _plain(self)
+
+    def replace(self, overrides: dict) -> "Settings":
+        """
+        Returns new validated settings with the values of `overrides` (nested like the config) set.
+        """
+        return validate(_merge(self.to_dict(), overrides), os.getcwd())
+
+
+def load_settings(config_file: str = None, overrides: dict = None) -> Settings:
+    """
+    Returns the validated settings of `config_file`, read once per process.
+
+    Without `config_file` the file is taken from $CRYPTO_TESTS_CONFIG or is tests/config.yaml of the repository,
+    wherever the process runs. Every value can be overridden by an environment variable named after its path,
+    e.g. CRYPTO_TESTS_BYBITAPI_APIKEY or CRYPTO_TESTS_SIMULATOR_ENABLED=True. Strings, URLs and paths are taken as
+    they are, the other values are read as YAML.
+    """
+    argument = (config_file, repr(overrides))
+    settings = _settings.get(argument)
+    if settings is not None:
+        return settings
+    path = os.path.abspath(config_file or os.environ.get(CONFIG_ENV) or DEFAULT_PATH)
+    key = (path, argument[1])
+    with _lock:
+        if key not in _settings:
+            values = _merge(_merge(_read(path), _environment()), overrides or {})
+            _settings[key] = validate(values, os.path.dirname(path), path)
+        _settings[argument] = _settings[key]
+        return _settings[key]
+
+
+def validate(values: dict, directory: str, source: str = "config") -> Settings:
+    """
+    Checks `values` against the schema and returns them as settings, with defaults filled in and relative paths
+    resolved against `directory`. Raises SettingsError listing every problem found.
+    """
+    errors = []
+    settings = _section(SCHEMA, values, "", directory, errors)
+    for venue in ("bybitApi", "phemexApi", "binanceApi"):
+        api = settings[venue]
+        if bool(api["apiKey"]) != bool(api["secretKey"]):
+            errors.append("{}: apiKey and secretKey must be set together".format(venue))
+        if any(not x["apiKey"] or not x["secretKey"] for x in api["subAccounts"]):
+            errors.append("{}.subAccounts: every sub-account needs an apiKey and a secretKey".format(venue))
+        keys = [x["apiKey"] for x in api["subAccounts"]]
+        if len(keys) != len(set(keys)):
+            errors.append("{}.subAccounts: an apiKey is listed more than once".format(venue))
+    if errors:
+        raise SettingsError("Invalid settings in {}:\n  {}".format(source, "\n  ".join(errors)))
+    return settings
+
+
+def _read(path: str) -> dict:
+    try:
+        with open(path) as stream:
+            values = yaml.load(stream, Loader=SafeLoader)
+    except FileNotFoundError:
+        raise SettingsError("Config file {} not found, pass its path or set ${}".format(path, CONFIG_ENV)) from None
+    except yaml.YAMLError as error:
+        raise SettingsError("Config file {} is not valid YAML: {}".format(path, error)) from None
+    if values is not None and not isinstance(values, dict):
+        raise SettingsError("Config file {} must contain a mapping".format(path))
+    return values or {}
+
+
+def _environment() -> dict:
+    values = {}
+    for section_name, section in SCHEMA.items():
+        for name, field in section.items():
+            variable = "{}{}_{}".format(ENV_PREFIX, section_name, name).upper()
+            if variable not in os.environ:
+                continue
+            if field.kind in (str, URL, PATH):
+                # Taken as is, YAML would read a key like 0123 as the octal number 83
+                value = os.environ[variable]
+            else:
+                try:
+                    value = yaml.load(os.environ[variable], Loader=SafeLoader)
+                except yaml.YAMLError as error:
+                    raise SettingsError("${} is not valid YAML: {}".format(variable, error)) from None
+            values.setdefault(section_name, {})[name] = value
+    return values
+
+
+def _section(schema: dict, values, path: str, directory: str, errors: list) -> Settings:
+    if values is None:
+        values = {}
+    if not isinstance(values, Mapping):
+        errors.append("{} must be a mapping, got {!r}".format(path or "config", values))
+        values = {}
+    for name in values:
+        if name not in schema:
+            close = difflib.get_close_matches(str(name), list(schema), n=1)
+            errors.append("{}{} is not a known setting{}".format(
+                path, name, ", did you mean {}?".format(close[0]) if close else ""))
+    result = {}
+    for name, spec in schema.items():
+        full_name = path + name
+        if isinstance(spec, dict):
+            result[name] = _section(spec, values.get(name), full_name + ".", directory, errors)
+        else:
+            result[name] = _value(spec, values.get(name), full_name, directory, errors)
+    return Settings(result)
+
+
+def _value(field: Field, value, name: str, directory: str, errors: list):
+    if value is None or value == "":
+        if field.default is None:
+            return None
+        value = field.default
+    if isinstance(field.kind, list):
+        if not isinstance(value, (list, tuple)):
+            errors.append("{} must be a list, got {!r}".format(name, value))
+            return ()
+        return tuple(_section(field.kind[0], x, "{}[{}].".format(name, i), directory, errors)
+                     for i, x in enumerate(value))
+
+    if field.kind is bool:
+        valid = isinstance(value, bool)
+    elif field.kind is int:
+        valid = isinstance(value, int) and not isinstance(value, bool)
+    elif field.kind == NUMBER:
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+    else:
+        # Keys and secrets made only of digits are read by YAML as numbers
+        if field.kind is str and isinstance(value, int) and not isinstance(value, bool):
+            value = str(value)
+        valid = isinstance(value, str) and value != ""
+    if not valid:
+        errors.append("{} must be {}, got {!r}".format(name, _describe(field.kind), value))
+        return field.default
+
+    if field.choices is not None and value not in field.choices:
+        errors.append("{} must be one of {}, got {!r}".format(name, ", ".join(field.choices), value))
+    if field.minimum is not None and value < field.minimum:
+        errors.append("{} must be at least {}, got {!r}".format(name, field.minimum, value))
+    if field.maximum is not None and value > field.maximum:
+        errors.append("{} must be at most {}, got {!r}".format(name, field.maximum, value))
+    if field.kind == URL:
+        parts = urlsplit(value)
+        if parts.scheme not in ("http", "https", "ws", "wss") or not parts.netloc:
+            errors.append("{} must be an absolute URL, got {!r}".format(name, value))
+    if field.kind == PATH:
+        value = os.path.normpath(os.path.join(directory, os.path.expanduser(value)))
+    return value
+
+
+def _describe(kind) -> str:
+    return {bool: "True or False", int: "an integer", NUMBER: "a number", URL: "a URL", PATH: "a path"}.get(
+        kind, "a non-empty string")
+
+
+def _merge(base: dict, overrides: dict) -> dict:
+    merged = dict(base)
+    for name, value in overrides.items():
+        if isinstance(value, Mapping) and isinstance(merged.get(name), Mapping):
+            merged[name] = _merge(merged[name], value)
+        else:
+            merged[name] = value
+    return merged
+
+
+def _plain(value):
+    if isinstance(value, Settings):
+        return {x: _plain(y) for x, y in value.items()}
+    if isinstance(value, tuple):
+        return [_plain(x) for x in value]
+    return value
@@ -0,0 +1,21 @@
+import threading
+
+from exchanges.simulator.clients import route_ccxt, route_pybit, route_stream_url, route_url
+from exchanges.simulator.server import SimulatorServer
+
+_lock = threading.Lock()
+_simulator = None
+
+
+def get_simulator(host: str = "127.0.0.1", port: int = 0, latency: float = 0.0) -> SimulatorServer:
+    """
+    Returns the process wide simulator, starting it on first use.
+    """
+    global _simulator
+    with _lock:
+        if _simulator is None:
+            _simulator = SimulatorServer(host=host, port=port, latency=latency).start()
+        return _simulator
+
+
+__all__ = ["SimulatorServer", "get_simulator", "route_ccxt", "route_pybit", "route_stream_url", "route_url"]
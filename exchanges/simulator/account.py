@@ -0,0 +1,239 @@
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field
+
+from exchanges.simulator.market import SyntheticMarket
+from exchanges.simulator.matching import MatchingEngine
+
+ONE_WAY = "one_way"
+HEDGE = "hedge"
+
+ISOLATED = "isolated"
+CROSS = "cross"
+
+
+@dataclass
+class Order:
+    id: str
+    symbol: str
+    side: str
+    type: str
+    qty: float
+    price: float = None
+    stop_price: float = None
+    reduce_only: bool = False
+    time_in_force: str = "GTC"
+    position_idx: int = 0
+    status: str = "new"
+    filled: float = 0.0
+    avg_price: float = 0.0
+    created_ms: int = 0
+    updated_ms: int = 0
+    owner: str = "account"
+    close_on_trigger: bool = False
+    trigger_direction: int = 0
+    trail_rate: float = None
+    trail_offset: float = None
+    extreme: float = None
+    take_profit: float = None
+    stop_loss: float = None
+    linked: list = field(default_factory=list)
+    params: dict = field(default_factory=dict)
+
+    @property
+    def is_open(self) -> bool:
+        return self.status in ("new", "partially_filled", "untriggered")
+
+    @property
+    def is_conditional(self) -> bool:
+        return self.stop_price is not None or self.trail_rate is not None or self.trail_offset is not None
+
+
+@dataclass
+class Position:
+    symbol: str
+    position_idx: int = 0
+    size: float = 0.0
+    entry_price: float = 0.0
+    params: dict = field(default_factory=dict)
+
+    @property
+    def side(self) -> str:
+        if self.size > 0:
+            return "long"
+        if self.size < 0:
+            return "short"
+        return "none"
+
+
+class SimulatedAccount:
+    """
+    Orders, positions and settings of one simulated venue account.
+
+    Orders are matched by a MatchingEngine against resting orders of the account and against house liquidity
+    seeded from the synthetic order book. Take profit / stop loss brackets are armed once their parent fills and
+    reduce-only orders never flip or grow a position.
+    """
+
+    def __init__(self, market: SyntheticMarket, balance: float = 10000.0, default_leverage: int = 20,
+                 id_format: str = "{}") -> None:
+        self.market = market
+        self.balance = balance
+        self.default_leverage = default_leverage
+        self.position_mode = ONE_WAY
+        self.margin_modes = {}
+        self.leverages = {}
+        self.orders = {}
+        self.positions = {}
+        self.lock = threading.RLock()
+        self.engine = MatchingEngine(on_trigger=self._on_trigger)
+        self.id_format = id_format
+        self._ids = itertools.count(1)
+        self._seeded = set()
+
+    def next_id(self) -> str:
+        return self.id_format.format(next(self._ids))
+
+    def margin_mode(self, symbol: str) -> str:
+        return self.margin_modes.get(symbol, CROSS)
+
+    def leverage(self, symbol: str) -> tuple:
+        return self.leverages.get(symbol, (self.default_leverage, self.default_leverage))
+
+    def open_orders(self, symbol: str = None) -> list:
+        return [x for x in self.orders.values() if x.is_open and (symbol is None or x.symbol == symbol)]
+
+    def active_positions(self, symbol: str = None) -> list:
+        return [x for x in self.positions.values() if x.size != 0 and (symbol is None or x.symbol == symbol)]
+
+    def position(self, symbol: str, position_idx: int = 0) -> Position:
+        key = (symbol, position_idx)
+        if key not in self.positions:
+            self.positions[key] = Position(symbol=symbol, position_idx=position_idx)
+        return self.positions[key]
+
+    def place_order(self, order: Order) -> Order:
+        with self.lock:
+            now = int(time.time() * 1000)
+            order.created_ms = order.updated_ms = now
+            self.orders[order.id] = order
+            self._seed(order.symbol)
+
+            if not order.is_conditional and order.reduce_only:
+                size = abs(self.position(order.symbol, order.position_idx).size)
+                if not self._reduces(order):
+                    order.status = "rejected"
+                    return order
+                order.qty = min(order.qty, size)
+
+            self._settle(self.engine.submit(order))
+            return order
+
+    def attach_brackets(self, order: Order) -> list:
+        """
+        Arms reduce-only take profit / stop loss orders for the position `order` opened. Both legs are linked,
+        the first one to trigger cancels the other.
+        """
+        with self.lock:
+            side = "sell" if order.side == "buy" else "buy"
+            legs = []
+            for kind, price in (("take_profit_market", order.take_profit), ("stop_market", order.stop_loss)):
+                if price is None:
+                    continue
+                legs.append(Order(id=self.next_id(), symbol=order.symbol, side=side, type=kind, qty=order.filled,
+                                  stop_price=price, reduce_only=True, close_on_trigger=True,
+                                  position_idx=order.position_idx, params={"parentId": order.id}))
+            for leg in legs:
+                leg.linked = [x.id for x in legs if x is not leg]
+                self.place_order(leg)
+            return legs
+
+    def update_price(self, symbol: str, price: float) -> None:
+        """
+        Moves the last traded price, e.g. to trigger stops from a test.
+        """
+        with self.lock:
+            self._seed(symbol)
+            self._settle(self.engine.update_price(symbol, price))
+
+    def cancel_order(self, order_id: str) -> Order:
+        with self.lock:
+            order = self.orders.get(order_id)
+            if order is not None and self.engine.cancel(order):
+                order.updated_ms = int(time.time() * 1000)
+            return order
+
+    def cancel_all(self, symbol: str = None, conditional: bool = None) -> list:
+        with self.lock:
+            cancelled = []
+            for order in self.open_orders(symbol):
+                if conditional is not None and (order.status == "untriggered") != conditional:
+                    continue
+                self.cancel_order(order.id)
+                cancelled.append(order)
+            return cancelled
+
+    def _seed(self, symbol: str) -> None:
+        if symbol in self._seeded or symbol not in self.market.instruments:
+            return
+
+        self._seeded.add(symbol)
+        book = self.engine.book(symbol)
+        bids, asks = self.market.order_book(symbol, self.market.depth)
+        for side, levels in (("buy", bids), ("sell", asks)):
+            for price, size in levels:
+                book.add(Order(id="house", symbol=symbol, side=side, type="limit", qty=size, price=price,
+                               owner="house"))
+        self.engine.last_prices[symbol] = self.market.mid_price(symbol)
+
+    def _settle(self, fills: list) -> None:
+        now = int(time.time() * 1000)
+        touched = {}
+        for fill in fills:
+            for order in (fill.maker, fill.taker):
+                if order.owner == "house":
+                    continue
+                self._fill(order, fill.price, fill.qty)
+                order.updated_ms = now
+                touched[order.id] = order
+
+        for order in touched.values():
+            # A market or IOC order canceled after a partial fill opened a position as well
+            if not order.is_open and order.filled and (order.take_profit is not None or order.stop_loss is not None):
+                self.attach_brackets(order)
+
+    def _on_trigger(self, order: Order) -> bool:
+        if not order.reduce_only:
+            return True
+
+        size = abs(self.position(order.symbol, order.position_idx).size)
+        if not self._reduces(order):
+            return False
+        order.qty = size if order.close_on_trigger else min(order.qty, size)
+        return True
+
+    def _reduces(self, order: Order) -> bool:
+        position = self.position(order.symbol, order.position_idx)
+        if order.side == "buy":
+            return position.size < 0
+        return position.size > 0
+
+    def _fill(self, order: Order, price: float, qty: float) -> None:
+        position = self.position(order.symbol, order.position_idx)
+        signed = qty if order.side == "buy" else -qty
+        new_size = round(position.size + signed, 8)
+        if position.size == 0 or (position.size > 0) == (signed > 0):
+            total = abs(position.size) + qty
+            position.entry_price = (abs(position.size) * position.entry_price + qty * price) / total
+        elif new_size != 0 and (new_size > 0) != (position.size > 0):
+            position.entry_price = price
+        position.size = new_size
+
+        if position.size == 0:
+            position.entry_price = 0.0
+            position.params = {}
+            # Reduce-only orders die with the position they were protecting
+            for other in self.open_orders(order.symbol):
+                if other.reduce_only and other.position_idx == order.position_idx:
+                    self.engine.cancel(other)
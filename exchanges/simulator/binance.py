@@ -0,0 +1,371 @@
+import time
+
+from exchanges.simulator.account import CROSS, HEDGE, ISOLATED, ONE_WAY, Order, SimulatedAccount
+from exchanges.simulator.market import DAY_MS, SyntheticMarket
+from exchanges.simulator.venue import Request, Venue
+
+INTERVALS_MS = {
+    "1m": 60 * 1000,
+    "5m": 5 * 60 * 1000,
+    "15m": 15 * 60 * 1000,
+    "1h": 60 * 60 * 1000,
+    "4h": 4 * 60 * 60 * 1000,
+    "1d": DAY_MS,
+}
+
+FUTURES_SYMBOLS = {
+    "BTCUSDT": {"onboardDate": 1569398400000, "pricePrecision": 2, "quantityPrecision": 3,
+                "maxQty": "1000", "marketMaxQty": "120", "minQty": "0.001", "stepSize": "0.001", "tickSize": "0.10"},
+    "ETHUSDT": {"onboardDate": 1569398400000, "pricePrecision": 2, "quantityPrecision": 3,
+                "maxQty": "10000", "marketMaxQty": "2000", "minQty": "0.001", "stepSize": "0.001", "tickSize": "0.01"},
+    "SOLUSDT": {"onboardDate": 1569398400000, "pricePrecision": 4, "quantityPrecision": 0,
+                "maxQty": "1000000", "marketMaxQty": "5000", "minQty": "1", "stepSize": "1", "tickSize": "0.0010"},
+    "DOGEUSDT": {"onboardDate": 1569398400000, "pricePrecision": 6, "quantityPrecision": 0,
+                 "maxQty": "50000000", "marketMaxQty": "30000000", "minQty": "1", "stepSize": "1",
+                 "tickSize": "0.000010"},
+}
+
+ORDER_TYPES = {
+    "MARKET": "market",
+    "LIMIT": "limit",
+    "STOP": "stop_limit",
+    "STOP_MARKET": "stop_market",
+    "TAKE_PROFIT": "take_profit_limit",
+    "TAKE_PROFIT_MARKET": "take_profit_market",
+    "TRAILING_STOP_MARKET": "trailing_stop_market",
+}
+
+ORDER_STATUSES = {
+    "new": "NEW",
+    "untriggered": "NEW",
+    "partially_filled": "PARTIALLY_FILLED",
+    "filled": "FILLED",
+    "canceled": "CANCELED",
+    "rejected": "REJECTED",
+}
+
+
+class BinanceVenue(Venue):
+    name = "binance"
+
+    def __init__(self, market: SyntheticMarket) -> None:
+        super().__init__(market)
+        self.account = SimulatedAccount(market)
+
+        self.route("GET", "/api/v3/depth", self.get_depth)
+        self.route("GET", "/api/v3/exchangeInfo", self.get_spot_exchange_info)
+        self.route("GET", "/dapi/v1/exchangeInfo", self.get_delivery_exchange_info)
+        self.route("GET", "/fapi/v1/depth", self.get_depth)
+        self.route("GET", "/fapi/v1/klines", self.get_klines)
+        self.route("GET", "/fapi/v1/exchangeInfo", self.get_futures_exchange_info)
+        self.route("GET", "/fapi/v1/leverageBracket", self.get_leverage_bracket)
+        self.route("GET", "/fapi/v2/account", self.get_account)
+        self.route("GET", "/fapi/v1/positionRisk", self.get_position_risk)
+        self.route("GET", "/fapi/v2/positionRisk", self.get_position_risk)
+        self.route("GET", "/fapi/v1/openOrders", self.get_open_orders)
+        self.route("POST", "/fapi/v1/order", self.post_order)
+        self.route("DELETE", "/fapi/v1/allOpenOrders", self.delete_all_open_orders)
+        self.route("GET", "/fapi/v1/positionSide/dual", self.get_position_side)
+        self.route("POST", "/fapi/v1/positionSide/dual", self.post_position_side)
+        self.route("POST", "/fapi/v1/marginType", self.post_margin_type)
+        self.route("POST", "/fapi/v1/leverage", self.post_leverage)
+
+    @staticmethod
+    def error(code: int, msg: str) -> tuple:
+        return 400, {"code": code, "msg": msg}
+
+    def internal_error(self, request: Request, error: Exception) -> tuple:
+        return 500, self.error(-1000, "An unknown error occurred while processing the request.")[1]
+
+    def get_depth(self, request: Request) -> tuple:
+        symbol = request.params.get("symbol")
+        if symbol not in self.market.instruments:
+            return self.error(-1121, "Invalid symbol.")
+
+        bids, asks, sequence = self.market.live_order_book(symbol, limit=int(request.params.get("limit", 100)))
+        return 200, {
+            "lastUpdateId": sequence,
+            "bids": [[str(price), str(size)] for price, size in bids],
+            "asks": [[str(price), str(size)] for price, size in asks],
+        }
+
+    def get_klines(self, request: Request) -> tuple:
+        symbol = request.params.get("symbol")
+        interval = request.params.get("interval", "1d")
+        if symbol not in self.market.instruments or interval not in INTERVALS_MS:
+            return self.error(-1121, "Invalid symbol.")
+
+        interval_ms = INTERVALS_MS[interval]
+        end_ms = int(request.params["endTime"]) if "endTime" in request.params else None
+        bars = self.market.klines(symbol, interval_ms, int(request.params.get("limit", 500)), end_ms)
+        if "startTime" in request.params:
+            bars = [x for x in bars if x[0] >= int(request.params["startTime"])]
+
+        return 200, [[open_time, str(open_), str(high), str(low), str(close), str(volume),
+                      open_time + interval_ms - 1, str(round(volume * close, 2)), 100,
+                      str(round(volume / 2, 3)), str(round(volume * close / 2, 2)), "0"]
+                     for open_time, open_, high, low, close, volume in bars]
+
+    def get_spot_exchange_info(self, request: Request) -> tuple:
+        symbols = []
+        for symbol, spec in FUTURES_SYMBOLS.items():
+            instrument = self.market.instrument(symbol)
+            symbols.append({
+                "symbol": symbol,
+                "status": "TRADING",
+                "baseAsset": instrument.base,
+                "baseAssetPrecision": 8,
+                "quoteAsset": instrument.quote,
+                "quotePrecision": 8,
+                "isMarginTradingAllowed": False,
+                "permissions": ["SPOT"],
+                "filters": [
+                    {"filterType": "PRICE_FILTER", "minPrice": spec["tickSize"], "maxPrice": "1000000.00",
+                     "tickSize": spec["tickSize"]},
+                    {"filterType": "LOT_SIZE", "minQty": spec["minQty"], "maxQty": spec["maxQty"],
+                     "stepSize": spec["stepSize"]},
+                ],
+            })
+        return 200, {"timezone": "UTC", "serverTime": self._now(), "rateLimits": [], "symbols": symbols}
+
+    def get_delivery_exchange_info(self, request: Request) -> tuple:
+        return 200, {"timezone": "UTC", "serverTime": self._now(), "rateLimits": [], "symbols": []}
+
+    def get_futures_exchange_info(self, request: Request) -> tuple:
+        symbols = []
+        for symbol, spec in FUTURES_SYMBOLS.items():
+            instrument = self.market.instrument(symbol)
+            symbols.append({
+                "symbol": symbol,
+                "pair": symbol,
+                "contractType": "PERPETUAL",
+                "deliveryDate": 4133404800000,
+                "onboardDate": spec["onboardDate"],
+                "status": "TRADING",
+                "maintMarginPercent": "2.5000",
+                "requiredMarginPercent": "5.0000",
+                "baseAsset": instrument.base,
+                "quoteAsset": instrument.quote,
+                "marginAsset": instrument.quote,
+                "pricePrecision": spec["pricePrecision"],
+                "quantityPrecision": spec["quantityPrecision"],
+                "baseAssetPrecision": 8,
+                "quotePrecision": 8,
+                "underlyingType": "COIN",
+                "underlyingSubType": [],
+                "settlePlan": 0,
+                "triggerProtect": "0.0500",
+                "liquidationFee": "0.012500",
+                "marketTakeBound": "0.05",
+                "filters": [
+                    {"filterType": "PRICE_FILTER", "minPrice": spec["tickSize"], "maxPrice": "4529764",
+                     "tickSize": spec["tickSize"]},
+                    {"filterType": "LOT_SIZE", "minQty": spec["minQty"], "maxQty": spec["maxQty"],
+                     "stepSize": spec["stepSize"]},
+                    {"filterType": "MARKET_LOT_SIZE", "minQty": spec["minQty"], "maxQty": spec["marketMaxQty"],
+                     "stepSize": spec["stepSize"]},
+                    {"filterType": "MAX_NUM_ORDERS", "limit": 200},
+                    {"filterType": "MAX_NUM_ALGO_ORDERS", "limit": 10},
+                    {"filterType": "MIN_NOTIONAL", "notional": "5"},
+                    {"filterType": "PERCENT_PRICE", "multiplierUp": "1.0500", "multiplierDown": "0.9500",
+                     "multiplierDecimal": "4"},
+                ],
+                "orderTypes": ["LIMIT", "MARKET", "STOP", "STOP_MARKET", "TAKE_PROFIT", "TAKE_PROFIT_MARKET",
+                               "TRAILING_STOP_MARKET"],
+                "timeInForce": ["GTC", "IOC", "FOK", "GTX"],
+            })
+        return 200, {"timezone": "UTC", "serverTime": self._now(), "rateLimits": [], "exchangeFilters": [],
+                     "assets": [{"asset": "USDT", "marginAvailable": True, "autoAssetExchange": "-10000"}],
+                     "symbols": symbols}
+
+    def get_leverage_bracket(self, request: Request) -> tuple:
+        return 200, [{"symbol": symbol,
+                      "brackets": [{"bracket": 1, "initialLeverage": 125, "notionalCap": 50000, "notionalFloor": 0,
+                                    "maintMarginRatio": 0.004, "cum": 0.0}]}
+                     for symbol in FUTURES_SYMBOLS]
+
+    def get_account(self, request: Request) -> tuple:
+        used = self._initial_margin()
+        balance = self.account.balance
+        return 200, {
+            "feeTier": 0,
+            "canTrade": True,
+            "canDeposit": True,
+            "canWithdraw": True,
+            "updateTime": 0,
+            "totalInitialMargin": str(used),
+            "totalMaintMargin": "0.00000000",
+            "totalWalletBalance": str(balance),
+            "totalUnrealizedProfit": "0.00000000",
+            "totalMarginBalance": str(balance),
+            "totalPositionInitialMargin": str(used),
+            "totalOpenOrderInitialMargin": "0.00000000",
+            "totalCrossWalletBalance": str(balance),
+            "totalCrossUnPnl": "0.00000000",
+            "availableBalance": str(balance - used),
+            "maxWithdrawAmount": str(balance - used),
+            "assets": [{
+                "asset": "USDT",
+                "walletBalance": str(balance),
+                "unrealizedProfit": "0.00000000",
+                "marginBalance": str(balance),
+                "maintMargin": "0.00000000",
+                "initialMargin": str(used),
+                "positionInitialMargin": str(used),
+                "openOrderInitialMargin": "0.00000000",
+                "crossWalletBalance": str(balance),
+                "crossUnPnl": "0.00000000",
+                "availableBalance": str(balance - used),
+                "maxWithdrawAmount": str(balance - used),
+                "marginAvailable": True,
+                "updateTime": 0,
+            }],
+            "positions": [self._position_risk(symbol) for symbol in FUTURES_SYMBOLS],
+        }
+
+    def get_position_risk(self, request: Request) -> tuple:
+        symbols = [request.params["symbol"]] if "symbol" in request.params else list(FUTURES_SYMBOLS)
+        return 200, [self._position_risk(symbol) for symbol in symbols]
+
+    def get_open_orders(self, request: Request) -> tuple:
+        return 200, [self._order(x) for x in self.account.open_orders(request.params.get("symbol"))]
+
+    def post_order(self, request: Request) -> tuple:
+        params = request.params
+        symbol = params.get("symbol")
+        order_type = params.get("type", "").upper()
+        if symbol not in FUTURES_SYMBOLS:
+            return self.error(-1121, "Invalid symbol.")
+        if order_type not in ORDER_TYPES:
+            return self.error(-1116, "Invalid orderType.")
+        if order_type == "TRAILING_STOP_MARKET" and "callbackRate" not in params:
+            return self.error(-1102, "Mandatory parameter 'callbackRate' was not sent, was empty/null, "
+                                     "or malformed.")
+
+        stop_price = float(params["stopPrice"]) if "stopPrice" in params else None
+        trail_rate = None
+        if order_type == "TRAILING_STOP_MARKET":
+            # callbackRate is a percentage, the stop trails the extreme price by that fraction
+            trail_rate = float(params["callbackRate"]) / 100
+            stop_price = None
+
+        order = Order(id=self.account.next_id(),
+                      symbol=symbol,
+                      side=params.get("side", "").lower(),
+                      type=ORDER_TYPES[order_type],
+                      qty=float(params.get("quantity", 0)),
+                      price=float(params["price"]) if "price" in params else None,
+                      stop_price=stop_price,
+                      reduce_only=str(params.get("reduceOnly", "false")).lower() == "true",
+                      close_on_trigger=str(params.get("closePosition", "false")).lower() == "true",
+                      time_in_force=params.get("timeInForce", "GTC"),
+                      trail_rate=trail_rate,
+                      params={"callbackRate": params.get("callbackRate"),
+                              "activationPrice": params.get("activationPrice") or str(self.market.mid_price(symbol)),
+                              "clientOrderId": params.get("newClientOrderId", "")})
+        self.account.place_order(order)
+        return 200, self._order(order)
+
+    def delete_all_open_orders(self, request: Request) -> tuple:
+        self.account.cancel_all(request.params.get("symbol"))
+        return 200, {"code": 200, "msg": "The operation of cancel all open order is done."}
+
+    def get_position_side(self, request: Request) -> tuple:
+        return 200, {"dualSidePosition": self.account.position_mode == HEDGE}
+
+    def post_position_side(self, request: Request) -> tuple:
+        mode = HEDGE if str(request.params.get("dualSidePosition")).lower() == "true" else ONE_WAY
+        if mode == self.account.position_mode:
+            return self.error(-4059, "No need to change position side.")
+        if self.account.active_positions() or self.account.open_orders():
+            return self.error(-4068, "Position side cannot be changed if there exists position.")
+
+        self.account.position_mode = mode
+        return 200, {"code": 200, "msg": "success"}
+
+    def post_margin_type(self, request: Request) -> tuple:
+        symbol = request.params.get("symbol")
+        mode = ISOLATED if request.params.get("marginType") == "ISOLATED" else CROSS
+        if self.account.margin_mode(symbol) == mode:
+            return self.error(-4046, "No need to change margin type.")
+        if self.account.active_positions(symbol):
+            return self.error(-4048, "Margin type cannot be changed if there exists position.")
+
+        self.account.margin_modes[symbol] = mode
+        return 200, {"code": 200, "msg": "success"}
+
+    def post_leverage(self, request: Request) -> tuple:
+        symbol = request.params.get("symbol")
+        leverage = int(request.params.get("leverage"))
+        self.account.leverages[symbol] = (leverage, leverage)
+        return 200, {"leverage": leverage, "maxNotionalValue": "3000000", "symbol": symbol}
+
+    def _order(self, order: Order) -> dict:
+        origin_type = next(k for k, v in ORDER_TYPES.items() if v == order.type)
+        result = {
+            "orderId": int(order.id),
+            "symbol": order.symbol,
+            "status": _status(order),
+            "clientOrderId": order.params.get("clientOrderId") or "sim{}".format(order.id),
+            "price": str(order.price or 0),
+            "avgPrice": str(order.avg_price),
+            "origQty": str(order.qty),
+            "executedQty": str(order.filled),
+            "cumQty": str(order.filled),
+            "cumQuote": str(round(order.filled * order.avg_price, 8)),
+            "timeInForce": order.time_in_force,
+            "type": origin_type,
+            "reduceOnly": order.reduce_only,
+            "closePosition": order.close_on_trigger,
+            "side": order.side.upper(),
+            "positionSide": "BOTH",
+            "stopPrice": str(order.stop_price or 0),
+            "workingType": "CONTRACT_PRICE",
+            "priceProtect": False,
+            "origType": origin_type,
+            "time": order.created_ms,
+            "updateTime": order.updated_ms,
+        }
+        if order.type == "trailing_stop_market":
+            result["activatePrice"] = order.params.get("activationPrice")
+            result["priceRate"] = str(order.params.get("callbackRate"))
+        return result
+
+    def _position_risk(self, symbol: str) -> dict:
+        position = self.account.position(symbol)
+        leverage = self.account.leverage(symbol)[0]
+        mark = self.market.mid_price(symbol)
+        isolated = self.account.margin_mode(symbol) == ISOLATED
+        margin = abs(position.size) * position.entry_price / leverage
+        return {
+            "symbol": symbol,
+            "positionAmt": str(position.size),
+            "entryPrice": str(position.entry_price),
+            "markPrice": str(mark),
+            "unRealizedProfit": str(round(position.size * (mark - position.entry_price), 8)),
+            "liquidationPrice": "0",
+            "leverage": str(leverage),
+            "maxNotionalValue": "3000000",
+            "marginType": "isolated" if isolated else "cross",
+            "isolatedMargin": str(margin if isolated else 0),
+            "isAutoAddMargin": "false",
+            "positionSide": "BOTH",
+            "notional": str(round(position.size * mark, 8)),
+            "isolatedWallet": str(margin if isolated else 0),
+            "updateTime": 0,
+        }
+
+    def _initial_margin(self) -> float:
+        return round(sum(abs(x.size) * x.entry_price / self.account.leverage(x.symbol)[0]
+                         for x in self.account.active_positions()), 8)
+
+    @staticmethod
+    def _now() -> int:
+        return int(time.time() * 1000)
+
+
+def _status(order: Order) -> str:
+    # Binance expires what an IOC, FOK or market order could not fill, CANCELED is left for cancel requests
+    if order.status == "canceled" and (order.type == "market" or order.time_in_force in ("IOC", "FOK")):
+        return "EXPIRED"
+    return ORDER_STATUSES[order.status]
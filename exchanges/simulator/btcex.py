@@ -0,0 +1,114 @@
+import time
+
+from exchanges.simulator.market import DAY_MS, SyntheticMarket
+from exchanges.simulator.venue import Request, Venue
+
+RESOLUTIONS_MS = {
+    "1": 60 * 1000,
+    "5": 5 * 60 * 1000,
+    "15": 15 * 60 * 1000,
+    "60": 60 * 60 * 1000,
+    "1D": DAY_MS,
+}
+
+PERPETUALS = {
+    "BTC-USDT-PERPETUAL": {"symbol": "BTCUSDT", "show_name": "BTCUSDT", "quote_currency": "BTC",
+                           "creation_timestamp": "1631004005882", "leverage": 200, "min_qty": "0.001"},
+    "ETH-USDT-PERPETUAL": {"symbol": "ETHUSDT", "show_name": "ETHUSDT", "quote_currency": "ETH",
+                           "creation_timestamp": "1631004005882", "leverage": 100, "min_qty": "0.01"},
+}
+
+
+class BtcexVenue(Venue):
+    name = "btcex"
+
+    def __init__(self, market: SyntheticMarket) -> None:
+        super().__init__(market)
+
+        self.route("GET", "/api/v1/public/get_order_book", self.get_order_book)
+        self.route("GET", "/api/v1/public/get_tradingview_chart_data", self.get_tradingview_chart_data)
+        self.route("GET", "/api/v1/public/get_instruments", self.get_instruments)
+
+    @staticmethod
+    def ok(result) -> tuple:
+        now = int(time.time() * 1000000)
+        return 200, {"id": None, "jsonrpc": "2.0", "usIn": now, "usOut": now, "usDiff": 0, "result": result}
+
+    @staticmethod
+    def error(code: int, message: str) -> tuple:
+        return 200, {"id": None, "jsonrpc": "2.0", "error": {"code": code, "message": message}}
+
+    def internal_error(self, request: Request, error: Exception) -> tuple:
+        return 500, self.error(9999, "System error, please try again later")[1]
+
+    def get_order_book(self, request: Request) -> tuple:
+        instrument_name = request.params.get("instrument_name")
+        symbol = self._symbol(instrument_name)
+        if symbol is None:
+            return self.error(10001, "instrument_name is invalid")
+
+        bids, asks, sequence = self.market.live_order_book(symbol, limit=int(request.params.get("depth", 20)))
+        return self.ok({
+            "timestamp": str(int(time.time() * 1000)),
+            "change_id": sequence,
+            "instrument_name": instrument_name,
+            "bids": [[str(price), str(size)] for price, size in bids],
+            "asks": [[str(price), str(size)] for price, size in asks],
+        })
+
+    def get_tradingview_chart_data(self, request: Request) -> tuple:
+        symbol = self._symbol(request.params.get("instrument_name"))
+        interval_ms = RESOLUTIONS_MS.get(request.params.get("resolution"))
+        if symbol is None or interval_ms is None:
+            return self.error(10001, "instrument_name or resolution is invalid")
+
+        # The exchange tolerates swapped or malformed bounds, so do the same here
+        bounds = [self._seconds(request.params.get("start_timestamp")),
+                  self._seconds(request.params.get("end_timestamp"))]
+        bounds = sorted(x for x in bounds if x is not None)
+        end_ms = bounds[-1] * 1000 if bounds else None
+        limit = min(1000, (bounds[1] - bounds[0]) * 1000 // interval_ms + 1) if len(bounds) == 2 else 30
+        bars = self.market.klines(symbol, interval_ms, limit, end_ms)
+        if len(bounds) == 2:
+            bars = [x for x in bars if x[0] >= bounds[0] * 1000] or bars
+
+        return self.ok([{"tick": open_time // 1000, "open": str(open_), "high": str(high), "low": str(low),
+                         "close": str(close), "volume": str(volume), "cost": str(round(volume * close, 2))}
+                        for open_time, open_, high, low, close, volume in bars])
+
+    def get_instruments(self, request: Request) -> tuple:
+        result = []
+        for instrument_name, spec in PERPETUALS.items():
+            instrument = self.market.instrument(spec["symbol"])
+            result.append({
+                "instrument_name": instrument_name,
+                "currency": request.params.get("currency", "PERPETUAL"),
+                "show_name": spec["show_name"],
+                "quote_currency": spec["quote_currency"],
+                "base_currency": request.params.get("base_currency", "USDT"),
+                "creation_timestamp": spec["creation_timestamp"],
+                "expiration_timestamp": "4102444800000",
+                "is_active": True,
+                "kind": "perpetual",
+                "leverage": spec["leverage"],
+                "min_qty": spec["min_qty"],
+                "min_notional": "0",
+                "tick_size": str(instrument.tick_size),
+                "price_precision": 1,
+                "amount_precision": 3,
+            })
+        return self.ok(result)
+
+    def _symbol(self, instrument_name: str) -> str:
+        if instrument_name in PERPETUALS:
+            return PERPETUALS[instrument_name]["symbol"]
+
+        symbol = "".join((instrument_name or "").split("-")[:2])
+        return symbol if symbol in self.market.instruments else None
+
+    @staticmethod
+    def _seconds(value: str) -> int:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
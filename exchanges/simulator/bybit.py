@@ -0,0 +1,344 @@
+import time
+
+from exchanges.simulator.account import CROSS, HEDGE, ISOLATED, ONE_WAY, Order, SimulatedAccount
+from exchanges.simulator.market import DAY_MS, SyntheticMarket
+from exchanges.simulator.venue import Request, Venue
+
+INTERVALS_MS = {
+    "1": 60 * 1000,
+    "5": 5 * 60 * 1000,
+    "15": 15 * 60 * 1000,
+    "60": 60 * 60 * 1000,
+    "240": 4 * 60 * 60 * 1000,
+    "D": DAY_MS,
+}
+
+LINEAR_SYMBOLS = {
+    "BTCUSDT": {"launchTime": "1585526400000", "priceScale": "2", "maxLeverage": "100.00",
+                "maxOrderQty": "100.000", "minOrderQty": "0.001", "qtyStep": "0.001", "tickSize": "0.10"},
+    "ETHUSDT": {"launchTime": "1615766400000", "priceScale": "2", "maxLeverage": "100.00",
+                "maxOrderQty": "1500.00", "minOrderQty": "0.01", "qtyStep": "0.01", "tickSize": "0.01"},
+    "SOLUSDT": {"launchTime": "1635206400000", "priceScale": "3", "maxLeverage": "50.00",
+                "maxOrderQty": "79770.0", "minOrderQty": "0.1", "qtyStep": "0.1", "tickSize": "0.001"},
+    "DOGEUSDT": {"launchTime": "1620604800000", "priceScale": "5", "maxLeverage": "50.00",
+                 "maxOrderQty": "7718750", "minOrderQty": "1", "qtyStep": "1", "tickSize": "0.00001"},
+}
+
+ORDER_STATUSES = {
+    "new": "New",
+    "untriggered": "Untriggered",
+    "partially_filled": "PartiallyFilled",
+    "filled": "Filled",
+    "canceled": "Cancelled",
+    "rejected": "Rejected",
+}
+
+STOP_ORDER_TYPES = {
+    "take_profit_market": "TakeProfit",
+    "stop_market": "StopLoss",
+    "trailing_stop_market": "TrailingStop",
+}
+
+
+class BybitVenue(Venue):
+    name = "bybit"
+
+    def __init__(self, market: SyntheticMarket) -> None:
+        super().__init__(market)
+        self.account = SimulatedAccount(market, default_leverage=10, id_format="1a2b3c4d-0000-4000-8000-{:012d}")
+
+        self.route("GET", "/v5/market/orderbook", self.get_orderbook)
+        self.route("GET", "/v5/market/kline", self.get_kline)
+        self.route("GET", "/v5/market/instruments-info", self.get_instruments_info)
+        self.route("GET", "/v5/account/wallet-balance", self.get_wallet_balance)
+        self.route("POST", "/v5/order/create", self.place_order)
+        self.route("GET", "/v5/order/realtime", self.get_open_orders)
+        self.route("POST", "/v5/order/cancel-all", self.cancel_all_orders)
+        self.route("GET", "/v5/position/list", self.get_positions)
+        self.route("POST", "/v5/position/set-leverage", self.set_leverage)
+        self.route("POST", "/v5/position/switch-isolated", self.switch_margin_mode)
+        self.route("POST", "/v5/position/switch-mode", self.switch_position_mode)
+        self.route("POST", "/v5/position/trading-stop", self.set_trading_stop)
+
+    @staticmethod
+    def ok(result: dict) -> tuple:
+        return 200, {"retCode": 0, "retMsg": "OK", "result": result, "retExtInfo": {},
+                     "time": int(time.time() * 1000)}
+
+    @staticmethod
+    def error(code: int, msg: str) -> tuple:
+        return 200, {"retCode": code, "retMsg": msg, "result": {}, "retExtInfo": {},
+                     "time": int(time.time() * 1000)}
+
+    def internal_error(self, request: Request, error: Exception) -> tuple:
+        return 500, self.error(10016, "System error. Please try again later.")[1]
+
+    def get_orderbook(self, request: Request) -> tuple:
+        symbol = request.params.get("symbol")
+        if symbol not in self.market.instruments:
+            return self.error(10001, "params error: symbol invalid")
+
+        bids, asks, sequence = self.market.live_order_book(symbol, limit=int(request.params.get("limit", 25)))
+        return self.ok({
+            "s": symbol,
+            "b": [[str(price), str(size)] for price, size in bids],
+            "a": [[str(price), str(size)] for price, size in asks],
+            "ts": int(time.time() * 1000),
+            "u": sequence,
+        })
+
+    def get_kline(self, request: Request) -> tuple:
+        symbol = request.params.get("symbol")
+        interval = request.params.get("interval")
+        if symbol not in self.market.instruments or interval not in INTERVALS_MS:
+            return self.error(10001, "params error: invalid symbol or interval")
+
+        end_ms = int(request.params["end"]) if "end" in request.params else None
+        bars = self.market.klines(symbol, INTERVALS_MS[interval], int(request.params.get("limit", 200)), end_ms)
+        if "start" in request.params:
+            bars = [x for x in bars if x[0] >= int(request.params["start"])]
+
+        return self.ok({
+            "category": request.params.get("category"),
+            "symbol": symbol,
+            "list": [[str(open_time), str(open_), str(high), str(low), str(close), str(volume),
+                      str(round(volume * close, 4))]
+                     for open_time, open_, high, low, close, volume in reversed(bars)],
+        })
+
+    def get_instruments_info(self, request: Request) -> tuple:
+        symbols = [request.params["symbol"]] if "symbol" in request.params else list(LINEAR_SYMBOLS)
+        instruments = []
+        for symbol in symbols:
+            spec = LINEAR_SYMBOLS[symbol]
+            instrument = self.market.instrument(symbol)
+            instruments.append({
+                "symbol": symbol,
+                "contractType": "LinearPerpetual",
+                "status": "Trading",
+                "baseCoin": instrument.base,
+                "quoteCoin": instrument.quote,
+                "launchTime": spec["launchTime"],
+                "deliveryTime": "0",
+                "deliveryFeeRate": "",
+                "priceScale": spec["priceScale"],
+                "leverageFilter": {"minLeverage": "1", "maxLeverage": spec["maxLeverage"], "leverageStep": "0.01"},
+                "priceFilter": {"minPrice": spec["tickSize"], "maxPrice": "199999.80", "tickSize": spec["tickSize"]},
+                "lotSizeFilter": {"maxOrderQty": spec["maxOrderQty"], "minOrderQty": spec["minOrderQty"],
+                                  "qtyStep": spec["qtyStep"], "postOnlyMaxOrderQty": spec["maxOrderQty"]},
+                "unifiedMarginTrade": True,
+                "fundingInterval": 480,
+                "settleCoin": instrument.quote,
+            })
+        return self.ok({"category": request.params.get("category"), "list": instruments, "nextPageCursor": ""})
+
+    def get_wallet_balance(self, request: Request) -> tuple:
+        balance = self.account.balance
+        used = round(sum(abs(x.size) * x.entry_price / self.account.leverage(x.symbol)[0]
+                         for x in self.account.active_positions()), 8)
+        return self.ok({"list": [{
+            "accountType": request.params.get("accountType", "CONTRACT"),
+            "totalEquity": str(balance),
+            "totalWalletBalance": str(balance),
+            "totalAvailableBalance": str(balance - used),
+            "coin": [{
+                "coin": "USDT",
+                "equity": str(balance),
+                "walletBalance": str(balance),
+                "positionIM": str(used),
+                "orderIM": "0",
+                "availableToWithdraw": str(balance - used),
+                "unrealisedPnl": "0",
+                "cumRealisedPnl": "0",
+            }],
+        }]})
+
+    def place_order(self, request: Request) -> tuple:
+        params = request.params
+        symbol = params.get("symbol")
+        if symbol not in LINEAR_SYMBOLS:
+            return self.error(10001, "params error: symbol invalid")
+
+        position_idx = int(params.get("positionIdx") or 0)
+        error = self._check_position_idx(position_idx)
+        if error:
+            return error
+
+        order_type = params.get("orderType", "").lower()
+        if order_type not in ("market", "limit"):
+            return self.error(10001, "params error: OrderType invalid")
+        price = self._number(params.get("price"))
+        if order_type == "limit" and price is None:
+            return self.error(10001, "params error: price is required for limit order")
+
+        order = Order(id=self.account.next_id(),
+                      symbol=symbol,
+                      side=params.get("side", "").lower(),
+                      type=order_type,
+                      qty=float(params["qty"]),
+                      price=price,
+                      stop_price=self._number(params.get("triggerPrice")),
+                      reduce_only=bool(params.get("reduceOnly")),
+                      close_on_trigger=bool(params.get("closeOnTrigger")),
+                      time_in_force=params.get("timeInForce", "GTC"),
+                      position_idx=position_idx,
+                      trigger_direction=int(params.get("triggerDirection") or 0),
+                      take_profit=self._number(params.get("takeProfit")),
+                      stop_loss=self._number(params.get("stopLoss")),
+                      params={"orderLinkId": params.get("orderLinkId", ""),
+                              "triggerDirection": params.get("triggerDirection"),
+                              "takeProfit": params.get("takeProfit", ""),
+                              "stopLoss": params.get("stopLoss", "")})
+        self.account.place_order(order)
+        if order.status == "rejected":
+            return self.error(110017, "current position is zero, cannot fix reduce-only order qty")
+
+        return self.ok({"orderId": order.id, "orderLinkId": order.params["orderLinkId"]})
+
+    def get_open_orders(self, request: Request) -> tuple:
+        orders = self.account.open_orders(request.params.get("symbol"))
+        orders.sort(key=lambda x: (x.created_ms, int(x.id.split("-")[-1])), reverse=True)
+        return self.ok({"list": [self._order(x) for x in orders], "nextPageCursor": "",
+                        "category": request.params.get("category")})
+
+    def cancel_all_orders(self, request: Request) -> tuple:
+        cancelled = self.account.cancel_all(request.params.get("symbol"))
+        return self.ok({"list": [{"orderId": x.id, "orderLinkId": x.params.get("orderLinkId", "")}
+                                 for x in cancelled]})
+
+    def get_positions(self, request: Request) -> tuple:
+        symbol = request.params.get("symbol")
+        if symbol in LINEAR_SYMBOLS:
+            # Query by symbol returns the flat positions too, they carry the symbol settings
+            indexes = (1, 2) if self.account.position_mode == HEDGE else (0,)
+            positions = [self.account.position(symbol, x) for x in indexes]
+        else:
+            positions = self.account.active_positions(symbol)
+        positions.sort(key=lambda x: (x.symbol, x.position_idx))
+        return self.ok({"list": [self._position(x) for x in positions], "nextPageCursor": "",
+                        "category": request.params.get("category")})
+
+    def set_leverage(self, request: Request) -> tuple:
+        symbol = request.params.get("symbol")
+        buy = int(float(request.params.get("buyLeverage")))
+        sell = int(float(request.params.get("sellLeverage")))
+        if self.account.position_mode == ONE_WAY and buy != sell:
+            return self.error(10001, "buy leverage must be equal to sell leverage in one-way mode")
+        if self.account.leverage(symbol) == (buy, sell):
+            return self.error(110043, "Set leverage not modified")
+
+        self.account.leverages[symbol] = (buy, sell)
+        return self.ok({})
+
+    def switch_margin_mode(self, request: Request) -> tuple:
+        symbol = request.params.get("symbol")
+        mode = ISOLATED if int(request.params.get("tradeMode")) == 1 else CROSS
+        if self.account.margin_mode(symbol) == mode:
+            return self.error(110026, "Cross/isolated margin mode is not modified")
+        if self.account.active_positions(symbol):
+            return self.error(110027, "Margin is not modified when position exists")
+
+        self.account.margin_modes[symbol] = mode
+        self.account.leverages[symbol] = (int(float(request.params.get("buyLeverage"))),
+                                          int(float(request.params.get("sellLeverage"))))
+        return self.ok({})
+
+    def switch_position_mode(self, request: Request) -> tuple:
+        mode = HEDGE if int(request.params.get("mode")) == 3 else ONE_WAY
+        if mode != self.account.position_mode and self.account.active_positions():
+            return self.error(110024, "You have an existing position, so position mode cannot be switched")
+
+        self.account.position_mode = mode
+        return self.ok({})
+
+    def set_trading_stop(self, request: Request) -> tuple:
+        symbol = request.params.get("symbol")
+        position_idx = int(request.params.get("positionIdx") or 0)
+        position = self.account.position(symbol, position_idx)
+        if position.size == 0:
+            return self.error(10001, "can not set tp/sl/ts for zero position")
+
+        for key in ("takeProfit", "stopLoss", "trailingStop", "activePrice"):
+            if key in request.params:
+                position.params[key] = request.params[key]
+
+        # Every position level stop is a reduce-only conditional order closing the whole position, "0" removes it
+        side = "sell" if position.size > 0 else "buy"
+        for key, order_type in (("takeProfit", "take_profit_market"), ("stopLoss", "stop_market"),
+                                ("trailingStop", "trailing_stop_market")):
+            value = self._number(request.params.get(key))
+            if value is None:
+                continue
+
+            previous = position.params.get("orders", {}).pop(key, None)
+            if previous is not None:
+                self.account.cancel_order(previous)
+            if not value:
+                continue
+
+            order = Order(id=self.account.next_id(), symbol=symbol, side=side, type=order_type, qty=abs(position.size),
+                          reduce_only=True, close_on_trigger=True, position_idx=position_idx)
+            if key == "trailingStop":
+                order.trail_offset = value
+            else:
+                order.stop_price = value
+            self.account.place_order(order)
+            position.params.setdefault("orders", {})[key] = order.id
+        return self.ok({})
+
+    @staticmethod
+    def _number(value) -> float:
+        # pybit casts every price to str, so a missing price arrives as "None"
+        if value in (None, "", "None"):
+            return None
+        return float(value)
+
+    def _check_position_idx(self, position_idx: int) -> tuple:
+        if (self.account.position_mode == ONE_WAY) != (position_idx == 0):
+            return self.error(10001, "position idx not match position mode")
+        return None
+
+    def _order(self, order: Order) -> dict:
+        return {
+            "orderId": order.id,
+            "orderLinkId": order.params.get("orderLinkId", ""),
+            "symbol": order.symbol,
+            "price": str(order.price or 0),
+            "qty": str(order.qty),
+            "side": order.side.capitalize(),
+            "positionIdx": order.position_idx,
+            "orderStatus": ORDER_STATUSES[order.status],
+            "avgPrice": str(order.avg_price),
+            "leavesQty": str(round(order.qty - order.filled, 8)),
+            "cumExecQty": str(order.filled),
+            "timeInForce": order.time_in_force,
+            "orderType": "Limit" if order.type == "limit" else "Market",
+            "stopOrderType": STOP_ORDER_TYPES.get(order.type, "Stop" if order.stop_price is not None else ""),
+            "triggerPrice": str(order.stop_price or ""),
+            "triggerDirection": int(order.params.get("triggerDirection") or 0),
+            "takeProfit": order.params.get("takeProfit", ""),
+            "stopLoss": order.params.get("stopLoss", ""),
+            "reduceOnly": order.reduce_only,
+            "createdTime": str(order.created_ms),
+            "updatedTime": str(order.updated_ms),
+        }
+
+    def _position(self, position) -> dict:
+        buy, sell = self.account.leverage(position.symbol)
+        mark = self.market.mid_price(position.symbol)
+        return {
+            "positionIdx": position.position_idx,
+            "symbol": position.symbol,
+            "side": "Buy" if position.size > 0 else "Sell" if position.size < 0 else "None",
+            "size": str(abs(position.size)),
+            "avgPrice": str(position.entry_price),
+            "positionValue": str(round(abs(position.size) * position.entry_price, 8)),
+            "tradeMode": 1 if self.account.margin_mode(position.symbol) == ISOLATED else 0,
+            "leverage": str(sell if position.position_idx == 2 or position.size < 0 else buy),
+            "markPrice": str(mark),
+            "unrealisedPnl": str(round(position.size * (mark - position.entry_price), 8)),
+            "takeProfit": position.params.get("takeProfit", "0.00"),
+            "stopLoss": position.params.get("stopLoss", "0.00"),
+            "trailingStop": position.params.get("trailingStop", "0.00"),
+            "positionStatus": "Normal",
+        }
@@ -0,0 +1,74 @@
+import re
+from urllib.parse import urlsplit
+
+from exchanges.simulator.server import SimulatorServer
+
+HOSTS = {
+    "api.binance.com": "binance",
+    "fstream.binance.com": "binance",
+    "stream.binance.com": "binance",
+    "fapi.binance.com": "binance",
+    "dapi.binance.com": "binance",
+    "testnet.binancefuture.com": "binance",
+    "testnet.binance.vision": "binance",
+    "api.bybit.com": "bybit",
+    "api-testnet.bybit.com": "bybit",
+    "stream.bybit.com": "bybit",
+    "stream-testnet.bybit.com": "bybit",
+    "api.phemex.com": "phemex",
+    "testnet-api.phemex.com": "phemex",
+    "ws.phemex.com": "phemex",
+    "api.btcex.com": "btcex",
+}
+
+SIMULATOR_CREDENTIALS = ("simulator", "simulator")
+
+_ORIGIN = re.compile(r"^https?://[^/]+")
+_WS_ORIGIN = re.compile(r"^wss?://[^/]+")
+
+
+def route_url(url: str, simulator: SimulatorServer) -> str:
+    """
+    Rewrites a real exchange url to the same path on the simulator, e.g.
+    https://fapi.binance.com/fapi/v1/klines -> http://127.0.0.1:<port>/binance/fapi/v1/klines.
+    """
+    venue = HOSTS.get(urlsplit(url).hostname)
+    if venue is None:
+        raise ValueError("Simulator does not serve {}".format(url))
+    return _ORIGIN.sub(simulator.venue_url(venue), url)
+
+
+def route_stream_url(url: str, simulator: SimulatorServer) -> str:
+    """
+    Rewrites a real exchange WebSocket url to the simulator, e.g.
+    wss://stream.bybit.com/v5/public/linear -> ws://127.0.0.1:<port>/bybit/v5/public/linear.
+    """
+    venue = HOSTS.get(urlsplit(url).hostname)
+    if venue is None:
+        raise ValueError("Simulator does not serve {}".format(url))
+    return _WS_ORIGIN.sub(simulator.stream_url(venue), url)
+
+
+def route_ccxt(exchange, venue: str, simulator: SimulatorServer) -> None:
+    """
+    Points every api url of a ccxt exchange at the simulator.
+
+    Must be called after set_sandbox_mode, which swaps the url table. The client side rate limiter is switched off,
+    the simulator has no request weight to protect.
+    """
+    exchange.urls["api"] = _rewrite(exchange.urls["api"], simulator.venue_url(venue))
+    exchange.enableRateLimit = False
+    if not exchange.apiKey and not exchange.secret:
+        exchange.apiKey, exchange.secret = SIMULATOR_CREDENTIALS
+
+
+def route_pybit(client, simulator: SimulatorServer) -> None:
+    client.endpoint = simulator.venue_url("bybit")
+    if not client.api_key and not client.api_secret:
+        client.api_key, client.api_secret = SIMULATOR_CREDENTIALS
+
+
+def _rewrite(urls, base_url: str):
+    if isinstance(urls, dict):
+        return {key: _rewrite(value, base_url) for key, value in urls.items()}
+    return _ORIGIN.sub(base_url, urls.replace("{hostname}", "simulator"))
@@ -0,0 +1,128 @@
+import random
+import time
+from dataclasses import dataclass
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+@dataclass(frozen=True)
+class Instrument:
+    symbol: str
+    base: str
+    quote: str
+    price: float
+    tick_size: float
+    step_size: float
+
+
+INSTRUMENTS = {
+    "BTCUSDT": Instrument("BTCUSDT", "BTC", "USDT", 27000.0, 0.1, 0.001),
+    "ETHUSDT": Instrument("ETHUSDT", "ETH", "USDT", 1900.0, 0.01, 0.001),
+    "SOLUSDT": Instrument("SOLUSDT", "SOL", "USDT", 21.0, 0.001, 1.0),
+    "DOGEUSDT": Instrument("DOGEUSDT", "DOGE", "USDT", 0.07, 0.00001, 1.0),
+    "BTCUSD": Instrument("BTCUSD", "BTC", "USD", 27000.0, 0.5, 1.0),
+}
+
+
+class SyntheticMarket:
+    """
+    Deterministic market data shared by all simulated venues.
+
+    Prices never move on their own, so every run sees the same book and the same bars. Only the sizes of a few levels
+    of the live book change, once every `book_interval` seconds.
+    """
+
+    def __init__(self, seed: int = 42, depth: int = 50, book_interval: float = 0.05) -> None:
+        self.seed = seed
+        self.depth = depth
+        self.book_interval = book_interval
+        self.instruments = dict(INSTRUMENTS)
+
+    def instrument(self, symbol: str) -> Instrument:
+        return self.instruments[symbol]
+
+    def mid_price(self, symbol: str) -> float:
+        return self.instrument(symbol).price
+
+    def best_bid(self, symbol: str) -> float:
+        instrument = self.instrument(symbol)
+        return round(instrument.price - instrument.tick_size, 8)
+
+    def best_ask(self, symbol: str) -> float:
+        instrument = self.instrument(symbol)
+        return round(instrument.price + instrument.tick_size, 8)
+
+    def order_book(self, symbol: str, limit: int = None) -> tuple:
+        instrument = self.instrument(symbol)
+        levels = min(limit or self.depth, self.depth)
+        rnd = random.Random("{}-{}-book".format(self.seed, symbol))
+
+        bids = []
+        asks = []
+        for i in range(levels):
+            offset = instrument.tick_size * (i + 1)
+            bids.append((round(instrument.price - offset, 8), self._level_size(rnd, instrument)))
+            asks.append((round(instrument.price + offset, 8), self._level_size(rnd, instrument)))
+
+        return bids, asks
+
+    def book_sequence(self) -> int:
+        """
+        Returns the update id of the live book, the number of book intervals since the epoch.
+        """
+        return int(time.time() / self.book_interval)
+
+    def live_order_book(self, symbol: str, sequence: int = None, limit: int = None) -> tuple:
+        """
+        Returns the bids, asks and update id of the live book at `sequence`, the current one by default. The book
+        is the static one with three levels per side resized, a function of the update id alone so REST snapshots
+        and streams agree on it.
+        """
+        sequence = sequence if sequence is not None else self.book_sequence()
+        instrument = self.instrument(symbol)
+        bids, asks = self.order_book(symbol)
+        rnd = random.Random("{}-{}-{}-live".format(self.seed, symbol, sequence))
+        books = []
+        for levels in (bids, asks):
+            levels = list(levels)
+            for index in rnd.sample(range(len(levels)), 3):
+                price, size = levels[index]
+                levels[index] = (price, round(size + rnd.randint(1, 20) * instrument.step_size, 8))
+            books.append(levels[:min(limit or self.depth, self.depth)])
+        return books[0], books[1], sequence
+
+    def klines(self, symbol: str, interval_ms: int = DAY_MS, limit: int = 500, end_ms: int = None) -> list:
+        """
+        Returns `limit` bars as (open_time, open, high, low, close, volume) tuples, oldest first.
+        """
+        instrument = self.instrument(symbol)
+        end_ms = end_ms if end_ms is not None else int(time.time() * 1000)
+        last_open = end_ms - end_ms % interval_ms
+
+        bars = []
+        close = instrument.price
+        for i in range(limit):
+            open_time = last_open - i * interval_ms
+            rnd = random.Random("{}-{}-{}-{}".format(self.seed, symbol, interval_ms, open_time))
+            open_ = close * (1 + rnd.uniform(-0.02, 0.02))
+            high = max(open_, close) * (1 + rnd.uniform(0, 0.01))
+            low = min(open_, close) * (1 - rnd.uniform(0, 0.01))
+            volume = rnd.uniform(1000, 5000)
+            bars.append((open_time,
+                         self._round_price(instrument, open_),
+                         self._round_price(instrument, high),
+                         self._round_price(instrument, low),
+                         self._round_price(instrument, close),
+                         round(volume, 3)))
+            close = open_
+
+        bars.reverse()
+        return bars
+
+    @staticmethod
+    def _round_price(instrument: Instrument, price: float) -> float:
+        return round(round(price / instrument.tick_size) * instrument.tick_size, 8)
+
+    @staticmethod
+    def _level_size(rnd: random.Random, instrument: Instrument) -> float:
+        return round(rnd.randint(1, 500) * instrument.step_size, 8)
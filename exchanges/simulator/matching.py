@@ -0,0 +1,377 @@
+import heapq
+from collections import deque
+
+BUY = "buy"
+SELL = "sell"
+
+RISE = 1
+FALL = 2
+
+
+class Fill:
+    __slots__ = ("maker", "taker", "price", "qty")
+
+    def __init__(self, maker, taker, price: float, qty: float) -> None:
+        self.maker = maker
+        self.taker = taker
+        self.price = price
+        self.qty = qty
+
+
+class _Level:
+    """
+    FIFO queue of resting orders at one price. Cancelled orders stay in the queue and are skipped lazily,
+    `live` counts the ones which can still trade.
+    """
+    __slots__ = ("orders", "live")
+
+    def __init__(self) -> None:
+        self.orders = deque()
+        self.live = 0
+
+
+class OrderBook:
+    """
+    Price-time priority book of one symbol.
+
+    Every side keeps a dict price -> level and a heap of prices, so the best price is found in O(log n) and
+    a level is reached in O(1). Empty levels are dropped from the heap lazily.
+    """
+
+    def __init__(self, symbol: str) -> None:
+        self.symbol = symbol
+        self.bids = {}
+        self.asks = {}
+        self._bid_heap = []
+        self._ask_heap = []
+
+    def best_bid(self) -> float:
+        heap = self._bid_heap
+        while heap:
+            price = -heap[0]
+            if price in self.bids:
+                return price
+            heapq.heappop(heap)
+        return None
+
+    def best_ask(self) -> float:
+        heap = self._ask_heap
+        while heap:
+            price = heap[0]
+            if price in self.asks:
+                return price
+            heapq.heappop(heap)
+        return None
+
+    def depth(self, side: str, levels: int = 10) -> list:
+        """
+        Returns [(price, qty)] of the best `levels` live price levels of one side.
+        """
+        book = self.bids if side == BUY else self.asks
+        prices = heapq.nlargest(levels, book) if side == BUY else heapq.nsmallest(levels, book)
+        return [(price, sum(x.qty - x.filled for x in book[price].orders if x.is_open)) for price in prices]
+
+    def add(self, order) -> None:
+        book = self.bids if order.side == BUY else self.asks
+        level = book.get(order.price)
+        if level is None:
+            level = book[order.price] = _Level()
+            if order.side == BUY:
+                heapq.heappush(self._bid_heap, -order.price)
+            else:
+                heapq.heappush(self._ask_heap, order.price)
+        level.orders.append(order)
+        level.live += 1
+
+    def remove(self, order) -> None:
+        book = self.bids if order.side == BUY else self.asks
+        level = book.get(order.price)
+        if level is None:
+            return
+        level.live -= 1
+        if level.live <= 0:
+            del book[order.price]
+
+    def available(self, side: str, limit_price: float = None) -> float:
+        """
+        Quantity a taker on `side` could execute up to `limit_price`.
+        """
+        if side == BUY:
+            prices = sorted(x for x in self.asks if limit_price is None or x <= limit_price)
+            book = self.asks
+        else:
+            prices = sorted((x for x in self.bids if limit_price is None or x >= limit_price), reverse=True)
+            book = self.bids
+        return sum(x.qty - x.filled for price in prices for x in book[price].orders if x.is_open)
+
+
+class MatchingEngine:
+    """
+    Matches orders of one venue in price-time priority and keeps its conditional orders.
+
+    Conditional orders (stops, trailing stops, take profit / stop loss brackets) wait outside of the book and
+    are released as market or limit orders when the last trade price crosses their trigger. The engine knows
+    nothing about positions, `on_trigger` lets the owner resize or veto a triggered reduce-only order.
+    """
+
+    def __init__(self, on_trigger=None) -> None:
+        self.books = {}
+        self.last_prices = {}
+        self.orders = {}
+        self.on_trigger = on_trigger
+        self._rising = {}
+        self._falling = {}
+        self._trailing = {}
+        self._sequence = 0
+
+    def book(self, symbol: str) -> OrderBook:
+        book = self.books.get(symbol)
+        if book is None:
+            book = self.books[symbol] = OrderBook(symbol)
+        return book
+
+    def last_price(self, symbol: str) -> float:
+        price = self.last_prices.get(symbol)
+        if price is None:
+            book = self.book(symbol)
+            bid, ask = book.best_bid(), book.best_ask()
+            if bid is not None and ask is not None:
+                price = (bid + ask) / 2
+            else:
+                price = bid if bid is not None else ask
+        return price
+
+    def submit(self, order) -> list:
+        """
+        Matches or rests `order` and returns the list of fills it caused, triggered orders included.
+        """
+        self.orders[order.id] = order
+        if order.is_conditional:
+            self._arm(order)
+            return []
+
+        fills = self._execute(order)
+        if fills:
+            fills.extend(self.update_price(order.symbol, fills[-1].price))
+        return fills
+
+    def cancel(self, order) -> bool:
+        if not order.is_open:
+            return False
+
+        if order.status == "untriggered":
+            self._disarm(order)
+        elif self._limit(order) is not None:
+            self.book(order.symbol).remove(order)
+        order.status = "canceled"
+        return True
+
+    def update_price(self, symbol: str, price: float) -> list:
+        """
+        Moves the last price of `symbol` and releases every conditional order it triggers.
+        """
+        self.last_prices[symbol] = price
+        fills = []
+        for order in self._triggered(symbol, price):
+            fills.extend(self._release(order))
+        return fills
+
+    def _execute(self, order) -> list:
+        book = self.book(order.symbol)
+        limit = self._limit(order)
+
+        if order.time_in_force in ("PostOnly", "GTX", "PO"):
+            best = book.best_ask() if order.side == BUY else book.best_bid()
+            if best is not None and (order.side == BUY and limit >= best or order.side == SELL and limit <= best):
+                order.status = "rejected"
+                return []
+
+        if order.time_in_force in ("FOK", "FillOrKill"):
+            if book.available(order.side, limit) < order.qty:
+                order.status = "canceled"
+                return []
+
+        fills = self._match(book, order, limit)
+
+        if order.filled >= order.qty - 1e-12:
+            order.status = "filled"
+        elif limit is None or order.time_in_force in ("IOC", "ImmediateOrCancel"):
+            # The rest of an IOC or market order is canceled, partly filled or not, the venues map the status
+            order.status = "canceled"
+        else:
+            order.status = "partially_filled" if order.filled else "new"
+            book.add(order)
+        return fills
+
+    def _match(self, book: OrderBook, taker, limit: float) -> list:
+        fills = []
+        replenish = []
+        if taker.side == BUY:
+            side, best = book.asks, book.best_ask
+        else:
+            side, best = book.bids, book.best_bid
+
+        remaining = taker.qty - taker.filled
+        while remaining > 1e-12:
+            price = best()
+            if price is None:
+                break
+            if limit is not None and (price > limit if taker.side == BUY else price < limit):
+                break
+
+            level = side[price]
+            orders = level.orders
+            while orders and remaining > 1e-12:
+                maker = orders[0]
+                if not maker.is_open:
+                    orders.popleft()
+                    continue
+
+                qty = min(remaining, maker.qty - maker.filled)
+                self._apply(maker, price, qty)
+                self._apply(taker, price, qty)
+                remaining -= qty
+                fills.append(Fill(maker, taker, price, qty))
+
+                if maker.filled >= maker.qty - 1e-12:
+                    maker.status = "filled"
+                    orders.popleft()
+                    level.live -= 1
+                    if maker.owner == "house":
+                        replenish.append(maker)
+                else:
+                    maker.status = "partially_filled"
+
+            if level.live <= 0:
+                del side[price]
+
+        # House liquidity is restored once the taker is done, so a large order still walks the book
+        for maker in replenish:
+            maker.filled = 0.0
+            maker.status = "new"
+            book.add(maker)
+        return fills
+
+    @staticmethod
+    def _limit(order) -> float:
+        if order.price is None or order.type.endswith("market"):
+            return None
+        return order.price
+
+    @staticmethod
+    def _apply(order, price: float, qty: float) -> None:
+        filled = order.filled + qty
+        order.avg_price = (order.avg_price * order.filled + price * qty) / filled
+        order.filled = filled
+
+    def _arm(self, order) -> None:
+        order.status = "untriggered"
+        last = self.last_price(order.symbol)
+
+        if order.trail_rate is not None or order.trail_offset is not None:
+            order.extreme = last
+            order.stop_price = self._trailing_stop(order) if order.stop_price is None else order.stop_price
+            self._trailing.setdefault(order.symbol, {})[order.id] = order
+            return
+
+        direction = order.trigger_direction
+        if not direction:
+            direction = RISE if last is None or order.stop_price > last else FALL
+            order.trigger_direction = direction
+
+        self._sequence += 1
+        if direction == RISE:
+            heapq.heappush(self._rising.setdefault(order.symbol, []), (order.stop_price, self._sequence, order))
+        else:
+            heapq.heappush(self._falling.setdefault(order.symbol, []), (-order.stop_price, self._sequence, order))
+
+    def _disarm(self, order) -> None:
+        # Heap entries are dropped lazily once they are no longer untriggered
+        self._trailing.get(order.symbol, {}).pop(order.id, None)
+
+    def _triggered(self, symbol: str, price: float) -> list:
+        triggered = []
+
+        rising = self._rising.get(symbol)
+        while rising and rising[0][0] <= price:
+            order = heapq.heappop(rising)[2]
+            if order.status == "untriggered":
+                triggered.append(order)
+
+        falling = self._falling.get(symbol)
+        while falling and -falling[0][0] >= price:
+            order = heapq.heappop(falling)[2]
+            if order.status == "untriggered":
+                triggered.append(order)
+
+        trailing = self._trailing.get(symbol)
+        if trailing:
+            for order in list(trailing.values()):
+                if order.side == SELL:
+                    order.extreme = max(order.extreme, price)
+                    order.stop_price = max(order.stop_price, self._trailing_stop(order))
+                    hit = price <= order.stop_price
+                else:
+                    order.extreme = min(order.extreme, price)
+                    order.stop_price = min(order.stop_price, self._trailing_stop(order))
+                    hit = price >= order.stop_price
+                if hit:
+                    del trailing[order.id]
+                    triggered.append(order)
+
+        return triggered
+
+    @staticmethod
+    def _trailing_stop(order) -> float:
+        distance = order.extreme * order.trail_rate if order.trail_rate is not None else order.trail_offset
+        return order.extreme - distance if order.side == SELL else order.extreme + distance
+
+    def _release(self, order) -> list:
+        order.status = "new"
+        for sibling_id in order.linked:
+            sibling = self.orders.get(sibling_id)
+            if sibling is not None and sibling.is_open:
+                self.cancel(sibling)
+
+        if self.on_trigger is not None and not self.on_trigger(order):
+            order.status = "canceled"
+            return []
+
+        fills = self._execute(order)
+        if fills:
+            fills.extend(self.update_price(order.symbol, fills[-1].price))
+        return fills
+
+
+def benchmark(orders: int = 200000, seed: int = 42) -> float:
+    """
+    Feeds a random mix of limit, market and stop orders through one book and returns the orders per second.
+    """
+    import random
+    import time
+
+    from exchanges.simulator.account import Order
+
+    rnd = random.Random(seed)
+    engine = MatchingEngine()
+    engine.last_prices["BTCUSDT"] = 27000.0
+    batch = []
+    for i in range(orders):
+        side = BUY if rnd.random() < 0.5 else SELL
+        kind = rnd.random()
+        if kind < 0.8:
+            offset = rnd.randint(1, 50) / 10
+            price = 27000.0 - offset if side == BUY else 27000.0 + offset
+            batch.append(Order(id=str(i), symbol="BTCUSDT", side=side, type="limit", qty=0.001, price=price))
+        elif kind < 0.95:
+            batch.append(Order(id=str(i), symbol="BTCUSDT", side=side, type="market", qty=0.002))
+        else:
+            stop = 27000.0 + (rnd.randint(1, 50) / 10) * (1 if side == BUY else -1)
+            batch.append(Order(id=str(i), symbol="BTCUSDT", side=side, type="stop_market", qty=0.001,
+                               stop_price=stop))
+
+    start = time.perf_counter()
+    for order in batch:
+        engine.submit(order)
+    return orders / (time.perf_counter() - start)
+
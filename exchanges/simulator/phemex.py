@@ -0,0 +1,419 @@
+import time
+
+from exchanges.simulator.account import HEDGE, ONE_WAY, Order, SimulatedAccount
+from exchanges.simulator.market import SyntheticMarket
+from exchanges.simulator.venue import Request, Venue
+
+PRICE_SCALE = 10000
+
+CURRENCIES = [
+    {"currency": "BTC", "name": "Bitcoin", "code": 1, "valueScale": 8, "minValueEv": 1,
+     "maxValueEv": 5000000000000000000, "needAddrTag": 0, "status": "Listed", "displayCurrency": "BTC"},
+    {"currency": "ETH", "name": "Ethereum", "code": 11, "valueScale": 8, "minValueEv": 1,
+     "maxValueEv": 5000000000000000000, "needAddrTag": 0, "status": "Listed", "displayCurrency": "ETH"},
+    {"currency": "USD", "name": "USD", "code": 2, "valueScale": 4, "minValueEv": 1,
+     "maxValueEv": 500000000000000, "needAddrTag": 0, "status": "Listed", "displayCurrency": "USD"},
+    {"currency": "USDT", "name": "TetherUS", "code": 3, "valueScale": 8, "minValueEv": 1,
+     "maxValueEv": 5000000000000000000, "needAddrTag": 0, "status": "Listed", "displayCurrency": "USDT"},
+]
+
+PERPETUAL_V2 = {
+    "BTCUSDT": {"listTime": 1662854400000, "tickSize": "0.1", "qtyStepSize": "0.001", "maxOrderQtyRq": "100000",
+                "minPriceRp": "1000.0", "maxPriceRp": "2000000.0"},
+    "ETHUSDT": {"listTime": 1662854400000, "tickSize": "0.01", "qtyStepSize": "0.01", "maxOrderQtyRq": "1000000",
+                "minPriceRp": "100.0", "maxPriceRp": "200000.0"},
+}
+
+ORDER_STATUSES = {
+    "new": "New",
+    "untriggered": "Untriggered",
+    "partially_filled": "PartiallyFilled",
+    "filled": "Filled",
+    "canceled": "Canceled",
+    "rejected": "Rejected",
+}
+
+CONDITIONAL_TYPES = ("Stop", "StopLimit", "MarketIfTouched", "LimitIfTouched")
+
+
+class PhemexVenue(Venue):
+    name = "phemex"
+
+    def __init__(self, market: SyntheticMarket) -> None:
+        super().__init__(market)
+        self.account = SimulatedAccount(market, id_format="7d1c5c2a-0000-4000-9000-{:012d}")
+
+        self.route("GET", "/md/orderbook", self.get_orderbook)
+        self.route("GET", "/md/v2/orderbook", self.get_orderbook_v2)
+        self.route("GET", "/exchange/public/md/v2/kline", self.get_kline)
+        self.route("GET", "/public/products", self.get_products)
+        self.route("GET", "/exchange/public/cfg/v2/products", self.get_products)
+        self.route("GET", "/v1/exchange/public/products", self.get_v1_products)
+        self.route("GET", "/spot/wallets", self.get_spot_wallets)
+        self.route("GET", "/g-accounts/accountPositions", self.get_account_positions)
+        self.route("GET", "/g-orders/activeList", self.get_active_orders)
+        self.route("POST", "/g-orders", self.create_order)
+        self.route("DELETE", "/g-orders/all", self.cancel_all_orders)
+        self.route("PUT", "/g-positions/leverage", self.set_leverage)
+        self.route("PUT", "/g-positions/switch-pos-mode-sync", self.switch_position_mode)
+
+    @staticmethod
+    def ok(data) -> tuple:
+        return 200, {"code": 0, "msg": "", "data": data}
+
+    @staticmethod
+    def error(code: int, msg: str) -> tuple:
+        return 200, {"code": code, "msg": msg, "data": None}
+
+    def internal_error(self, request: Request, error: Exception) -> tuple:
+        return 500, self.error(500, "Internal server error")[1]
+
+    def get_orderbook(self, request: Request) -> tuple:
+        symbol = request.params.get("symbol")
+        if symbol not in self.market.instruments:
+            return 200, {"error": {"code": 6001, "message": "invalid argument"}, "id": 0, "result": None}
+
+        bids, asks, sequence = self.market.live_order_book(symbol, limit=30)
+        return 200, {"error": None, "id": 0, "result": {
+            "book": {
+                "asks": [[int(round(price * PRICE_SCALE)), self._book_size(symbol, size)] for price, size in asks],
+                "bids": [[int(round(price * PRICE_SCALE)), self._book_size(symbol, size)] for price, size in bids],
+            },
+            "depth": 30,
+            "sequence": sequence,
+            "timestamp": time.time_ns(),
+            "symbol": symbol,
+            "type": "snapshot",
+        }}
+
+    def get_orderbook_v2(self, request: Request) -> tuple:
+        """
+        Order book of a USDT perpetual, real valued prices and sizes.
+        """
+        symbol = request.params.get("symbol")
+        if symbol not in PERPETUAL_V2:
+            return 200, {"error": {"code": 6001, "message": "invalid argument"}, "id": 0, "result": None}
+
+        bids, asks, sequence = self.market.live_order_book(symbol, limit=30)
+        return 200, {"error": None, "id": 0, "result": {
+            "orderbook_p": {
+                "asks": [[str(price), str(size)] for price, size in asks],
+                "bids": [[str(price), str(size)] for price, size in bids],
+            },
+            "depth": 30,
+            "sequence": sequence,
+            "timestamp": time.time_ns(),
+            "symbol": symbol,
+            "type": "snapshot",
+        }}
+
+    def get_kline(self, request: Request) -> tuple:
+        symbol = request.params.get("symbol")
+        if symbol not in self.market.instruments:
+            return 200, {"code": 30018, "msg": "phemex.data.size.uplimt", "data": None}
+
+        resolution = int(request.params.get("resolution", 86400))
+        limit = int(request.params.get("limit", 100))
+        to = int(request.params["to"]) * 1000 if "to" in request.params else None
+        bars = self.market.klines(symbol, resolution * 1000, limit, to)
+        if "from" in request.params:
+            bars = [x for x in bars if x[0] >= int(request.params["from"]) * 1000]
+
+        rows = []
+        last_close = bars[0][1] if bars else 0
+        for open_time, open_, high, low, close, volume in bars:
+            rows.append([open_time // 1000, resolution, self._ep(last_close), self._ep(open_), self._ep(high),
+                         self._ep(low), self._ep(close), int(volume), int(volume * close)])
+            last_close = close
+
+        return 200, {"code": 0, "msg": "OK", "data": {"total": -1, "rows": rows}}
+
+    def get_products(self, request: Request) -> tuple:
+        products = [self._inverse_product("BTCUSD")] + [self._perpetual_v2(x) for x in PERPETUAL_V2]
+        return self.ok({
+            "ratioScale": 8,
+            "currencies": CURRENCIES,
+            "products": products,
+            "perpProductsV2": [self._perpetual_v2(x) for x in PERPETUAL_V2],
+            "riskLimits": [],
+            "leverages": [],
+            "riskLimitsV2": [],
+            "leveragesV2": [],
+            "md5Checksum": "0",
+        })
+
+    def get_v1_products(self, request: Request) -> tuple:
+        return 200, {"code": 0, "msg": "OK", "data": []}
+
+    def get_spot_wallets(self, request: Request) -> tuple:
+        balance_ev = int(self.account.balance * 10 ** 8)
+        return self.ok([{
+            "currency": request.params.get("currency", "USDT"),
+            "balanceEv": balance_ev,
+            "lockedTradingBalanceEv": 0,
+            "lockedWithdrawEv": 0,
+            "lastUpdateTimeNs": time.time_ns(),
+            "walletVid": 0,
+        }])
+
+    def get_account_positions(self, request: Request) -> tuple:
+        positions = []
+        for symbol in PERPETUAL_V2:
+            indexes = (1, 2) if self.account.position_mode == HEDGE else (0,)
+            for position_idx in indexes:
+                positions.append(self._position(self.account.position(symbol, position_idx)))
+
+        used = sum(float(x["positionMarginRv"]) for x in positions)
+        return self.ok({
+            "account": {
+                "userID": 1,
+                "accountId": 10001,
+                "currency": "USDT",
+                "accountBalanceRv": str(self.account.balance),
+                "totalUsedBalanceRv": str(used),
+                "bonusBalanceRv": "0",
+            },
+            "positions": positions,
+        })
+
+    def get_active_orders(self, request: Request) -> tuple:
+        orders = self.account.open_orders(request.params.get("symbol"))
+        return self.ok({"rows": [self._order(x) for x in orders]})
+
+    def create_order(self, request: Request) -> tuple:
+        params = request.params
+        symbol = params.get("symbol")
+        if symbol not in PERPETUAL_V2:
+            return self.error(19999, "TE_SYMBOL_INVALID")
+
+        ord_type = params.get("ordType")
+        side = params.get("side", "").lower()
+        pos_side = params.get("posSide", "Merged")
+        position_idx = {"Merged": 0, "Long": 1, "Short": 2}.get(pos_side, 0)
+        if (self.account.position_mode == ONE_WAY) != (position_idx == 0):
+            return self.error(20004, "TE_ERR_INCONSISTENT_POS_MODE")
+
+        qty = float(params.get("orderQtyRq") or 0)
+        close_on_trigger = bool(params.get("closeOnTrigger"))
+        if qty == 0 and close_on_trigger:
+            qty = abs(self.account.position(symbol, position_idx).size)
+        if qty == 0:
+            return self.error(11052, "TE_QTY_TOO_SMALL")
+
+        price = params.get("priceRp")
+        stop_price = params.get("stopPxRp")
+        if ord_type in CONDITIONAL_TYPES and stop_price is None:
+            return self.error(11020, "TE_INVALID_STOP_PX")
+
+        order_type = "limit" if ord_type in ("Limit", "StopLimit", "LimitIfTouched") else "market"
+        trail_offset = None
+        if params.get("pegPriceType") == "TrailingStopPeg":
+            order_type = "trailing_stop_market"
+            trail_offset = abs(float(params.get("pegOffsetValueRp") or 0))
+
+        order = Order(id=self.account.next_id(),
+                      symbol=symbol,
+                      side=side,
+                      type=order_type,
+                      qty=qty,
+                      price=float(price) if price is not None else None,
+                      stop_price=float(stop_price) if stop_price is not None else None,
+                      reduce_only=bool(params.get("reduceOnly")) or close_on_trigger,
+                      close_on_trigger=close_on_trigger and not params.get("orderQtyRq"),
+                      time_in_force=params.get("timeInForce", "GoodTillCancel"),
+                      position_idx=position_idx,
+                      trail_offset=trail_offset,
+                      take_profit=float(params["takeProfitRp"]) if params.get("takeProfitRp") else None,
+                      stop_loss=float(params["stopLossRp"]) if params.get("stopLossRp") else None,
+                      params={"ordType": ord_type,
+                              "posSide": pos_side,
+                              "clOrdID": params.get("clOrdID", ""),
+                              "triggerType": params.get("triggerType", "ByMarkPrice"),
+                              "takeProfitRp": params.get("takeProfitRp"),
+                              "stopLossRp": params.get("stopLossRp"),
+                              "pegPriceType": params.get("pegPriceType"),
+                              "pegOffsetValueRp": params.get("pegOffsetValueRp"),
+                              "closeOnTrigger": close_on_trigger})
+        self.account.place_order(order)
+        if order.status == "rejected":
+            return self.error(11074, "TE_REDUCE_ONLY_ABORT")
+
+        return self.ok(self._order(order))
+
+    def cancel_all_orders(self, request: Request) -> tuple:
+        untriggered = str(request.params.get("untriggered", "false")).lower() == "true"
+        self.account.cancel_all(request.params.get("symbol"), conditional=untriggered)
+        return self.ok("")
+
+    def set_leverage(self, request: Request) -> tuple:
+        symbol = request.params.get("symbol")
+        if "leverageRr" in request.params:
+            leverage = int(float(request.params["leverageRr"]))
+            self.account.leverages[symbol] = (leverage, leverage)
+        else:
+            self.account.leverages[symbol] = (int(float(request.params["longLeverageRr"])),
+                                              int(float(request.params["shortLeverageRr"])))
+        return self.ok("OK")
+
+    def switch_position_mode(self, request: Request) -> tuple:
+        mode = HEDGE if request.params.get("targetPosMode") == "Hedged" else ONE_WAY
+        if mode != self.account.position_mode and self.account.active_positions():
+            return self.error(20004, "TE_ERR_INCONSISTENT_POS_MODE")
+
+        self.account.position_mode = mode
+        return self.ok("ok")
+
+    @staticmethod
+    def _ep(price: float) -> int:
+        return int(round(price * PRICE_SCALE))
+
+    def _book_size(self, symbol: str, size: float) -> int:
+        return int(size / self.market.instrument(symbol).step_size)
+
+    def _inverse_product(self, symbol: str) -> dict:
+        instrument = self.market.instrument(symbol)
+        return {
+            "symbol": symbol,
+            "code": 1,
+            "type": "Perpetual",
+            "displaySymbol": "BTC / USD",
+            "indexSymbol": ".BTC",
+            "markSymbol": ".MBTC",
+            "fundingRateSymbol": ".BTCFR",
+            "fundingRate8hSymbol": ".BTCFR8H",
+            "contractUnderlyingAssets": "USD",
+            "settleCurrency": instrument.base,
+            "quoteCurrency": instrument.quote,
+            "contractSize": "1 USD",
+            "lotSize": 1,
+            "tickSize": str(instrument.tick_size),
+            "priceScale": 4,
+            "ratioScale": 8,
+            "pricePrecision": 1,
+            "minPriceEp": 5000,
+            "maxPriceEp": 10000000000,
+            "maxOrderQty": 1000000,
+            "status": "Listed",
+            "tipOrderQty": 1000000,
+            "listTime": 1574650800000,
+            "majorSymbol": True,
+            "defaultLeverage": "-10",
+            "fundingInterval": 28800,
+            "maxLeverage": 100,
+            "makerFeeRateEr": -25000,
+            "takerFeeRateEr": 75000,
+            "valueScale": 8,
+        }
+
+    def _perpetual_v2(self, symbol: str) -> dict:
+        spec = PERPETUAL_V2[symbol]
+        instrument = self.market.instrument(symbol)
+        return {
+            "symbol": symbol,
+            "code": 41541 if symbol == "BTCUSDT" else 41641,
+            "type": "PerpetualV2",
+            "displaySymbol": "{} / {}".format(instrument.base, instrument.quote),
+            "indexSymbol": ".{}USDT".format(instrument.base),
+            "markSymbol": ".M{}USDT".format(instrument.base),
+            "fundingRateSymbol": ".{}USDTFR".format(instrument.base),
+            "fundingRate8hSymbol": ".{}USDTFR8H".format(instrument.base),
+            "contractUnderlyingAssets": instrument.base,
+            "baseCurrency": instrument.base,
+            "settleCurrency": instrument.quote,
+            "quoteCurrency": instrument.quote,
+            "tickSize": spec["tickSize"],
+            "priceScale": 0,
+            "ratioScale": 0,
+            "pricePrecision": 1,
+            "baseTickSize": "0.001 {}".format(instrument.base),
+            "baseTickSizeEr": 100000,
+            "minPriceRp": spec["minPriceRp"],
+            "maxPriceRp": spec["maxPriceRp"],
+            "maxOrderQtyRq": spec["maxOrderQtyRq"],
+            "minOrderValueRv": "1",
+            "qtyPrecision": 3,
+            "qtyStepSize": spec["qtyStepSize"],
+            "tipOrderQty": 0,
+            "status": "Listed",
+            "listTime": spec["listTime"],
+            "majorSymbol": False,
+            "defaultLeverage": "-10",
+            "fundingInterval": 28800,
+            "maxLeverage": 100,
+            "makerFeeRateRr": "0.0001",
+            "takerFeeRateRr": "0.0006",
+        }
+
+    def _order(self, order: Order) -> dict:
+        filled_value = round(order.filled * order.avg_price, 8)
+        return {
+            "bizError": 0,
+            "orderID": order.id,
+            "clOrdID": order.params.get("clOrdID", ""),
+            "symbol": order.symbol,
+            "side": order.side.capitalize(),
+            "actionTimeNs": order.created_ms * 1000000,
+            "transactTimeNs": order.updated_ms * 1000000,
+            "orderType": order.params.get("ordType", "Market"),
+            "priceRp": str(order.price or 0),
+            "orderQtyRq": str(order.qty),
+            "displayQtyRq": str(order.qty),
+            "timeInForce": order.time_in_force,
+            "reduceOnly": order.reduce_only,
+            "closedPnlRv": "0",
+            "closedSizeRq": "0",
+            "cumQtyRq": str(order.filled),
+            "cumValueRv": str(filled_value),
+            "leavesQtyRq": str(round(order.qty - order.filled, 8)) if order.is_open else "0",
+            "leavesValueRv": "0",
+            "stopDirection": "Falling" if order.side == "sell" else "Rising",
+            "stopPxRp": str(order.stop_price or 0),
+            "trigger": order.params.get("triggerType", "UNSPECIFIED"),
+            "pegOffsetValueRp": str(order.params.get("pegOffsetValueRp") or 0),
+            "pegPriceType": order.params.get("pegPriceType") or "UNSPECIFIED",
+            "takeProfitRp": str(order.params.get("takeProfitRp") or 0),
+            "stopLossRp": str(order.params.get("stopLossRp") or 0),
+            "posSide": order.params.get("posSide", "Merged"),
+            "execStatus": ORDER_STATUSES[order.status],
+            "ordStatus": ORDER_STATUSES[order.status],
+            "execInst": "CloseOnTrigger" if order.params.get("closeOnTrigger") else "",
+        }
+
+    def _position(self, position) -> dict:
+        # Positive leverage means isolated margin, negative cross margin
+        buy, sell = self.account.leverage(position.symbol)
+        leverage = sell if position.position_idx == 2 else buy
+        mark = self.market.mid_price(position.symbol)
+        value = round(abs(position.size) * position.entry_price, 8)
+        margin = round(value / abs(leverage or 1), 8)
+        if position.size > 0:
+            side = "Buy"
+        elif position.size < 0:
+            side = "Sell"
+        else:
+            side = "None"
+
+        return {
+            "accountID": 10001,
+            "symbol": position.symbol,
+            "currency": "USDT",
+            "side": side,
+            "posSide": {0: "Merged", 1: "Long", 2: "Short"}[position.position_idx],
+            "posMode": "Hedged" if self.account.position_mode == HEDGE else "OneWay",
+            "positionStatus": "Normal",
+            "crossMargin": leverage <= 0,
+            "leverageRr": str(leverage),
+            "initMarginReqRr": str(round(1 / abs(leverage or 1), 8)),
+            "maintMarginReqRr": "0.005",
+            "riskLimitRv": "1000000",
+            "size": str(abs(position.size)),
+            "valueRv": str(value),
+            "avgEntryPriceRp": str(position.entry_price),
+            "posCostRv": str(margin),
+            "assignedPosBalanceRv": str(margin),
+            "positionMarginRv": str(margin),
+            "liquidationPriceRp": "0",
+            "markPriceRp": str(mark),
+            "unRealisedPnlRv": str(round(position.size * (mark - position.entry_price), 8)),
+            "term": 1,
+        }
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from exchanges.simulator.binance import BinanceVenue
+from exchanges.simulator.btcex import BtcexVenue
+from exchanges.simulator.bybit import BybitVenue
+from exchanges.simulator.market import SyntheticMarket
+from exchanges.simulator.phemex import PhemexVenue
+from exchanges.simulator.streams import StreamServer
+from exchanges.simulator.venue import Request
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        self._dispatch()
+
+    def do_POST(self) -> None:
+        self._dispatch()
+
+    def do_PUT(self) -> None:
+        self._dispatch()
+
+    def do_DELETE(self) -> None:
+        self._dispatch()
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _dispatch(self) -> None:
+        server = self.server.simulator
+        url = urlsplit(self.path)
+        venue_name, _, path = url.path.lstrip("/").partition("/")
+        venue = server.venues.get(venue_name)
+
+        params = dict(parse_qsl(url.query, keep_blank_values=True))
+        request = Request(method=self.command, path="/" + path, params=params, headers=dict(self.headers))
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        if venue is None:
+            status, payload = 404, {"error": "Unknown venue {}".format(venue_name)}
+        else:
+            try:
+                request.params.update(self._read_body())
+                with server.lock:
+                    status, payload = venue.handle(request)
+            except Exception as e:
+                # The client gets an answer in the format of the venue instead of a dropped connection
+                print("Simulator failed on {} {}: {!r}".format(self.command, self.path, e))
+                traceback.print_exc()
+                status, payload = venue.internal_error(request, e)
+
+        body = json.dumps(payload).encode("utf-8")
+        etag = '"{}"'.format(hashlib.sha1(body).hexdigest()[:20])
+        if self.command == "GET" and status == 200 and self.headers.get("If-None-Match") == etag:
+            status, body = 304, b""
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.command == "GET":
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+
+        raw = self.rfile.read(length).decode("utf-8")
+        if raw.lstrip().startswith("{"):
+            return json.loads(raw)
+        return dict(parse_qsl(raw, keep_blank_values=True))
+
+
+class SimulatorServer:
+    """
+    Loopback HTTP server which serves every simulated venue from one port.
+
+    Each venue lives under its own prefix, e.g. http://127.0.0.1:<port>/binance/fapi/v1/klines.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, seed: int = 42) -> None:
+        self.market = SyntheticMarket(seed=seed)
+        self.latency = latency
+        self.lock = threading.RLock()
+        self.venues = {}
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.simulator = self
+        self._thread = None
+        self._streams = None
+        self._streams_lock = threading.Lock()
+
+        for venue in (BinanceVenue, BybitVenue, PhemexVenue, BtcexVenue):
+            self.venues[venue.name] = venue(self.market)
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def venue_url(self, venue: str) -> str:
+        return "{}/{}".format(self.url, venue)
+
+    def stream_url(self, venue: str) -> str:
+        """
+        Returns the WebSocket url of `venue`, the stream server is started on first use.
+        """
+        with self._streams_lock:
+            if self._streams is None:
+                self._streams = StreamServer(self.market, host=self._httpd.server_address[0]).start()
+        return self._streams.venue_url(venue)
+
+    def start(self) -> "SimulatorServer":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._httpd.serve_forever, name="exchange-simulator", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._streams is not None:
+            self._streams.stop()
+            self._streams = None
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
@@ -0,0 +1,289 @@
+import asyncio
+import json
+import threading
+import time
+
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+from exchanges.simulator.market import SyntheticMarket
+
+class _Session:
+    """
+    One client connection: its subscriptions and the last book sent per symbol with its update id, to publish changes
+    as deltas.
+    """
+
+    def __init__(self, connection) -> None:
+        self.connection = connection
+        self.books = {}
+        self.trades = set()
+        self.sent = {}
+
+    async def send(self, message: dict) -> None:
+        await self.connection.send(json.dumps(message))
+
+
+class _StreamVenue:
+    """
+    Message formats of one venue's public streams. Subclasses turn requests into subscriptions and books / trades
+    into the payloads of the venue.
+    """
+    name = None
+    # Diff streams start with a diff instead of a snapshot, clients build the book from a REST snapshot
+    snapshots = True
+
+    def on_message(self, session: _Session, message: dict) -> list:
+        raise NotImplementedError
+
+    def book(self, symbol: str, snapshot: bool, bids: list, asks: list, sequence: int, previous: int) -> dict:
+        raise NotImplementedError
+
+    def trade(self, symbol: str, price: float, size: float, side: str, trade_id: int) -> dict:
+        raise NotImplementedError
+
+
+class _BinanceStreams(_StreamVenue):
+    name = "binance"
+    snapshots = False
+
+    def on_message(self, session: _Session, message: dict) -> list:
+        if message.get("method") == "SUBSCRIBE":
+            for stream in message.get("params", []):
+                symbol, _, channel = stream.partition("@")
+                if channel.startswith("depth"):
+                    session.books[symbol.upper()] = stream
+                elif channel == "aggTrade":
+                    session.trades.add(symbol.upper())
+            return [{"result": None, "id": message.get("id")}]
+        return [{"error": {"code": 2, "msg": "Invalid request"}, "id": message.get("id")}]
+
+    def book(self, symbol: str, snapshot: bool, bids: list, asks: list, sequence: int, previous: int) -> dict:
+        now = _now_ms()
+        return {"stream": "{}@depth@100ms".format(symbol.lower()),
+                "data": {"e": "depthUpdate", "E": now, "T": now, "s": symbol, "U": previous + 1, "u": sequence,
+                         "pu": previous, "b": _levels(bids), "a": _levels(asks)}}
+
+    def trade(self, symbol: str, price: float, size: float, side: str, trade_id: int) -> dict:
+        now = _now_ms()
+        return {"stream": "{}@aggTrade".format(symbol.lower()),
+                "data": {"e": "aggTrade", "E": now, "s": symbol, "a": trade_id, "p": str(price), "q": str(size),
+                         "f": trade_id, "l": trade_id, "T": now, "m": side == "sell"}}
+
+
+class _BybitStreams(_StreamVenue):
+    name = "bybit"
+
+    def on_message(self, session: _Session, message: dict) -> list:
+        if message.get("op") == "ping":
+            return [{"success": True, "ret_msg": "pong", "conn_id": "simulator", "req_id": message.get("req_id"),
+                     "op": "ping"}]
+        if message.get("op") == "subscribe":
+            for topic in message.get("args", []):
+                parts = topic.split(".")
+                if parts[0] == "orderbook":
+                    session.books[parts[-1]] = topic
+                elif parts[0] == "publicTrade":
+                    session.trades.add(parts[-1])
+            return [{"success": True, "ret_msg": "", "conn_id": "simulator", "req_id": message.get("req_id"),
+                     "op": "subscribe"}]
+        return [{"success": False, "ret_msg": "Invalid op", "conn_id": "simulator", "op": message.get("op")}]
+
+    def book(self, symbol: str, snapshot: bool, bids: list, asks: list, sequence: int, previous: int) -> dict:
+        now = _now_ms()
+        return {"topic": "orderbook.50.{}".format(symbol), "type": "snapshot" if snapshot else "delta", "ts": now,
+                "data": {"s": symbol, "b": _levels(bids), "a": _levels(asks), "u": sequence, "seq": sequence},
+                "cts": now}
+
+    def trade(self, symbol: str, price: float, size: float, side: str, trade_id: int) -> dict:
+        now = _now_ms()
+        return {"topic": "publicTrade.{}".format(symbol), "type": "snapshot", "ts": now,
+                "data": [{"T": now, "s": symbol, "S": side.capitalize(), "v": str(size), "p": str(price),
+                          "L": "PlusTick", "i": str(trade_id), "BT": False}]}
+
+
+class _PhemexStreams(_StreamVenue):
+    name = "phemex"
+
+    def on_message(self, session: _Session, message: dict) -> list:
+        method = message.get("method")
+        if method == "server.ping":
+            return [{"error": None, "id": message.get("id"), "result": "pong"}]
+        if method == "orderbook_p.subscribe":
+            for symbol in message.get("params", []):
+                session.books[symbol] = method
+        elif method == "trade_p.subscribe":
+            for symbol in message.get("params", []):
+                session.trades.add(symbol)
+        else:
+            return [{"error": {"code": 6001, "message": "invalid argument"}, "id": message.get("id"), "result": None}]
+        return [{"error": None, "id": message.get("id"), "result": {"status": "success"}}]
+
+    def book(self, symbol: str, snapshot: bool, bids: list, asks: list, sequence: int, previous: int) -> dict:
+        return {"depth": 30, "orderbook_p": {"asks": _levels(asks), "bids": _levels(bids)}, "sequence": sequence,
+                "symbol": symbol, "timestamp": time.time_ns(), "type": "snapshot" if snapshot else "incremental"}
+
+    def trade(self, symbol: str, price: float, size: float, side: str, trade_id: int) -> dict:
+        return {"sequence": trade_id, "symbol": symbol, "type": "incremental",
+                "trades_p": [[time.time_ns(), side.capitalize(), str(price), str(size)]]}
+
+
+class _BtcexStreams(_StreamVenue):
+    name = "btcex"
+
+    def on_message(self, session: _Session, message: dict) -> list:
+        method = message.get("method")
+        if method == "/public/ping":
+            return [{"jsonrpc": "2.0", "id": message.get("id"), "result": "pong"}]
+        if method == "/public/subscribe":
+            channels = message.get("params", {}).get("channels", [])
+            for channel in channels:
+                kind, instrument_name = channel.split(".")[:2]
+                symbol = "".join(instrument_name.split("-")[:2])
+                if kind == "book":
+                    session.books[symbol] = channel
+                elif kind == "trades":
+                    session.trades.add(symbol)
+            return [{"jsonrpc": "2.0", "id": message.get("id"), "result": channels}]
+        return [{"jsonrpc": "2.0", "id": message.get("id"), "error": {"code": 10001, "message": "Invalid method"}}]
+
+    def book(self, symbol: str, snapshot: bool, bids: list, asks: list, sequence: int, previous: int) -> dict:
+        instrument_name = _btcex_instrument(symbol)
+        return {"jsonrpc": "2.0", "method": "subscription", "params": {
+            "channel": "book.{}.raw".format(instrument_name),
+            "data": {"type": "snapshot" if snapshot else "change", "timestamp": _now_ms(),
+                     "instrument_name": instrument_name, "change_id": sequence, "prev_change_id": previous,
+                     "bids": [["delete" if size == 0 else "new", price, size] for price, size in bids],
+                     "asks": [["delete" if size == 0 else "new", price, size] for price, size in asks]}}}
+
+    def trade(self, symbol: str, price: float, size: float, side: str, trade_id: int) -> dict:
+        instrument_name = _btcex_instrument(symbol)
+        return {"jsonrpc": "2.0", "method": "subscription", "params": {
+            "channel": "trades.{}.raw".format(instrument_name),
+            "data": [{"trade_id": str(trade_id), "timestamp": _now_ms(), "price": price, "amount": size,
+                      "direction": side, "instrument_name": instrument_name}]}}
+
+
+class StreamServer:
+    """
+    Loopback WebSocket stand-in of the public market data streams of every simulated venue, e.g.
+    ws://127.0.0.1:<port>/bybit/v5/public/linear.
+
+    Runs its own event loop in a background thread. Every `interval` seconds the changes of the live book of the
+    synthetic market since the last message are published as a delta, after a first snapshot on venues which send
+    one, together with one trade. The update ids are those of the live book, so the REST order books of the
+    simulator are valid snapshots to synchronize the deltas with.
+    """
+
+    def __init__(self, market: SyntheticMarket, host: str = "127.0.0.1", port: int = 0,
+                 interval: float = 0.05) -> None:
+        self.market = market
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.venues = {venue.name: venue() for venue in (_BinanceStreams, _BybitStreams, _PhemexStreams,
+                                                         _BtcexStreams)}
+        self._loop = None
+        self._stopped = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return "ws://{}:{}".format(self.host, self.port)
+
+    def venue_url(self, venue: str) -> str:
+        return "{}/{}".format(self.url, venue)
+
+    def start(self) -> "StreamServer":
+        if self._thread is None:
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(ready,), name="exchange-simulator-streams",
+                                            daemon=True)
+            self._thread.start()
+            ready.wait()
+        return self
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, ready: threading.Event) -> None:
+        self._loop = asyncio.new_event_loop()
+        self._loop.run_until_complete(self._serve(ready))
+        self._loop.close()
+
+    async def _serve(self, ready: threading.Event) -> None:
+        self._stopped = asyncio.Event()
+        async with serve(self._handle, self.host, self.port) as server:
+            self.port = server.sockets[0].getsockname()[1]
+            ready.set()
+            await self._stopped.wait()
+
+    async def _handle(self, connection) -> None:
+        venue = self.venues.get(connection.request.path.lstrip("/").partition("/")[0])
+        if venue is None:
+            await connection.close(1008, "Unknown venue")
+            return
+
+        session = _Session(connection)
+        publisher = asyncio.create_task(self._publish(venue, session))
+        try:
+            async for raw in connection:
+                for response in venue.on_message(session, json.loads(raw)):
+                    await session.send(response)
+        except ConnectionClosed:
+            pass
+        finally:
+            publisher.cancel()
+
+    async def _publish(self, venue: _StreamVenue, session: _Session) -> None:
+        trade_id = 0
+        try:
+            while True:
+                for symbol in [x for x in session.books if x in self.market.instruments]:
+                    await self._publish_book(venue, session, symbol)
+                for symbol in [x for x in session.trades if x in self.market.instruments]:
+                    trade_id += 1
+                    side = "buy" if trade_id % 2 else "sell"
+                    price = self.market.best_ask(symbol) if side == "buy" else self.market.best_bid(symbol)
+                    await session.send(venue.trade(symbol, price, self.market.instrument(symbol).step_size, side,
+                                                   trade_id))
+                await asyncio.sleep(self.interval)
+        except ConnectionClosed:
+            pass
+
+    async def _publish_book(self, venue: _StreamVenue, session: _Session, symbol: str) -> None:
+        bids, asks, sequence = self.market.live_order_book(symbol)
+        bids, asks = dict(bids), dict(asks)
+
+        sent = session.sent.get(symbol)
+        if sent is not None and sent[2] == sequence:
+            return
+        session.sent[symbol] = (bids, asks, sequence)
+        if sent is None:
+            if venue.snapshots:
+                await session.send(venue.book(symbol, True, sorted(bids.items(), reverse=True), sorted(asks.items()),
+                                              sequence, sequence))
+            return
+        await session.send(venue.book(symbol, False, _changes(sent[0], bids), _changes(sent[1], asks), sequence,
+                                      sent[2]))
+
+
+def _changes(previous: dict, current: dict) -> list:
+    changes = [(price, size) for price, size in current.items() if previous.get(price) != size]
+    changes.extend((price, 0) for price in previous if price not in current)
+    return changes
+
+
+def _levels(levels: list) -> list:
+    return [[str(price), str(size)] for price, size in levels]
+
+
+def _btcex_instrument(symbol: str) -> str:
+    return "{}-{}-PERPETUAL".format(symbol[:-4], symbol[-4:])
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
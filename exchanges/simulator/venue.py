@@ -0,0 +1,41 @@
+from dataclasses import dataclass, field
+
+from exchanges.simulator.market import SyntheticMarket
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    params: dict = field(default_factory=dict)
+    headers: dict = field(default_factory=dict)
+
+
+class Venue:
+    """
+    Base class of one simulated exchange, mounted under /<name> on the server.
+    """
+    name = None
+
+    def __init__(self, market: SyntheticMarket) -> None:
+        self.market = market
+        self.routes = {}
+
+    def route(self, method: str, path: str, handler) -> None:
+        self.routes[(method, path)] = handler
+
+    def handle(self, request: Request) -> tuple:
+        handler = self.routes.get((request.method, request.path))
+        if handler is None:
+            return self.not_found(request)
+        return handler(request)
+
+    def not_found(self, request: Request) -> tuple:
+        return 404, {"error": "Simulator has no route {} /{}{}".format(request.method, self.name, request.path)}
+
+    def internal_error(self, request: Request, error: Exception) -> tuple:
+        """
+        Response to a request the simulator failed on, a 500 with the error body of the venue.
+        """
+        return 500, {"error": "Simulator failed on {} /{}{}: {!r}".format(request.method, self.name, request.path,
+                                                                          error)}
@@ -0,0 +1,343 @@
+import contextvars
+import inspect
+import json
+import os
+import re
+import sys
+import threading
+import time
+import unittest
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+
+from exchanges.rate_limit import HOSTS
+
+_lock = threading.Lock()
+_timer = None
+_classes = {}
+_active = contextvars.ContextVar("active_call", default=None)
+
+
+class CallTimer:
+    """
+    Records every outbound exchange call with the test and the phase (setUp, test, tearDown) it was made in.
+
+    A call is one invocation of the HTTP entry point of a client (ccxt `fetch`, pybit `_submit_request`) or one request
+    of a plain requests session. It is recorded with the client method which made it (`method`), the method of the
+    test case which called that one (`caller`, e.g. set_default_setting), the endpoint, the duration, the bytes sent
+    and received and the number of retries. Records are appended to a JSON lines file in `path`, one per process, and
+    summarized per phase when the test ends. With a `history` function the durations of the calls of a test are
+    passed to it as well, per venue and client method, when the test ends.
+    """
+
+    def __init__(self, path: str = None) -> None:
+        self.path = path
+        self.history = None
+        self.test = None
+        self.phase = None
+        self.records = []
+        self.phases = {}
+        self._phase_started = None
+        self._stream = None
+        self._lock = threading.Lock()
+
+    def enter(self, test: str, phase: str) -> None:
+        """
+        Marks the start of `phase` of `test`, the calls from now on belong to it.
+        """
+        with self._lock:
+            self._close_phase()
+            self.test = test
+            self.phase = phase
+            self._phase_started = time.perf_counter()
+
+    def finish(self) -> dict:
+        """
+        Ends the current test, writes and prints the summary of its calls and returns it. None without calls.
+        """
+        with self._lock:
+            self._close_phase()
+            test, records, phases = self.test, self.records, self.phases
+            self.test = self.phase = None
+            self.records = []
+            self.phases = {}
+        if not records:
+            return None
+        summary = {"type": "summary", "test": test, "wall": {x: round(y, 6) for x, y in phases.items()}}
+        summary.update(summarize(records))
+        self._write(summary)
+        print(format_summary(summary))
+        if self.history is not None:
+            self._record_history(records)
+        return summary
+
+    def _record_history(self, records: list) -> None:
+        operations = {}
+        for record in records:
+            # Plain session calls have no client method, their path tells them apart (the host is the venue)
+            operation = record["method"]
+            if operation == "request" and record["endpoint"]:
+                operation = "/" + record["endpoint"].partition("/")[2]
+            result = operations.setdefault((record["venue"], operation), {"samples": [], "errors": 0})
+            if record["error"] is None:
+                result["samples"].append(record["seconds"])
+            else:
+                result["errors"] += 1
+        for (venue, operation), result in operations.items():
+            self.history(venue, operation, result["samples"], result["errors"])
+
+    def start(self, venue: str, client_type: type = None) -> dict:
+        method, caller = _call_site(sys._getframe(2), client_type)
+        return {
+            "type": "call",
+            "test": self.test,
+            "phase": self.phase,
+            "venue": venue,
+            "method": method,
+            "caller": caller,
+            "http": None,
+            "endpoint": None,
+            "status": None,
+            "time": round(time.time(), 3),
+            "seconds": None,
+            "bytesOut": 0,
+            "bytesIn": 0,
+            "sends": 0,
+            "retries": 0,
+            "error": None,
+            "_started": time.perf_counter(),
+        }
+
+    def end(self, call: dict, error: BaseException = None) -> None:
+        call["seconds"] = round(time.perf_counter() - call.pop("_started"), 6)
+        call["retries"] = max(call["sends"] - 1, 0)
+        if error is not None:
+            call["error"] = type(error).__name__
+        with self._lock:
+            self.records.append(call)
+        self._write(call)
+
+    def _close_phase(self) -> None:
+        if self.phase is not None:
+            self.phases[self.phase] = self.phases.get(self.phase, 0.0) + time.perf_counter() - self._phase_started
+
+    def _write(self, record: dict) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            if self._stream is None:
+                os.makedirs(self.path, exist_ok=True)
+                name = "calls-{}-{}.jsonl".format(time.strftime("%Y%m%d-%H%M%S"), os.getpid())
+                self._stream = open(os.path.join(self.path, name), "a", buffering=1)
+            self._stream.write(json.dumps(record) + "\n")
+
+
+def summarize(records: list) -> dict:
+    """
+    Aggregates call records by phase, and the time spent in them by client method and by test case method.
+    """
+    phases = {}
+    methods = {}
+    callers = {}
+    for record in records:
+        phase = phases.setdefault(record["phase"] or "none",
+                                  {"calls": 0, "seconds": 0.0, "bytesOut": 0, "bytesIn": 0, "retries": 0, "errors": 0})
+        phase["calls"] += 1
+        phase["seconds"] += record["seconds"]
+        phase["bytesOut"] += record["bytesOut"]
+        phase["bytesIn"] += record["bytesIn"]
+        phase["retries"] += record["retries"]
+        phase["errors"] += record["error"] is not None
+        methods[record["method"]] = methods.get(record["method"], 0.0) + record["seconds"]
+        callers[record["caller"]] = callers.get(record["caller"], 0.0) + record["seconds"]
+    for phase in phases.values():
+        phase["seconds"] = round(phase["seconds"], 6)
+    return {
+        "phases": phases,
+        "methods": {x: round(y, 6) for x, y in sorted(methods.items(), key=lambda x: -x[1])},
+        "callers": {x: round(y, 6) for x, y in sorted(callers.items(), key=lambda x: -x[1])},
+    }
+
+
+def format_summary(summary: dict) -> str:
+    parts = []
+    for name, phase in summary["phases"].items():
+        wall = summary.get("wall", {}).get(name)
+        parts.append("{} {} calls {:.3f}s{}{}".format(
+            name, phase["calls"], phase["seconds"], " of {:.3f}s".format(wall) if wall is not None else "",
+            ", {} retries".format(phase["retries"]) if phase["retries"] else ""))
+    # Calls of worker threads have no test case method on their stack
+    slowest = ", ".join("{} {:.3f}s".format(x or "(unattributed)", y) for x, y in list(summary["callers"].items())[:3])
+    return "Calls of {}: {} (by caller: {})".format(summary["test"], "; ".join(parts), slowest)
+
+
+class TimingAdapter(HTTPAdapter):
+    """
+    Transport adapter of a requests session which adds every request to the client call it belongs to, or records
+    it as a call of its own for a session used directly.
+    """
+
+    def __init__(self, adapter: HTTPAdapter) -> None:
+        super().__init__()
+        self.adapter = adapter
+
+    def send(self, request, **kwargs):
+        call = _active.get()
+        timer = None
+        parts = urlsplit(request.url)
+        if call is None:
+            timer = get_call_timer()
+            call = timer.start(HOSTS.get(parts.hostname, parts.hostname))
+        call["http"] = request.method
+        call["endpoint"] = parts.netloc + parts.path
+        call["sends"] += 1
+        call["bytesOut"] += _size(request.body)
+        try:
+            response = self.adapter.send(request, **kwargs)
+        except Exception as error:
+            if timer is not None:
+                timer.end(call, error)
+            raise
+        call["status"] = response.status_code
+        length = response.headers.get("Content-Length")
+        if length is not None and length.isdigit():
+            call["bytesIn"] += int(length)
+        elif not kwargs.get("stream"):
+            call["bytesIn"] += len(response.content)
+        if timer is not None:
+            timer.end(call)
+        return response
+
+    def close(self) -> None:
+        self.adapter.close()
+
+
+def install_timing(session) -> None:
+    """
+    Routes every request of a requests session through the call timer, outside of the other adapters so the waits
+    for rate limits are part of the call.
+    """
+    for prefix in ("http://", "https://"):
+        adapter = session.get_adapter(prefix)
+        if not isinstance(adapter, TimingAdapter):
+            session.mount(prefix, TimingAdapter(adapter))
+
+
+def instrument_client(client, venue: str) -> None:
+    """
+    Records every call of a ccxt (sync or async) or pybit client made through its HTTP entry point. The client gets
+    a subclass of its class with the entry point wrapped, so the views of a warm client share it.
+    """
+    cls = type(client)
+    if getattr(cls, "_timed_venue", None) is not None:
+        return
+    with _lock:
+        if (cls, venue) not in _classes:
+            _classes[(cls, venue)] = _timed_class(cls, venue)
+        client.__class__ = _classes[(cls, venue)]
+
+
+def _timed_class(cls: type, venue: str) -> type:
+    name = "fetch" if hasattr(cls, "fetch") else "_submit_request"
+    entry = getattr(cls, name)
+
+    if inspect.iscoroutinefunction(entry):
+        async def timed(self, *args, **kwargs):
+            timer = get_call_timer()
+            call = timer.start(venue, cls)
+            url = args[0] if args else kwargs.get("url", "")
+            body = args[3] if len(args) > 3 else kwargs.get("body")
+            parts = urlsplit(url)
+            call["http"] = args[1] if len(args) > 1 else kwargs.get("method", "GET")
+            call["endpoint"] = parts.netloc + parts.path
+            call["sends"] = 1
+            call["bytesOut"] = _size(body)
+            token = _active.set(call)
+            try:
+                response = await entry(self, *args, **kwargs)
+            except Exception as error:
+                timer.end(call, error)
+                raise
+            finally:
+                _active.reset(token)
+            timer.end(call)
+            return response
+
+        def on_rest_response(self, code, reason, url, method, response_headers, response_body, request_headers,
+                             request_body):
+            # aiohttp is not a requests session, the response of the running call is taken here
+            call = _active.get()
+            if call is not None:
+                call["status"] = code
+                call["bytesIn"] += _size(response_body)
+            return cls.on_rest_response(self, code, reason, url, method, response_headers, response_body,
+                                        request_headers, request_body)
+
+        attributes = {name: timed, "on_rest_response": on_rest_response}
+    else:
+        def timed(self, *args, **kwargs):
+            timer = get_call_timer()
+            call = timer.start(venue, cls)
+            token = _active.set(call)
+            try:
+                response = entry(self, *args, **kwargs)
+            except Exception as error:
+                timer.end(call, error)
+                raise
+            finally:
+                _active.reset(token)
+            timer.end(call)
+            return response
+
+        attributes = {name: timed}
+
+    attributes["_timed_venue"] = venue
+    return type(cls.__name__, (cls,), attributes)
+
+
+def _call_site(frame, client_type: type) -> tuple:
+    # The outermost method of the client on the stack made the call, the innermost test case method asked for it
+    method = caller = None
+    while frame is not None:
+        code = frame.f_code
+        if code.co_argcount and code.co_varnames[0] in ("self", "_self"):
+            owner = frame.f_locals.get(code.co_varnames[0])
+            if client_type is not None and isinstance(owner, client_type):
+                method = _implicit_name(frame.f_locals) if code.co_varnames[0] == "_self" else code.co_name
+            elif caller is None and isinstance(owner, unittest.TestCase):
+                caller = code.co_name
+        frame = frame.f_back
+    return method or "request", caller
+
+
+def _implicit_name(local_variables: dict) -> str:
+    # Generated ccxt endpoint methods (fapiPrivateGetOpenOrders) are closures over their path, api and HTTP method
+    endpoint = local_variables.get("outer_kwargs") or {}
+    api = endpoint.get("api") or ""
+    api = [api] if isinstance(api, str) else list(api)
+    words = api[1:] + [endpoint.get("method", "").lower()] + re.split("[^a-zA-Z0-9]", endpoint.get("path", ""))
+    return "".join(api[:1] + [x[:1].upper() + x[1:] for x in words if x]) or "request"
+
+
+def _size(body) -> int:
+    if not body:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode("utf-8"))
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+    return 0
+
+
+def get_call_timer(path: str = None) -> CallTimer:
+    """
+    Returns the process wide call timer, writing its records to `path` once one is given.
+    """
+    global _timer
+    with _lock:
+        if _timer is None:
+            _timer = CallTimer(path)
+        elif path is not None and _timer.path is None:
+            _timer.path = path
+        return _timer
@@ -0,0 +1,54 @@
+import argparse
+import datetime
+import time
+
+from exchanges.backfill import Backfill
+from exchanges.klines import INTERVALS_MS, SOURCES, KlineStore
+from tests.integration.utils import load_config
+from tests.klines import http_get
+
+
+def timestamp_ms(value: str) -> int:
+    date = datetime.datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=datetime.timezone.utc)
+    return int(date.timestamp() * 1000)
+
+
+def end_of_day_ms(value: str) -> int:
+    return timestamp_ms(value) + INTERVALS_MS["1d"] - 1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backfill kline history of the exchanges into the local kline store")
+    parser.add_argument("-c", "--config", default=None,
+                        help="Path to config.yaml, defaults to $CRYPTO_TESTS_CONFIG or tests/config.yaml")
+    parser.add_argument("-e", "--exchanges", nargs="+", default=["binance", "bybit", "phemex"], choices=list(SOURCES))
+    parser.add_argument("-s", "--symbols", nargs="+", default=["BTCUSDT", "ETHUSDT"])
+    parser.add_argument("-i", "--interval", default="1m", choices=list(INTERVALS_MS))
+    parser.add_argument("--start", required=True, type=timestamp_ms, help="First day, YYYY-MM-DD (UTC)")
+    parser.add_argument("--end", default=None, type=end_of_day_ms,
+                        help="Last day, YYYY-MM-DD (UTC), fetched up to its end, now by default")
+    parser.add_argument("-w", "--workers", type=int, default=16, help="Concurrent requests over all exchanges")
+    parser.add_argument("--retries", type=int, default=2, help="Retries of a failed chunk")
+    parser.add_argument("--store", default="klines", help="Directory of the kline store")
+    parser.add_argument("--simulator", action="store_true", help="Run against the local simulator")
+    args = parser.parse_args()
+
+    config = load_config(args.config, {"simulator": {"enabled": True}} if args.simulator else None)
+
+    backfill = Backfill(KlineStore(args.store), http_get(config), workers=args.workers, retries=args.retries)
+    started = time.perf_counter()
+    results = backfill.run([(exchange, symbol, args.interval, args.start)
+                            for exchange in args.exchanges for symbol in args.symbols], args.end)
+    elapsed = time.perf_counter() - started
+
+    for result in results:
+        status = "{} chunks failed, run again to resume".format(len(result.failed)) if result.failed else "done"
+        print("{} {} {}: {} chunks, {} resumed, {} fetched with {} requests, {} bars stored, {}".format(
+            result.exchange, result.symbol, result.interval, result.chunks, result.resumed, result.fetched,
+            result.requests, result.bars, status))
+    requests = sum(x.requests for x in results)
+    print("{} requests in {:.1f}s, {:.1f} requests/s".format(requests, elapsed, requests / elapsed if elapsed else 0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import argparse
+import json
+import time
+
+from exchanges.account_settings import get_settings_cache
+from exchanges.flatten import flatten_binance, flatten_bybit, flatten_phemex
+from exchanges.history import RunRecorder, summarize
+from tests.integration.utils import exchange_client, load_config, public_client, public_url
+
+def binance_operations(config: dict) -> list:
+    exchange = exchange_client(config, "binance")
+    http = public_client(config)
+    sides = _alternate("buy", "sell")
+    leverages = _alternate(21, 20)
+
+    return [
+        ("order_book", lambda: http.request(
+            "GET", public_url(config, "https://api.binance.com/api/v3/depth?limit=10&symbol=BTCUSDT")).json()),
+        ("klines", lambda: http.request(
+            "GET", public_url(config, "https://fapi.binance.com/fapi/v1/klines?symbol=BTCUSDT&interval=1d")).json()),
+        ("instrument_info", lambda: http.request(
+            "GET", public_url(config, "https://fapi.binance.com/fapi/v1/exchangeInfo")).json()),
+        ("balance", lambda: exchange.fetch_balance({"type": "future"})),
+        ("market_order", lambda: exchange.create_order(symbol="BTC/USDT:USDT", type="market", side=next(sides),
+                                                       amount=0.001)),
+        ("limit_order", lambda: exchange.create_order(symbol="BTC/USDT:USDT", type="limit", side="buy",
+                                                      amount=0.001, price=20000)),
+        ("cancel_all", lambda: exchange.cancel_all_orders("BTC/USDT:USDT")),
+        ("set_leverage", lambda: exchange.set_leverage(leverage=next(leverages), symbol="BTC/USDT:USDT")),
+    ]
+
+
+def bybit_operations(config: dict) -> list:
+    client = exchange_client(config, "bybit")
+    sides = _alternate("Buy", "Sell")
+    leverages = _alternate("21", "20")
+
+    return [
+        ("order_book", lambda: client.get_orderbook(category="linear", symbol="BTCUSDT")),
+        ("klines", lambda: client.get_kline(category="linear", symbol="BTCUSDT", interval="D")),
+        ("instrument_info", lambda: client.get_instruments_info(category="linear", symbol="BTCUSDT")),
+        ("balance", lambda: client.get_wallet_balance(accountType="CONTRACT", coin="USDT")),
+        ("market_order", lambda: client.place_order(category="linear", symbol="BTCUSDT", orderType="Market",
+                                                    side=next(sides), qty=0.001, positionIdx=0)),
+        ("limit_order", lambda: client.place_order(category="linear", symbol="BTCUSDT", orderType="Limit",
+                                                   side="Buy", qty=0.001, price=20000, positionIdx=0)),
+        ("cancel_all", lambda: client.cancel_all_orders(category="linear", settleCoin="USDT")),
+        ("set_leverage", lambda: _set_bybit_leverage(client, next(leverages))),
+    ]
+
+
+def phemex_operations(config: dict) -> list:
+    exchange = exchange_client(config, "phemex")
+    http = public_client(config)
+    sides = _alternate("buy", "sell")
+    leverages = _alternate(21, 20)
+
+    return [
+        ("order_book", lambda: http.request(
+            "GET", public_url(config, "https://testnet-api.phemex.com/md/orderbook?symbol=BTCUSD")).json()),
+        ("klines", lambda: http.request(
+            "GET", public_url(config, "https://testnet-api.phemex.com/exchange/public/md/v2/kline"
+                                      "?symbol=BTCUSD&resolution=86400&limit=100")).json()),
+        ("instrument_info", lambda: http.request(
+            "GET", public_url(config, "https://testnet-api.phemex.com/public/products")).json()),
+        ("balance", lambda: exchange.fetch_balance(params={"currency": "USDT"})),
+        ("market_order", lambda: exchange.create_order(symbol="BTCUSDT", type="market", side=next(sides),
+                                                       amount=0.001)),
+        ("limit_order", lambda: exchange.create_order(symbol="BTCUSDT", type="limit", side="buy", amount=0.001,
+                                                      price=20000)),
+        ("cancel_all", lambda: exchange.cancel_all_orders("BTCUSDT")),
+        ("set_leverage", lambda: exchange.set_leverage(leverage=next(leverages), symbol="BTCUSDT")),
+    ]
+
+
+def btcex_operations(config: dict) -> list:
+    http = public_client(config)
+    end = int(time.time())
+
+    return [
+        ("order_book", lambda: http.request(
+            "GET", public_url(config, "https://api.btcex.com/api/v1/public/get_order_book"
+                                      "?instrument_name=BTC-USDT-PERPETUAL")).json()),
+        ("klines", lambda: http.request(
+            "GET", public_url(config, "https://api.btcex.com/api/v1/public/get_tradingview_chart_data"
+                                      "?instrument_name=BTC-USDT&start_timestamp={}&end_timestamp={}&resolution=1D"
+                              .format(end - 5 * 86400, end))).json()),
+        ("instrument_info", lambda: http.request(
+            "GET", public_url(config, "https://api.btcex.com/api/v1/public/get_instruments"
+                                      "?currency=PERPETUAL&base_currency=USDT")).json()),
+    ]
+
+
+OPERATIONS = {
+    "binance": binance_operations,
+    "bybit": bybit_operations,
+    "phemex": phemex_operations,
+    "btcex": btcex_operations,
+}
+
+CLEANUPS = {
+    "binance": lambda config: flatten_binance(exchange_client(config, "binance")),
+    "bybit": lambda config: flatten_bybit(exchange_client(config, "bybit")),
+    "phemex": lambda config: flatten_phemex(exchange_client(config, "phemex"), symbols=["BTCUSDT", "ETHUSDT"]),
+}
+
+
+def run_benchmark(config: dict, exchanges: list, iterations: int = 20, warmup: int = 3, record=None) -> dict:
+    """
+    Runs every operation of every exchange `warmup` + `iterations` times and returns
+    {exchange: {operation: summary}}. Warm-up calls open connections and fill caches and are not measured.
+    The samples of every operation are passed to `record(exchange, operation, samples, errors)` as well when given.
+    """
+    results = {}
+    for name in exchanges:
+        print("Benchmark {}".format(name))
+        operations = OPERATIONS[name](config)
+        samples = {operation: [] for operation, _ in operations}
+        errors = {operation: 0 for operation, _ in operations}
+
+        try:
+            for iteration in range(warmup + iterations):
+                for operation, call in operations:
+                    started = time.perf_counter()
+                    try:
+                        call()
+                    except Exception as e:
+                        errors[operation] += 1
+                        print("{} {} failed: {}".format(name, operation, e))
+                        continue
+                    if iteration >= warmup:
+                        samples[operation].append(time.perf_counter() - started)
+        finally:
+            if name in CLEANUPS:
+                CLEANUPS[name](config)
+                get_settings_cache().invalidate(name)
+
+        results[name] = {}
+        for operation, _ in operations:
+            results[name][operation] = summarize([x * 1000 for x in samples[operation]])
+            results[name][operation]["errors"] = errors[operation]
+            if record is not None:
+                record(name, operation, samples[operation], errors[operation])
+    return results
+
+
+def format_table(results: dict) -> str:
+    """
+    Renders one row per operation and one p50 / p99 column pair per exchange, in milliseconds.
+    """
+    exchanges = list(results)
+    operations = []
+    for name in exchanges:
+        operations.extend(x for x in results[name] if x not in operations)
+
+    header = ["operation"] + ["{} p50/p99".format(name) for name in exchanges]
+    rows = [header]
+    for operation in operations:
+        row = [operation]
+        for name in exchanges:
+            summary = results[name].get(operation)
+            measured = summary and summary["count"]
+            row.append("{:.1f} / {:.1f}".format(summary["p50"], summary["p99"]) if measured else "-")
+        rows.append(row)
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    lines = [" | ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() for row in rows]
+    lines.insert(1, "-+-".join("-" * width for width in widths))
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure per operation latency of the exchanges")
+    parser.add_argument("-c", "--config", default=None,
+                        help="Path to config.yaml, defaults to $CRYPTO_TESTS_CONFIG or tests/config.yaml")
+    parser.add_argument("-e", "--exchanges", nargs="+", default=list(OPERATIONS), choices=list(OPERATIONS))
+    parser.add_argument("-n", "--iterations", type=int, default=20, help="Measured iterations per operation")
+    parser.add_argument("-w", "--warmup", type=int, default=3, help="Not measured iterations per operation")
+    parser.add_argument("-o", "--output", default=None, help="Write the JSON results to this file")
+    parser.add_argument("--simulator", action="store_true", help="Run against the local simulator")
+    parser.add_argument("-l", "--label", default=None, help="Label of the run in the history store")
+    parser.add_argument("--no-history", action="store_true", help="Do not append the run to the history store")
+    args = parser.parse_args()
+
+    config = load_config(args.config, {"simulator": {"enabled": True}} if args.simulator else None)
+    target = "simulator" if config.get("simulator", {}).get("enabled") else "exchange"
+    record = None
+    if config["history"]["enabled"] and not args.no_history:
+        record = RunRecorder(config["history"]["path"], "benchmark", target, label=args.label)
+
+    results = run_benchmark(config, args.exchanges, args.iterations, args.warmup, record)
+    if record is not None and record.run_id is not None:
+        print("Run {} appended to {}".format(record.run_id, record.path))
+    document = {
+        "created": int(time.time()),
+        "target": target,
+        "iterations": args.iterations,
+        "warmup": args.warmup,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as stream:
+            json.dump(document, stream, indent=2)
+        print("Results written to {}".format(args.output))
+    else:
+        print(json.dumps(document, indent=2))
+
+    print(format_table(results))
+
+
+def _alternate(*values):
+    while True:
+        yield from values
+
+
+def _set_bybit_leverage(client, leverage: str):
+    return client.set_leverage(category="linear", symbol="BTCUSDT", buyLeverage=leverage, sellLeverage=leverage)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import argparse
+import json
+import random
+import sys
+import time
+
+from exchanges.local_book import LocalOrderBook, SequenceGap
+
+PRICE = 27000.0
+TICK = 0.1
+STEP = 0.001
+
+
+def initial_levels(rnd: random.Random, levels: int) -> tuple:
+    bids = [(round(PRICE - TICK * (i + 1), 1), round(rnd.randint(1, 500) * STEP, 3)) for i in range(levels)]
+    asks = [(round(PRICE + TICK * (i + 1), 1), round(rnd.randint(1, 500) * STEP, 3)) for i in range(levels)]
+    return bids, asks
+
+
+def generate_diffs(rnd: random.Random, count: int, levels: int, changes: int) -> list:
+    """
+    Returns `count` Binance like diffs (first, last, previous update id, bids, asks) of `changes` levels per side:
+    mostly resized levels near the top, some removed and some new ones, over a band of 2 * `levels` ticks.
+    """
+    diffs = []
+    sequence = 1
+    for _ in range(count):
+        sides = []
+        for sign in (-1, 1):
+            side = []
+            for _ in range(changes):
+                # Activity concentrates at the top of the book
+                distance = min(int(rnd.expovariate(1 / (levels / 10))) + 1, 2 * levels)
+                price = round(PRICE + sign * TICK * distance, 1)
+                size = 0.0 if rnd.random() < 0.15 else round(rnd.randint(1, 500) * STEP, 3)
+                side.append((price, size))
+            sides.append(side)
+        diffs.append((sequence + 1, sequence + 3, sequence, sides[0], sides[1]))
+        sequence += 3
+    return diffs
+
+
+def run_benchmark(levels: int, count: int, changes: int, read_every: int, depth: int, seed: int) -> dict:
+    rnd = random.Random(seed)
+    bids, asks = initial_levels(rnd, levels)
+    diffs = generate_diffs(rnd, count, levels, changes)
+
+    book = LocalOrderBook("BTCUSDT")
+    book.reset(bids, asks, 1)
+    reads = 0
+    started = time.perf_counter()
+    for index, (first, last, previous, bid_changes, ask_changes) in enumerate(diffs):
+        book.update(bid_changes, ask_changes, last, first, previous)
+        if read_every and index % read_every == 0:
+            # A reader taking the whole book, the next diff pays the copy of the columns
+            snapshot = book.snapshot()
+            reads += snapshot.best_bid < snapshot.best_ask
+    elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(count // 10):
+        book.snapshot(depth)
+    depth_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(count // 10):
+        book.snapshot()
+    full_elapsed = time.perf_counter() - started
+
+    # A diff after a lost one
+    try:
+        book.update([], [], book.sequence + 6, book.sequence + 4, book.sequence + 3)
+        gap_detected = False
+    except SequenceGap:
+        gap_detected = True
+
+    level_updates = count * changes * 2
+    return {
+        "levels": levels,
+        "diffs": count,
+        "changesPerSide": changes,
+        "seconds": round(elapsed, 4),
+        "diffsPerSecond": round(count / elapsed),
+        "levelUpdatesPerSecond": round(level_updates / elapsed),
+        "microsecondsPerDiff": round(elapsed / count * 1e6, 3),
+        "reads": reads,
+        "depthSnapshotMicroseconds": round(depth_elapsed / (count // 10) * 1e6, 3),
+        "fullSnapshotMicroseconds": round(full_elapsed / (count // 10) * 1e6, 3),
+        "bookLevels": [len(book.bids.prices), len(book.asks.prices)],
+        "gapDetected": gap_detected,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure how many depth diffs per second the local order book applies")
+    parser.add_argument("-l", "--levels", type=int, default=1000, help="Levels per side of the initial snapshot")
+    parser.add_argument("-n", "--diffs", type=int, default=200000, help="Diffs to apply")
+    parser.add_argument("-k", "--changes", type=int, default=5, help="Changed levels per side and diff")
+    parser.add_argument("-r", "--read-every", type=int, default=100, help="Take a full snapshot every n diffs, 0 never")
+    parser.add_argument("-d", "--depth", type=int, default=20, help="Levels of the partial snapshots")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--min-rate", type=int, default=None, help="Exit with 1 below this many diffs per second")
+    parser.add_argument("-o", "--output", default=None, help="Write the JSON results to this file")
+    args = parser.parse_args()
+
+    result = run_benchmark(args.levels, args.diffs, args.changes, args.read_every, args.depth, args.seed)
+    if args.output:
+        with open(args.output, "w") as stream:
+            json.dump(result, stream, indent=2)
+        print("Results written to {}".format(args.output))
+    else:
+        print(json.dumps(result, indent=2))
+
+    print("{} diffs/s ({} level updates/s, {} us per diff) on a {} level book, snapshot of {} levels {} us, full {} us"
+          .format(result["diffsPerSecond"], result["levelUpdatesPerSecond"], result["microsecondsPerDiff"],
+                  args.levels, args.depth, result["depthSnapshotMicroseconds"], result["fullSnapshotMicroseconds"]))
+    if args.min_rate is not None and result["diffsPerSecond"] < args.min_rate:
+        print("Below the required {} diffs/s".format(args.min_rate))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
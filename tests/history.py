@@ -0,0 +1,111 @@
+import argparse
+import json
+import sys
+import time
+
+from exchanges.history import compare, get_history_store, summarize
+from exchanges.settings import load_settings
+
+
+def list_runs(store, kind: str, limit: int) -> None:
+    for run in store.runs(kind, limit):
+        print("{:>5}  {}  {:<9} {:<9} {:<9} {:>4} results  {}{}".format(
+            run["id"], time.strftime("%Y-%m-%d %H:%M", time.localtime(run["created"])), run["kind"],
+            run["target"] or "-", run["git_sha"] or "-", run["results"],
+            " ".join("{} {}".format(x, y) for x, y in run["versions"].items()),
+            "  [{}]".format(run["label"]) if run["label"] else ""))
+
+
+def show_run(store, run_id: int) -> None:
+    run = store.run(run_id)
+    print("Run {} ({}, {}, {})".format(run["id"], run["kind"], run["target"], run["git_sha"]))
+    print("{:<10} {:<40} {:>6} {:>10} {:>10} {:>10} {:>6}".format("exchange", "operation", "count", "p50 ms",
+                                                                   "p90 ms", "p99 ms", "errors"))
+    for (exchange, operation), result in sorted(store.results(run_id).items()):
+        summary = summarize(result["samples"])
+        print("{:<10} {:<40} {:>6} {:>10} {:>10} {:>10} {:>6}".format(
+            exchange, operation[:40], len(result["samples"]), _ms(summary["p50"]), _ms(summary["p90"]),
+            _ms(summary["p99"]), result["errors"]))
+
+
+def compare_runs(store, baseline_id: int, candidate_id: int, alpha: float, threshold: float,
+                 min_samples: int) -> dict:
+    baseline = store.run(baseline_id)
+    candidate = store.run(candidate_id)
+    rows = compare(store.results(baseline_id), store.results(candidate_id), alpha, threshold, min_samples)
+
+    print("Baseline run {} ({}, {}), candidate run {} ({}, {})".format(
+        baseline["id"], baseline["kind"], baseline["git_sha"], candidate["id"], candidate["kind"],
+        candidate["git_sha"]))
+    for package in sorted(set(baseline["versions"]) | set(candidate["versions"])):
+        before, after = baseline["versions"].get(package), candidate["versions"].get(package)
+        if before != after:
+            print("  {} {} -> {}".format(package, before, after))
+    print("{:<10} {:<40} {:>10} {:>10} {:>8} {:>9}  {}".format("exchange", "operation", "p50 before", "p50 after",
+                                                              "change", "p-value", "verdict"))
+    for row in rows:
+        print("{:<10} {:<40} {:>10} {:>10} {:>8} {:>9}  {}".format(
+            row["exchange"], row["operation"][:40], _ms(row["baselineP50"]), _ms(row["candidateP50"]),
+            "{:+.1%}".format(row["change"]) if row["change"] is not None else "-",
+            "{:.4f}".format(row["pValue"]) if row["pValue"] is not None else "-", row["verdict"]))
+
+    regressions = [x for x in rows if x["verdict"] == "regression"]
+    print("{} regressions, {} improvements in {} operations".format(
+        len(regressions), sum(x["verdict"] == "improvement" for x in rows), len(rows)))
+    return {"baseline": baseline, "candidate": candidate, "alpha": alpha, "threshold": threshold, "rows": rows}
+
+
+def _ms(value) -> str:
+    return "{:.1f}".format(value) if value is not None else "-"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="List the benchmark and test suite runs of the history store and "
+                                                 "compare two of them for latency regressions")
+    parser.add_argument("-c", "--config", default=None,
+                        help="Config with the history store, defaults to $CRYPTO_TESTS_CONFIG or tests/config.yaml")
+    parser.add_argument("--store", default=None, help="History store, defaults to history.path of the config")
+    commands = parser.add_subparsers(dest="command", required=True)
+    list_parser = commands.add_parser("list", help="List the latest runs")
+    list_parser.add_argument("-k", "--kind", default=None, choices=("benchmark", "suite"))
+    list_parser.add_argument("-n", "--limit", type=int, default=20)
+    show_parser = commands.add_parser("show", help="Show the percentiles of one run")
+    show_parser.add_argument("run", type=int)
+    compare_parser = commands.add_parser("compare", help="Compare two runs, the latest two of a kind by default")
+    compare_parser.add_argument("baseline", type=int, nargs="?", default=None)
+    compare_parser.add_argument("candidate", type=int, nargs="?", default=None)
+    compare_parser.add_argument("-k", "--kind", default="benchmark", choices=("benchmark", "suite"),
+                                help="Kind of the runs compared by default")
+    compare_parser.add_argument("-a", "--alpha", type=float, default=0.01, help="Significance level of the test")
+    compare_parser.add_argument("-t", "--threshold", type=float, default=0.1,
+                                help="Smallest relative change of the median reported, 0.1 is 10 %%")
+    compare_parser.add_argument("-m", "--min-samples", type=int, default=5,
+                                help="Operations with fewer samples in a run are not judged")
+    compare_parser.add_argument("-o", "--output", default=None, help="Write the JSON comparison to this file")
+    args = parser.parse_args()
+
+    store = get_history_store(args.store or load_settings(args.config)["history"]["path"])
+    if args.command == "list":
+        list_runs(store, args.kind, args.limit)
+    elif args.command == "show":
+        show_run(store, args.run)
+    else:
+        baseline, candidate = args.baseline, args.candidate
+        if candidate is None:
+            runs = [x["id"] for x in store.runs(args.kind, 2)]
+            if len(runs) < (2 if baseline is None else 1):
+                print("Less than two {} runs in {}".format(args.kind, store.path))
+                sys.exit(2)
+            candidate = runs[0]
+            baseline = baseline if baseline is not None else runs[1]
+        comparison = compare_runs(store, baseline, candidate, args.alpha, args.threshold, args.min_samples)
+        if args.output:
+            with open(args.output, "w") as stream:
+                json.dump(comparison, stream, indent=2)
+            print("Comparison written to {}".format(args.output))
+        if any(x["verdict"] == "regression" for x in comparison["rows"]):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import argparse
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TESTS = os.path.join(ROOT, "tests", "integration")
+
+
+def import_times(module: str) -> list:
+    """
+    Imports `module` in a fresh interpreter with -X importtime and returns [(module, self us, cumulative us)] of every
+    module it loaded, in load order.
+    """
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import {}".format(module)],
+                               cwd=TESTS, env=_environment(), capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError("Import of {} failed:\n{}".format(module, completed.stderr[-2000:]))
+    times = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        times.append((name.strip(), int(own), int(cumulative)))
+    return times
+
+
+def startup_seconds(target: str, repeat: int) -> list:
+    """
+    Returns the wall clock seconds of `repeat` fresh interpreters loading the tests of `target` (a test module or
+    module.Class), i.e. the time before unittest could run the first test.
+    """
+    code = "import unittest; unittest.defaultTestLoader.loadTestsFromName({!r})".format(target)
+    seconds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=TESTS, env=_environment(), check=True)
+        seconds.append(time.perf_counter() - started)
+    return seconds
+
+
+def measure(target: str, repeat: int, top: int) -> dict:
+    times = import_times(target.split(".")[0])
+    packages = {}
+    for name, own, _ in times:
+        packages[name.split(".")[0]] = packages.get(name.split(".")[0], 0) + own
+    seconds = startup_seconds(target, repeat)
+    return {
+        "target": target,
+        "startupSeconds": round(statistics.median(seconds), 4),
+        "startupMinSeconds": round(min(seconds), 4),
+        "importSeconds": round(times[-1][2] / 1e6, 4) if times else 0.0,
+        "modules": len(times),
+        "packages": {x: round(y / 1e6, 4) for x, y in sorted(packages.items(), key=lambda x: -x[1])[:top]},
+        "slowestModules": [{"module": x, "selfSeconds": round(y / 1e6, 4), "cumulativeSeconds": round(z / 1e6, 4)}
+                           for x, y, z in sorted(times, key=lambda x: -x[1])[:top]],
+    }
+
+
+def _environment() -> dict:
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = os.pathsep.join(x for x in (ROOT, environment.get("PYTHONPATH")) if x)
+    return environment
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure the import cost and startup time of the test modules")
+    parser.add_argument("-t", "--targets", nargs="+", default=None,
+                        help="Test modules or module.Class to load, defaults to every module in tests/integration")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="Fresh interpreters per startup measurement")
+    parser.add_argument("-k", "--top", type=int, default=10, help="Number of packages and modules to list")
+    parser.add_argument("--budget", type=float, default=None, help="Exit with 1 when a startup takes longer (s)")
+    parser.add_argument("-o", "--output", default=None, help="Write the JSON results to this file")
+    args = parser.parse_args()
+
+    targets = args.targets or sorted(os.path.basename(x)[:-3] for x in glob.glob(os.path.join(TESTS, "test*.py")))
+    results = [measure(target, args.repeat, args.top) for target in targets]
+    if args.output:
+        with open(args.output, "w") as stream:
+            json.dump(results, stream, indent=2)
+        print("Results written to {}".format(args.output))
+
+    for result in results:
+        print("{}: startup {:.3f}s (min {:.3f}s), imports {:.3f}s in {} modules".format(
+            result["target"], result["startupSeconds"], result["startupMinSeconds"], result["importSeconds"],
+            result["modules"]))
+        print("  by package: {}".format(", ".join("{} {:.3f}s".format(x, y) for x, y in result["packages"].items())))
+        for module in result["slowestModules"]:
+            print("  {:<45} self {:.4f}s  cumulative {:.4f}s".format(module["module"], module["selfSeconds"],
+                                                                       module["cumulativeSeconds"]))
+
+    over = [x["target"] for x in results if args.budget is not None and x["startupSeconds"] > args.budget]
+    if over:
+        print("Startup over the budget of {}s: {}".format(args.budget, ", ".join(over)))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,26 @@
 import unittest
 
-import requests
-import ccxt
-
-from utils import load_config
+from exchanges.account_settings import AccountSettings, ISOLATED, SymbolSettings, get_settings_cache
+from exchanges.flatten import flatten_binance
+from exchanges.order_book import from_binance
+from utils import (exchange_client, instrument_registry, load_config, market_data_stream, mutates_account_settings,
+                   public_client, public_url, timed_calls)
 
 
+@timed_calls
 class BinanceFuturesTest(unittest.TestCase):
-    def setUp(self) -> None:
-        print("Start SetUp")
+    VENUE = "binance"
 
+    @classmethod
+    def setUpClass(cls) -> None:
         print("Load config")
-        self.config = load_config("../config.yaml")
+        cls.config = load_config()
 
-        print("Init CCXT Binance client")
-        self.exchange = ccxt.binance({
-            "apiKey": self.config["binanceApi"]["apiKey"],
-            "secret": self.config["binanceApi"]["secretKey"]}
-        )
+    def setUp(self) -> None:
+        print("Start SetUp")
 
-        self.exchange.set_sandbox_mode(True)
+        print("Init CCXT Binance client")
+        self.exchange = exchange_client(self.config, "binance")
         self.set_default_setting()
 
         print("Finished SetUp")
@@ -27,55 +28,26 @@ class BinanceFuturesTest(unittest.TestCase):
     def tearDown(self) -> None:
         print("Start Tear down")
 
-        print("Cancel all pending orders")
-        symbols = ["BTC/USDT:USDT", "ETH/USDT:USDT", "SOL/USDT:USDT"]
-
-        print("Get pending orders")
-        open_orders_response = [x for x in symbols if self.exchange.fetch_open_orders(x)]
-        print("Pending response orders: {}".format(open_orders_response))
+        print("Cancel all pending orders and positions")
+        flatten_binance(self.exchange)
 
-        print("Cancel all pending orders")
-        for x in open_orders_response:
-            cancel_orders_response = self.exchange.cancel_all_orders(x)
-            print("Cancel orders response: {}".format(cancel_orders_response))
-
-        print("Finished cancel all pending orders")
-
-        print("Cancel all positions")
-
-        print("Get positions")
-        response = self.exchange.fetch_positions()
-        print("Filtering active positions")
-        active_positions = [x for x in response if float(x["info"]["positionAmt"]) != 0]
-        print("Active positions: {}".format(active_positions))
-        print("Finished get positions")
-
-        print("Cancel all positions")
-        for position in active_positions:
-            position_info = position["info"]
-            self.exchange.create_order(symbol=position["symbol"],
-                                       type="market",
-                                       side="sell" if position["side"] == "long" else "buy",
-                                       amount=abs(float(position_info["positionAmt"])),
-                                       params={
-                                           "reduceOnly": True})
-
-        print("Finished cancel all positions")
         self.set_default_setting()
         print("Finished Tear down")
 
     def test_get_btc_current_price(self):
         print("Start test_get_btc_current_price")
-        url = "https://api.binance.com/api/v3/depth?limit={}&symbol={}"
+        url = public_url(self.config, "https://api.binance.com/api/v3/depth?limit={}&symbol={}")
 
         payload = {}
         headers = {}
 
-        response = requests.request("GET", url.format(10, "BTCUSDT"), headers=headers, data=payload).json()
+        response = public_client(self.config).request("GET", url.format(10, "BTCUSDT"), headers=headers,
+                                                      data=payload).json()
         print("Response: {}".format(response))
-        bid = float(response["bids"][0][0])
-        ask = float(response["asks"][0][0])
-        spread = ask - bid
+        book = from_binance(response, "BTCUSDT")
+        bid = book.best_bid
+        ask = book.best_ask
+        spread = book.spread
 
         print("Bid price is: {}, ask price is: {} and spread is: {}".format(bid, ask, spread))
 
@@ -85,11 +57,27 @@ class BinanceFuturesTest(unittest.TestCase):
 
         print("Finished test_get_btc_current_price")
 
+    def test_get_btc_current_price_from_stream(self):
+        print("Start test_get_btc_current_price_from_stream")
+
+        book = market_data_stream(self.config).wait_for_book("binance", "BTCUSDT")
+        bid = book.best_bid
+        ask = book.best_ask
+        spread = book.spread
+
+        print("Bid price is: {}, ask price is: {} and spread is: {}".format(bid, ask, round(spread, 3)))
+
+        self.assertTrue(bid > 0)
+        self.assertTrue(ask > 0)
+        self.assertTrue(bid < ask)
+
+        print("Finished test_get_btc_current_price_from_stream")
+
     def test_get_btc_daily_ohlc(self):
         print("Start test_get_btc_daily_ohlc")
-        url = "https://fapi.binance.com/fapi/v1/klines?symbol={}&interval={}"
+        url = public_url(self.config, "https://fapi.binance.com/fapi/v1/klines?symbol={}&interval={}")
 
-        response = requests.request("GET", url.format("BTCUSDT", "1d")).json()
+        response = public_client(self.config).request("GET", url.format("BTCUSDT", "1d")).json()
         print("Response: {}".format(response))
 
         self.assertTrue(len(response) > 1)
@@ -97,17 +85,11 @@ class BinanceFuturesTest(unittest.TestCase):
 
     def test_get_btcusdt_info(self):
         print("Start test_get_btcusdt_info")
-        url = "https://fapi.binance.com/fapi/v1/exchangeInfo"
-
-        payload = {}
-        headers = {}
-
-        response = requests.request("GET", url.format(headers=headers, payload=payload)).json()
-        print("Response: {}".format(response))
-
-        btc_info = response["symbols"][0]
+        registry = instrument_registry(self.config)
+        instrument = registry.instrument("binance", "BTCUSDT")
+        btc_info = registry.info("binance", "BTCUSDT")
 
-        print(btc_info)
+        print(instrument)
 
         # Base info
         self.assertEqual(btc_info["symbol"], "BTCUSDT")
@@ -120,6 +102,8 @@ class BinanceFuturesTest(unittest.TestCase):
         self.assertEqual(btc_info["filters"][2]["maxQty"], "120")
         self.assertEqual(btc_info["filters"][2]["minQty"], "0.001")
         self.assertEqual(btc_info["filters"][2]["stepSize"], "0.001")
+        self.assertEqual(instrument.min_qty, 0.001)
+        self.assertEqual(instrument.step_size, 0.001)
 
         print("Finished test_get_btcusdt_info")
 
@@ -347,6 +331,7 @@ class BinanceFuturesTest(unittest.TestCase):
 
         print("Finished test_cancel_all_positions")
 
+    @mutates_account_settings("binance")
     def test_set_hedge_mode(self):
         print("Start test_set_hedge_mode")
         response = self.exchange.set_position_mode(hedged=True)
@@ -356,6 +341,7 @@ class BinanceFuturesTest(unittest.TestCase):
         self.assertEqual(response["msg"], "success")
         print("Finished test_set_hedge_mode")
 
+    @mutates_account_settings("binance")
     def test_change_margin_mode_to_cross(self):
         print("Start test_change_margin_type")
         response = self.exchange.set_margin_mode(
@@ -369,6 +355,7 @@ class BinanceFuturesTest(unittest.TestCase):
 
         print("Finished test_change_margin_type")
 
+    @mutates_account_settings("binance")
     def test_change_leverage(self):
         print("Start test_change_leverage")
         try:
@@ -405,36 +392,48 @@ class BinanceFuturesTest(unittest.TestCase):
                                           )
 
     def set_default_setting(self):
+        settings = get_settings_cache().get("binance", self.get_account_settings)
         try:
-            print("Set one-way trading mode")
-            self.exchange.set_position_mode(hedged=False)
+            if settings.hedged:
+                try:
+                    print("Set one-way trading mode")
+                    self.exchange.set_position_mode(hedged=False)
+                except Exception as e:
+                    if "No need to change position side." not in str(e):
+                        raise e
+                settings.hedged = False
+
+            for symbol in ["BTC/USDT:USDT", "ETH/USDT:USDT"]:
+                symbol_settings = settings.symbol(self.exchange.market_id(symbol))
+
+                if symbol_settings.margin_mode != ISOLATED:
+                    print("Set isolated margin mode on {}".format(symbol))
+                    self.exchange.set_margin_mode(
+                        marginMode="ISOLATED",
+                        symbol=symbol
+                    )
+                    symbol_settings.margin_mode = ISOLATED
+
+                if (symbol_settings.buy_leverage, symbol_settings.sell_leverage) != (20, 20):
+                    print("Set default leverage for {}".format(symbol))
+                    try:
+                        self.exchange.set_leverage(leverage=20, symbol=symbol)
+                    except Exception as e:
+                        if "leverage not modified" not in str(e):
+                            raise e
+                    symbol_settings.buy_leverage = symbol_settings.sell_leverage = 20
         except Exception as e:
-            if "No need to change position side." not in str(e):
-                raise e
-
-        print("Set isolated margin mode on BTC and default leverage")
-
-        self.exchange.set_margin_mode(
-            marginMode="ISOLATED",
-            symbol="BTC/USDT:USDT"
-        )
-
-        print("Set isolated margin mode on ETH and default leverage")
-        self.exchange.set_margin_mode(
-            marginMode="ISOLATED",
-            symbol="ETH/USDT:USDT"
-        )
-
-        print("Set default leverage for BTC")
-        try:
-            self.exchange.set_leverage(leverage=20, symbol="BTC/USDT:USDT")
-        except Exception as e:
-            if "leverage not modified" not in str(e):
-                raise e
-
-        print("Set default leverage for ETH")
-        try:
-            self.exchange.set_leverage(leverage=20, symbol="ETH/USDT:USDT")
-        except Exception as e:
-            if "leverage not modified" not in str(e):
-                raise e
+            get_settings_cache().invalidate("binance")
+            raise e
+
+    def get_account_settings(self) -> AccountSettings:
+        print("Read account settings")
+        position_side = self.exchange.fapiPrivateGetPositionSideDual()
+        settings = AccountSettings(hedged=str(position_side["dualSidePosition"]).lower() == "true")
+
+        for position in self.exchange.fapiPrivateV2GetPositionRisk():
+            leverage = int(position["leverage"])
+            settings.symbols[position["symbol"]] = SymbolSettings(margin_mode=position["marginType"].lower(),
+                                                                  buy_leverage=leverage,
+                                                                  sell_leverage=leverage)
+        return settings
@@ -0,0 +1,124 @@
+import asyncio
+
+from exchanges.flatten import flatten_binance
+from utils import SharedLoopTestCase, async_exchange_client, exchange_client, load_config, timed_calls
+
+
+@timed_calls
+class BinanceFuturesAsyncTest(SharedLoopTestCase):
+    VENUE = "binance"
+    SYMBOLS = ["BTC/USDT:USDT", "ETH/USDT:USDT", "SOL/USDT:USDT", "DOGE/USDT:USDT"]
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("Load config")
+        cls.config = load_config()
+
+        # One client, aiohttp session and event loop for every test of the class
+        print("Init CCXT async Binance client")
+        cls.exchange = async_exchange_client(cls.config, "binance")
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        print("Close CCXT async Binance client")
+        cls.run_async(cls.exchange.close())
+        super().tearDownClass()
+
+    async def asyncTearDown(self) -> None:
+        print("Start Tear down")
+
+        print("Cancel all pending orders and positions")
+        await asyncio.to_thread(flatten_binance, exchange_client(self.config, "binance"))
+
+        print("Finished Tear down")
+
+    async def test_get_order_books_of_many_symbols(self):
+        print("Start test_get_order_books_of_many_symbols")
+
+        responses = await asyncio.gather(*[self.exchange.fetch_order_book(x, limit=5) for x in self.SYMBOLS])
+        print("Responses: {}".format(responses))
+
+        for symbol, response in zip(self.SYMBOLS, responses):
+            bid = response["bids"][0][0]
+            ask = response["asks"][0][0]
+            print("{} bid price is: {}, ask price is: {}".format(symbol, bid, ask))
+
+            self.assertEqual(response["symbol"], symbol)
+            self.assertTrue(0 < bid < ask)
+
+        print("Finished test_get_order_books_of_many_symbols")
+
+    async def test_get_positions(self):
+        print("Start test_get_positions")
+
+        print("Create small positions on BTC and ETH")
+        await asyncio.gather(self.create_small_btc_long_position(), self.create_small_eth_short_position())
+
+        print("Get positions")
+        response = await self.exchange.fetch_positions()
+        print("Response: {}".format(response))
+
+        active_positions = [x for x in response if float(x["info"]["positionAmt"]) != 0]
+        print("Active positions: {}".format(active_positions))
+
+        self.assertEqual(len(active_positions), 2)
+        self.assertTrue("BTCUSDT" in [x["info"]["symbol"] for x in active_positions])
+        self.assertTrue("ETHUSDT" in [x["info"]["symbol"] for x in active_positions])
+
+        print("Finished test_get_positions")
+
+    async def test_get_pending_orders(self):
+        print("Start test_get_pending_orders")
+
+        print("Create small limit orders on BTC and ETH")
+        # buy limit btc on 20 000 USD
+        # sell limit eth on 2500 USD
+        await asyncio.gather(self.create_small_btc_long_position("limit", 20000),
+                             self.create_small_eth_short_position("limit", 2500))
+
+        print("Get pending orders")
+        responses = await asyncio.gather(*[self.exchange.fetch_open_orders(x) for x in self.SYMBOLS])
+        open_orders_response = [symbol for symbol, orders in zip(self.SYMBOLS, responses) if orders]
+        print("Pending response orders: {}".format(open_orders_response))
+
+        self.assertEqual(len(open_orders_response), 2)
+        self.assertTrue("BTC/USDT:USDT" in open_orders_response)
+        self.assertTrue("ETH/USDT:USDT" in open_orders_response)
+
+        print("Finished test_get_pending_orders")
+
+    async def test_cancel_all_pending_orders(self):
+        print("Start test_cancel_all_pending_orders")
+
+        print("Create small limit orders on BTC and ETH")
+        await asyncio.gather(self.create_small_btc_long_position("limit", 20000),
+                             self.create_small_eth_short_position("limit", 2500))
+
+        print("Cancel all pending orders")
+        cancel_orders_response = await asyncio.gather(*[self.exchange.cancel_all_orders(x)
+                                                        for x in ["BTC/USDT:USDT", "ETH/USDT:USDT"]])
+        print("Cancel orders response: {}".format(cancel_orders_response))
+
+        print("Get pending orders")
+        responses = await asyncio.gather(*[self.exchange.fetch_open_orders(x) for x in self.SYMBOLS])
+        pending_orders_response = [symbol for symbol, orders in zip(self.SYMBOLS, responses) if orders]
+        print("Pending orders response: {}".format(pending_orders_response))
+
+        self.assertEqual(len(pending_orders_response), 0)
+
+        print("Finished test_cancel_all_pending_orders")
+
+    async def create_small_btc_long_position(self, type_of_order="market", limit_price=None):
+        return await self.exchange.create_order(symbol="BTC/USDT:USDT",
+                                                type=type_of_order,
+                                                side="buy",
+                                                amount=0.001,
+                                                price=limit_price)
+
+    async def create_small_eth_short_position(self, type_of_order="market", limit_price=None):
+        return await self.exchange.create_order(symbol="ETH/USDT:USDT",
+                                                type=type_of_order,
+                                                side="sell",
+                                                amount=0.01,
+                                                price=limit_price)
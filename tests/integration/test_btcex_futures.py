@@ -1,35 +1,40 @@
 import unittest
 
-import ccxt
-import requests
-
 import datetime
 
+from exchanges.order_book import from_btcex
+from utils import (exchange_client, instrument_registry, load_config, market_data_stream, public_client, public_url,
+                   timed_calls)
+
 
+@timed_calls
 class BtcexFuturesTest(unittest.TestCase):
+    VENUE = "btcex"
+
     # Test only public methods, because exchange not support testnet
     # Btcex exchange support buy_btc_by_stop_order_with_take_profit_and_stop_loss and place_trailing_stop by spec
 
-    def setUp(self) -> None:
-        self.exchange = ccxt.btcex()
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.config = load_config()
 
-        # NotSupported: btcex does not have a sandbox URL
-        # self.exchange.set_sandbox_mode(True)
-        pass
+    def setUp(self) -> None:
+        self.exchange = exchange_client(self.config, "btcex")
 
     def test_get_btc_current_price(self):
         print("Start test_get_btc_current_price")
-        url = "https://api.btcex.com/api/v1/public/get_order_book?instrument_name={}"
+        url = public_url(self.config, "https://api.btcex.com/api/v1/public/get_order_book?instrument_name={}")
 
         payload = {}
         headers = {}
 
-        response = requests.request("GET", url.format("BTC-USDT-PERPETUAL"), headers=headers, data=payload).json()
+        response = public_client(self.config).request("GET", url.format("BTC-USDT-PERPETUAL"), headers=headers,
+                                                      data=payload).json()
         print("Response: {}".format(response))
-        result = response["result"]
-        bid = float(result["bids"][0][0])
-        ask = float(result["asks"][0][0])
-        spread = ask - bid
+        book = from_btcex(response)
+        bid = book.best_bid
+        ask = book.best_ask
+        spread = book.spread
 
         print("Bid price is: {}, ask price is: {} and spread is: {}".format(bid, ask, spread))
 
@@ -39,9 +44,25 @@ class BtcexFuturesTest(unittest.TestCase):
 
         print("Finished test_get_btc_current_price")
 
+    def test_get_btc_current_price_from_stream(self):
+        print("Start test_get_btc_current_price_from_stream")
+
+        book = market_data_stream(self.config).wait_for_book("btcex", "BTCUSDT")
+        bid = book.best_bid
+        ask = book.best_ask
+        spread = book.spread
+
+        print("Bid price is: {}, ask price is: {} and spread is: {}".format(bid, ask, round(spread, 3)))
+
+        self.assertTrue(bid > 0)
+        self.assertTrue(ask > 0)
+        self.assertTrue(bid < ask)
+
+        print("Finished test_get_btc_current_price_from_stream")
+
     def test_get_btc_daily_ohlc(self):
         print("Start test_get_btc_current_price")
-        url = "https://api.btcex.com/api/v1/public/get_tradingview_chart_data?instrument_name={}&start_timestamp={}&end_timestamp={}&resolution={}"
+        url = public_url(self.config, "https://api.btcex.com/api/v1/public/get_tradingview_chart_data?instrument_name={}&start_timestamp={}&end_timestamp={}&resolution={}")
 
         payload = {}
         headers = {}
@@ -51,8 +72,9 @@ class BtcexFuturesTest(unittest.TestCase):
         unix_time = five_day_before.strftime("%s")  # Second as a decimal number (or Unix Timestamp)
 
         print("Get response")
-        response = requests.request("GET", url.format("BTC-USDT", datetime.datetime.now(), unix_time, "1D"),
-                                    headers=headers, data=payload).json()
+        response = public_client(self.config).request("GET",
+                                                      url.format("BTC-USDT", datetime.datetime.now(), unix_time, "1D"),
+                                                      headers=headers, data=payload).json()
         print("Response: {}".format(response))
         ohlc_daily = response["result"]
 
@@ -61,16 +83,10 @@ class BtcexFuturesTest(unittest.TestCase):
         print("Finished test_get_btc_current_price")
 
     def test_get_btcusdt_info(self):
-        url = "https://api.btcex.com/api/v1/public/get_instruments?currency={}&base_currency={}"
-
-        payload = {}
-        headers = {}
-
-        response = requests.request("GET", url.format("PERPETUAL", "USDT", headers=headers, payload=payload)).json()
-        print("Response: {}".format(response))
-        result = response["result"]
-
-        btc_info = result[0]
+        registry = instrument_registry(self.config)
+        instrument = registry.instrument("btcex", "BTC-USDT-PERPETUAL")
+        btc_info = registry.info("btcex", "BTC-USDT-PERPETUAL")
+        print(instrument)
 
         # Base info
         self.assertEqual(btc_info["instrument_name"], "BTC-USDT-PERPETUAL")
@@ -85,5 +101,6 @@ class BtcexFuturesTest(unittest.TestCase):
 
         # Lot size filter
         self.assertEqual(btc_info["min_qty"], "0.001")
+        self.assertEqual(instrument.min_qty, 0.001)
 
         print("Finished test_get_btcusdt_info")
@@ -1,25 +1,27 @@
 import unittest
 
-from pybit.unified_trading import HTTP
-
-from utils import load_config
+from exchanges.account_settings import AccountSettings, CROSS, ISOLATED, SymbolSettings, get_settings_cache
+from exchanges.flatten import flatten_bybit
+from exchanges.order_book import from_bybit
+from utils import (exchange_client, instrument_registry, load_config, market_data_stream, mutates_account_settings,
+                   timed_calls)
 
 
+@timed_calls
 class BybitFuturesTest(unittest.TestCase):
+    VENUE = "bybit"
     CATEGORY = "linear"
 
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("Load config")
+        cls.config = load_config()
+
     def setUp(self) -> None:
         print("Start SetUp")
 
-        print("Load config")
-        self.config = load_config("../config.yaml")
-
         print("Init exchange client")
-        self.exchange = HTTP(
-            testnet=self.config["bybitApi"]["testnet"],
-            api_key=self.config["bybitApi"]["apiKey"],
-            api_secret=self.config["bybitApi"]["secretKey"]
-        )
+        self.exchange = exchange_client(self.config, "bybit")
 
         self.set_default_setting()
 
@@ -28,21 +30,8 @@ class BybitFuturesTest(unittest.TestCase):
     def tearDown(self) -> None:
         print("Start Tear down")
 
-        print("Cancel all derivatives orders")
-        self.exchange.cancel_all_orders(category=self.CATEGORY, settleCoin="USDT")
-
-        print("Cancel all derivatives positions")
-        positions = self.exchange.get_positions(category=self.CATEGORY, settleCoin="USDT")
-
-        for position in positions["result"]["list"]:
-            self.exchange.place_order(
-                category=self.CATEGORY,
-                symbol=position["symbol"],
-                orderType="Market",
-                side="Sell" if position["side"] == "Buy" else "Buy",
-                qty=position["size"],
-                positionIdx=position["positionIdx"],
-                reduceOnly=True)
+        print("Cancel all derivatives orders and positions")
+        flatten_bybit(self.exchange, category=self.CATEGORY, settle_coin="USDT")
 
         self.set_default_setting()
 
@@ -57,10 +46,10 @@ class BybitFuturesTest(unittest.TestCase):
         )
 
         print("Response: {}".format(response))
-        result = response["result"]
-        bid = float(result["b"][0][0])
-        ask = float(result["a"][0][0])
-        spread = ask - bid
+        book = from_bybit(response)
+        bid = book.best_bid
+        ask = book.best_ask
+        spread = book.spread
 
         print("Bid price is: {}, ask price is: {} and spread is: {}".format(bid, ask, round(spread, 3)))
 
@@ -72,6 +61,22 @@ class BybitFuturesTest(unittest.TestCase):
 
         print("Finished test_get_btc_current_price")
 
+    def test_get_btc_current_price_from_stream(self):
+        print("Start test_get_btc_current_price_from_stream")
+
+        book = market_data_stream(self.config).wait_for_book("bybit", "BTCUSDT")
+        bid = book.best_bid
+        ask = book.best_ask
+        spread = book.spread
+
+        print("Bid price is: {}, ask price is: {} and spread is: {}".format(bid, ask, round(spread, 3)))
+
+        self.assertTrue(bid > 0)
+        self.assertTrue(ask > 0)
+        self.assertTrue(bid < ask)
+
+        print("Finished test_get_btc_current_price_from_stream")
+
     def test_get_btc_daily_ohlc(self):
         print("Start test_get_btc_daily_ohlc")
 
@@ -93,20 +98,11 @@ class BybitFuturesTest(unittest.TestCase):
     def test_get_btcusdt_info(self):
         print("Start test_get_btcusdt_info")
 
-        response = self.exchange.get_instruments_info(
-            category=self.CATEGORY,
-            symbol="BTCUSDT"
-        )
-
-        print("Response: {}".format(response))
-        result = response["result"]
-
-        btc_info = result["list"][0]
+        registry = instrument_registry(self.config)
+        instrument = registry.instrument("bybit", "BTCUSDT")
+        btc_info = registry.info("bybit", "BTCUSDT")
 
-        print(btc_info)
-
-        self.assertEqual(response["retCode"], 0)
-        self.assertEqual(response["retMsg"], "OK")
+        print(instrument)
 
         # Base info
         self.assertEqual(btc_info["symbol"], "BTCUSDT")
@@ -125,6 +121,9 @@ class BybitFuturesTest(unittest.TestCase):
         self.assertEqual(btc_info["lotSizeFilter"]["maxOrderQty"], "100.000")
         self.assertEqual(btc_info["lotSizeFilter"]["minOrderQty"], "0.001")
         self.assertEqual(btc_info["lotSizeFilter"]["qtyStep"], "0.001")
+        self.assertEqual(instrument.max_leverage, 100)
+        self.assertEqual(instrument.funding_interval, 480 * 60)
+        self.assertEqual(instrument.step_size, 0.001)
 
         print("Finished test_get_btcusdt_info")
 
@@ -368,6 +367,7 @@ class BybitFuturesTest(unittest.TestCase):
 
         print("Finished test_cancel_all_positions")
 
+    @mutates_account_settings("bybit")
     def test_set_hedge_mode(self):
         print("Start test_set_hedge_mode")
         response = self.exchange.switch_position_mode(category=self.CATEGORY, coin="USDT", mode=3)
@@ -377,6 +377,7 @@ class BybitFuturesTest(unittest.TestCase):
         self.assertEqual(response["retMsg"], "OK")
         print("Finished test_set_hedge_mode")
 
+    @mutates_account_settings("bybit")
     def test_change_margin_mode_to_cross(self):
         print("Start test_change_margin_mode")
         try:
@@ -397,6 +398,7 @@ class BybitFuturesTest(unittest.TestCase):
 
         print("Finished test_change_margin_mode")
 
+    @mutates_account_settings("bybit")
     def test_change_leverage(self):
         print("Start test_change_leverage")
         try:
@@ -414,6 +416,7 @@ class BybitFuturesTest(unittest.TestCase):
                 raise e
         print("Finished test_change_leverage")
 
+    @mutates_account_settings("bybit")
     def test_change_buy_and_sell_leverage_in_hedge_mode(self):
         print("Start test_change_buy_and_sell_leverage_in_hedge_mode")
         try:
@@ -455,53 +458,61 @@ class BybitFuturesTest(unittest.TestCase):
         )
 
     def set_default_setting(self):
-        print("Set one-way trading mode")
-        self.exchange.switch_position_mode(category=self.CATEGORY, coin="USDT", mode=0)
-
-        print("Set isolated margin mode on BTC and default leverage")
-        try:
-            self.exchange.switch_margin_mode(
-                category=self.CATEGORY,
-                symbol="BTCUSDT",
-                tradeMode=1,
-                buyLeverage="1",
-                sellLeverage="1"
-                )
-        except Exception as e:
-            if "Cross/isolated margin mode is not modified" not in str(e):
-                raise e
-
-        print("Set isolated margin mode on ETH and default leverage")
-        try:
-            self.exchange.switch_margin_mode(
-                category=self.CATEGORY,
-                symbol="ETHUSDT",
-                tradeMode=1,
-                buyLeverage="1",
-                sellLeverage="1"
-                )
-        except Exception as e:
-            if "Cross/isolated margin mode is not modified" not in str(e):
-                raise e
-
-        print("Set default leverage for BTC")
+        settings = get_settings_cache().get("bybit", self.get_account_settings)
         try:
-            self.exchange.set_leverage(
-                category=self.CATEGORY,
-                buyLeverage="20",
-                sellLeverage="20",
-                symbol="BTCUSDT")
+            if settings.hedged:
+                print("Set one-way trading mode")
+                self.exchange.switch_position_mode(category=self.CATEGORY, coin="USDT", mode=0)
+                settings.hedged = False
+
+            for symbol in ["BTCUSDT", "ETHUSDT"]:
+                symbol_settings = settings.symbol(symbol)
+
+                if symbol_settings.margin_mode != ISOLATED:
+                    print("Set isolated margin mode and default leverage on {}".format(symbol))
+                    try:
+                        self.exchange.switch_margin_mode(
+                            category=self.CATEGORY,
+                            symbol=symbol,
+                            tradeMode=1,
+                            buyLeverage="20",
+                            sellLeverage="20"
+                            )
+                    except Exception as e:
+                        if "Cross/isolated margin mode is not modified" not in str(e):
+                            raise e
+                    symbol_settings.margin_mode = ISOLATED
+
+                elif (symbol_settings.buy_leverage, symbol_settings.sell_leverage) != (20, 20):
+                    print("Set default leverage for {}".format(symbol))
+                    try:
+                        self.exchange.set_leverage(
+                            category=self.CATEGORY,
+                            buyLeverage="20",
+                            sellLeverage="20",
+                            symbol=symbol)
+                    except Exception as e:
+                        if "leverage not modified" not in str(e):
+                            raise e
+                symbol_settings.buy_leverage = symbol_settings.sell_leverage = 20
         except Exception as e:
-            if "leverage not modified" not in str(e):
-                raise e
-
-        print("Set default leverage for ETH")
-        try:
-            self.exchange.set_leverage(
-                category=self.CATEGORY,
-                buyLeverage="20",
-                sellLeverage="20",
-                symbol="ETHUSDT")
-        except Exception as e:
-            if "leverage not modified" not in str(e):
-                raise e
+            get_settings_cache().invalidate("bybit")
+            raise e
+
+    def get_account_settings(self) -> AccountSettings:
+        print("Read account settings")
+        settings = AccountSettings(hedged=False)
+
+        for symbol in ["BTCUSDT", "ETHUSDT"]:
+            positions = self.exchange.get_positions(category=self.CATEGORY, symbol=symbol)["result"]["list"]
+            symbol_settings = SymbolSettings(margin_mode=CROSS, buy_leverage=0, sell_leverage=0)
+            for position in positions:
+                leverage = int(float(position["leverage"]))
+                settings.hedged = position["positionIdx"] != 0
+                symbol_settings.margin_mode = ISOLATED if position["tradeMode"] == 1 else CROSS
+                if position["positionIdx"] != 2:
+                    symbol_settings.buy_leverage = leverage
+                if position["positionIdx"] != 1:
+                    symbol_settings.sell_leverage = leverage
+            settings.symbols[symbol] = symbol_settings
+        return settings
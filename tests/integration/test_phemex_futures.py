@@ -1,27 +1,26 @@
 import unittest
 
-import ccxt
-import requests
-
-from tests.integration.utils import load_config
+from exchanges.account_settings import AccountSettings, CROSS, ISOLATED, SymbolSettings, get_settings_cache
+from exchanges.flatten import flatten_phemex
+from exchanges.order_book import from_phemex
+from tests.integration.utils import (exchange_client, instrument_registry, load_config, market_data_stream,
+                                     mutates_account_settings, public_client, public_url, timed_calls)
 
 
+@timed_calls
 class PhemexFuturesTest(unittest.TestCase):
+    VENUE = "phemex"
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("Load config")
+        cls.config = load_config()
 
     def setUp(self) -> None:
         print("Start SetUp")
 
-        print("Load config")
-        self.config = load_config("../config.yaml")
-
         print("Init CCXT Phemex client")
-        self.exchange = ccxt.phemex({
-            "apiKey": self.config["phemexApi"]["apiKey"],
-            "secret": self.config["phemexApi"]["secretKey"]
-        })
-
-        self.exchange.load_markets()
-        self.exchange.set_sandbox_mode(True)
+        self.exchange = exchange_client(self.config, "phemex")
         self.set_default_setting()
 
         print("Finished SetUp")
@@ -29,42 +28,25 @@ class PhemexFuturesTest(unittest.TestCase):
     def tearDown(self) -> None:
         print("Start Tear down")
 
-        print("Cancel all derivatives orders on BTCUSDT and ETHUSDT")
-        self.exchange.cancel_all_orders("BTCUSDT")
-        self.exchange.cancel_all_orders("BTCUSDT", params={"untriggered": True})
-
-        self.exchange.cancel_all_orders("ETHUSDT")
-        self.exchange.cancel_all_orders("ETHUSDT", params={"untriggered": True})
-
-        print("Cancel all derivatives positions on BTCUSDT and ETHUSDT")
-        positions = self.exchange.fetch_positions(symbols=["BTCUSDT", "ETHUSDT"])
-        for position in positions:
-            position_info = position["info"]
-
-            if position_info["side"] == 'None':
-                continue
-
-            self.exchange.create_order(symbol=position_info["symbol"],
-                                       type="market",
-                                       side="Sell" if position_info["side"] == "Buy" else "Buy",
-                                       amount=position_info["size"],
-                                       params={"reduceOnly": True})
+        print("Cancel all derivatives orders and positions on BTCUSDT and ETHUSDT")
+        flatten_phemex(self.exchange, symbols=["BTCUSDT", "ETHUSDT"])
 
         self.set_default_setting()
 
         print("Finished Tear down")
 
     def test_get_btc_current_price(self):
-        url = "https://testnet-api.phemex.com/md/orderbook?symbol={}"
+        url = public_url(self.config, "https://testnet-api.phemex.com/md/orderbook?symbol={}")
 
         payload = {}
         headers = {}
 
-        response = requests.request("GET", url.format("BTCUSD"), headers=headers, data=payload).json()
-        result = response["result"]
-        bid = result["book"]["bids"][0][0] / 10000
-        ask = result["book"]["asks"][0][0] / 10000
-        spread = ask - bid
+        response = public_client(self.config).request("GET", url.format("BTCUSD"), headers=headers,
+                                                      data=payload).json()
+        book = from_phemex(response)
+        bid = book.best_bid
+        ask = book.best_ask
+        spread = book.spread
 
         print("Bid price is: {}, ask price is: {} and spread is: {}".format(bid, ask, spread))
 
@@ -77,14 +59,31 @@ class PhemexFuturesTest(unittest.TestCase):
         print(response)
         pass
 
+    def test_get_btc_current_price_from_stream(self):
+        print("Start test_get_btc_current_price_from_stream")
+
+        book = market_data_stream(self.config).wait_for_book("phemex", "BTCUSDT")
+        bid = book.best_bid
+        ask = book.best_ask
+        spread = book.spread
+
+        print("Bid price is: {}, ask price is: {} and spread is: {}".format(bid, ask, round(spread, 3)))
+
+        self.assertTrue(bid > 0)
+        self.assertTrue(ask > 0)
+        self.assertTrue(bid < ask)
+
+        print("Finished test_get_btc_current_price_from_stream")
+
     def test_get_btc_daily_ohlc(self):
         print("Start test_get_btc_daily_ohlc")
-        url = "https://testnet-api.phemex.com/exchange/public/md/v2/kline?symbol={}&resolution={}&limit={}"
+        url = public_url(self.config, "https://testnet-api.phemex.com/exchange/public/md/v2/kline?symbol={}&resolution={}&limit={}")
 
         payload = {}
         headers = {}
 
-        response = requests.request("GET", url.format("BTCUSD", 86400, 100), headers=headers, data=payload).json()
+        response = public_client(self.config).request("GET", url.format("BTCUSD", 86400, 100), headers=headers,
+                                                      data=payload).json()
         print("Response: {}".format(response))
         ohlc_daily = response["data"]["rows"]
 
@@ -95,23 +94,11 @@ class PhemexFuturesTest(unittest.TestCase):
 
     def test_get_btcusdt_info(self):
         print("Start test_get_btcusdt_info")
-        url = "https://testnet-api.phemex.com/public/products"
-
-        payload = {}
-        headers = {}
-
-        response = requests.request("GET", url, headers=headers, data=payload).json()
-        print("Response: {}".format(response))
+        registry = instrument_registry(self.config)
+        instrument = registry.instrument("phemex", "BTCUSDT")
+        btc_info = registry.info("phemex", "BTCUSDT")
 
-        btc_info = None
-        for product in response["data"]["perpProductsV2"]:
-            if product["symbol"] == "BTCUSDT":
-                btc_info = product
-
-        print("BTCUSDT info: {}".format(btc_info))
-
-        self.assertEqual(response["code"], 0)
-        self.assertEqual(response["msg"], "")
+        print("BTCUSDT info: {}".format(instrument))
 
         # Base info
         self.assertTrue(btc_info is not None)
@@ -129,6 +116,8 @@ class PhemexFuturesTest(unittest.TestCase):
         self.assertEqual(btc_info["maxOrderQtyRq"], "100000")
         self.assertEqual(btc_info["minOrderValueRv"], "1")
         self.assertEqual(btc_info["qtyStepSize"], "0.001")
+        self.assertEqual(instrument.max_leverage, 100)
+        self.assertEqual(instrument.funding_interval, 28800)
 
         print("Finished test_get_btcusdt_info")
 
@@ -380,6 +369,7 @@ class PhemexFuturesTest(unittest.TestCase):
 
         print("Finished test_cancel_all_positions")
 
+    @mutates_account_settings("phemex")
     def test_set_hedge_mode(self):
         print("Start test_set_hedge_mode")
         response = self.exchange.set_position_mode(hedged=False, symbol="BTCUSDT")
@@ -390,6 +380,7 @@ class PhemexFuturesTest(unittest.TestCase):
 
         print("Finished test_set_hedge_mode")
 
+    @mutates_account_settings("phemex")
     def test_change_margin_mode_to_cross(self):
         print("Start test_change_margin_mode_to_cross")
 
@@ -400,6 +391,7 @@ class PhemexFuturesTest(unittest.TestCase):
 
         print("Finished test_change_margin_mode_to_cross")
 
+    @mutates_account_settings("phemex")
     def test_change_leverage(self):
         print("Start test_change_leverage")
 
@@ -418,11 +410,37 @@ class PhemexFuturesTest(unittest.TestCase):
             """)
 
     def set_default_setting(self) -> None:
-        print("Set one-way trading mode")
-        self.exchange.set_position_mode(hedged=False, symbol="BTCUSDT")
-
-        print("Set isolated margin mode and default leverage on BTC")
-        self.exchange.set_leverage(leverage=20, symbol="BTCUSDT")
-
-        print("Set isolated margin mode and default leverage on ETH")
-        self.exchange.set_leverage(leverage=20, symbol="ETHUSDT")
+        settings = get_settings_cache().get("phemex", self.get_account_settings)
+        try:
+            if settings.hedged:
+                print("Set one-way trading mode")
+                self.exchange.set_position_mode(hedged=False, symbol="BTCUSDT")
+                settings.hedged = False
+
+            for symbol in ["BTCUSDT", "ETHUSDT"]:
+                symbol_settings = settings.symbol(symbol)
+                if symbol_settings != SymbolSettings(margin_mode=ISOLATED, buy_leverage=20, sell_leverage=20):
+                    print("Set isolated margin mode and default leverage on {}".format(symbol))
+                    self.exchange.set_leverage(leverage=20, symbol=symbol)
+                    settings.symbols[symbol] = SymbolSettings(margin_mode=ISOLATED, buy_leverage=20, sell_leverage=20)
+        except Exception as e:
+            get_settings_cache().invalidate("phemex")
+            raise e
+
+    def get_account_settings(self) -> AccountSettings:
+        print("Read account settings")
+        settings = AccountSettings(hedged=False)
+
+        for position in self.exchange.fetch_positions(symbols=["BTCUSDT", "ETHUSDT"]):
+            position_info = position["info"]
+            # Phemex encodes cross margin as a non positive leverage
+            leverage = float(position_info["leverageRr"])
+            settings.hedged = position_info["posMode"] == "Hedged"
+
+            symbol_settings = settings.symbols.setdefault(position_info["symbol"], SymbolSettings(
+                margin_mode=ISOLATED if leverage > 0 else CROSS, buy_leverage=0, sell_leverage=0))
+            if position_info["posSide"] != "Short":
+                symbol_settings.buy_leverage = int(abs(leverage))
+            if position_info["posSide"] != "Long":
+                symbol_settings.sell_leverage = int(abs(leverage))
+        return settings
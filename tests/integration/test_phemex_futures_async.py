@@ -0,0 +1,96 @@
+import asyncio
+
+from exchanges.flatten import flatten_phemex
+from tests.integration.utils import (SharedLoopTestCase, async_exchange_client, exchange_client, load_config,
+                                     timed_calls)
+
+
+@timed_calls
+class PhemexFuturesAsyncTest(SharedLoopTestCase):
+    VENUE = "phemex"
+    SYMBOLS = ["BTCUSDT", "ETHUSDT"]
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("Load config")
+        cls.config = load_config()
+
+        # One client, aiohttp session and event loop for every test of the class
+        print("Init CCXT async Phemex client")
+        cls.exchange = async_exchange_client(cls.config, "phemex")
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        print("Close CCXT async Phemex client")
+        cls.run_async(cls.exchange.close())
+        super().tearDownClass()
+
+    async def asyncTearDown(self) -> None:
+        print("Start Tear down")
+
+        print("Cancel all derivatives orders and positions on BTCUSDT and ETHUSDT")
+        await asyncio.to_thread(flatten_phemex, exchange_client(self.config, "phemex"), symbols=self.SYMBOLS)
+
+        print("Finished Tear down")
+
+    async def test_get_positions(self):
+        print("Start test_get_positions")
+
+        print("Create small positions on BTC and ETH")
+        await asyncio.gather(
+            self.exchange.create_order(symbol="BTC/USDT:USDT", type="market", side="buy", amount=0.001),
+            self.exchange.create_order(symbol="ETH/USDT:USDT", type="market", side="buy", amount=0.01))
+
+        print("Get positions")
+        positions = await self.exchange.fetch_positions(symbols=self.SYMBOLS)
+        print("Positions response: {}".format(positions))
+
+        active_positions = [x for x in positions if float(x["info"]["size"]) > 0]
+        self.assertEqual(len(active_positions), 2)
+        self.assertTrue("BTCUSDT" in [x["info"]["symbol"] for x in active_positions])
+        self.assertTrue("ETHUSDT" in [x["info"]["symbol"] for x in active_positions])
+
+        print("Finish test_get_positions")
+
+    async def test_get_pending_orders(self):
+        print("Start test_get_pending_orders")
+
+        print("Create small limit orders on BTC and ETH")
+        await self.create_small_limit_orders()
+
+        print("Get pending orders")
+        responses = await asyncio.gather(*[self.exchange.fetch_open_orders(symbol=x) for x in self.SYMBOLS])
+        pending_orders = [order for orders in responses for order in orders]
+        print("Pending orders: {}".format(pending_orders))
+
+        self.assertEqual(len(pending_orders), 2)
+        self.assertTrue("BTCUSDT" in [x["info"]["symbol"] for x in pending_orders])
+        self.assertTrue("ETHUSDT" in [x["info"]["symbol"] for x in pending_orders])
+
+        print("Finished test_get_pending_orders")
+
+    async def test_cancel_all_pending_orders(self):
+        print("Start test_cancel_all_pending_orders")
+
+        print("Create small limit orders on BTC and ETH")
+        await self.create_small_limit_orders()
+
+        print("Cancel all pending orders")
+        cancel_orders_response = await asyncio.gather(*[self.exchange.cancel_all_orders(symbol=x)
+                                                        for x in self.SYMBOLS])
+        print("Cancel orders response: {}".format(cancel_orders_response))
+
+        print("Get pending orders")
+        responses = await asyncio.gather(*[self.exchange.fetch_open_orders(symbol=x) for x in self.SYMBOLS])
+        pending_orders = [order for orders in responses for order in orders]
+        print("Pending orders: {}".format(pending_orders))
+
+        self.assertEqual(len(pending_orders), 0)
+
+        print("Finished test_cancel_all_pending_orders")
+
+    async def create_small_limit_orders(self) -> list:
+        return await asyncio.gather(
+            self.exchange.create_order(symbol="BTC/USDT:USDT", type="limit", side="buy", amount=0.001, price=20000),
+            self.exchange.create_order(symbol="ETH/USDT:USDT", type="limit", side="buy", amount=0.01, price=1000))
@@ -1,9 +1,353 @@
-import yaml
+import asyncio
+import functools
+import inspect
+import os
+import unittest
 
-def load_config(config_file: str) -> dict:
-    with open(config_file, 'r') as stream:
+from exchanges.account_pool import Credentials, lease_account
+from exchanges.account_settings import get_settings_cache
+from exchanges.cassette import get_cassette, install_cassette
+from exchanges.instruments import SOURCES as INSTRUMENT_SOURCES, InstrumentRegistry, get_instrument_registry
+from exchanges.market_data import PublicClient, get_public_client
+from exchanges.market_stream import PROTOCOLS, MarketDataStream, get_market_data_stream
+from exchanges.registry import get_registry
+from exchanges.rate_limit import install_async_rate_limits, install_rate_limits
+from exchanges.settings import Settings, load_settings
+from exchanges.timing import get_call_timer, install_timing, instrument_client
+
+
+def load_config(config_file: str = None, overrides: dict = None) -> Settings:
+    """
+    Returns the validated settings of `config_file`, tests/config.yaml by default, read once per process. Every later
+    call is a dictionary lookup. See exchanges/settings.py for the environment variable overrides.
+    """
+    return load_settings(config_file, overrides)
+
+
+def simulator_enabled(config: dict) -> bool:
+    return bool((config or {}).get("simulator", {}).get("enabled"))
+
+
+def start_simulator(config: dict):
+    from exchanges.simulator import get_simulator
+
+    simulator_config = config["simulator"]
+    return get_simulator(host=simulator_config.get("host", "127.0.0.1"),
+                         port=simulator_config.get("port", 0),
+                         latency=simulator_config.get("latency", 0.0))
+
+
+def route_exchange(config: dict, exchange, venue: str) -> None:
+    """
+    Points a ccxt or pybit client at the local simulator when it is enabled in config, otherwise does nothing.
+    """
+    if not simulator_enabled(config):
+        return
+
+    from exchanges.simulator import route_ccxt, route_pybit
+
+    print("Route {} client to simulator".format(venue))
+    if venue == "bybit":
+        route_pybit(exchange, start_simulator(config))
+    else:
+        route_ccxt(exchange, venue, start_simulator(config))
+
+
+def public_url(config: dict, url: str) -> str:
+    if not simulator_enabled(config):
+        return url
+
+    from exchanges.simulator import route_url
+    return route_url(url, start_simulator(config))
+
+
+def public_client(config: dict) -> PublicClient:
+    client = get_public_client(config)
+    if ((config or {}).get("cassette") or {}).get("mode", "none") != "none":
+        client.use_http1("cassettes record and replay the requests session only")
+    if timing_path(config) is not None:
+        client.use_http1("call timing instruments the requests session only")
+    use_cassette(config, client.session)
+    if rate_limits_path(config) is not None:
+        client.use_rate_limits(rate_limits_path(config))
+    use_timing(config, None, client.session)
+    return client
+
+
+def instrument_registry(config: dict) -> InstrumentRegistry:
+    """
+    Returns the process wide instrument registry, downloading through the shared public client from the simulator
+    when it is enabled in config.
+    """
+    client = public_client(config)
+    urls = {exchange: public_url(config, source.url) for exchange, source in INSTRUMENT_SOURCES.items()}
+    return get_instrument_registry(lambda url, headers: client.request("GET", url, headers=headers), config, urls)
+
+
+def market_data_stream(config: dict) -> MarketDataStream:
+    """
+    Returns the process wide market data stream, connected to the simulator when it is enabled in config.
+    """
+    if ((config or {}).get("cassette") or {}).get("mode") == "replay":
+        raise unittest.SkipTest("WebSocket streams are not recorded in cassettes")
+    urls = None
+    if simulator_enabled(config):
+        from exchanges.simulator import route_stream_url
+        urls = {name: route_stream_url(protocol.url, start_simulator(config)) for name, protocol in PROTOCOLS.items()}
+    client = public_client(config)
+    return get_market_data_stream(urls, lambda url, params: client.get(public_url(config, url), params=params).json())
+
+
+def rate_limits_path(config: dict) -> str:
+    """
+    Returns the directory of the shared rate limits, None when they are off in config or every call is replayed.
+    """
+    rate_limit_config = (config or {}).get("rateLimit") or {}
+    if not rate_limit_config.get("enabled") or ((config or {}).get("cassette") or {}).get("mode") == "replay":
+        return None
+    return rate_limit_config.get("path", "../rate-limits")
+
+
+def use_rate_limits(config: dict, exchange, session) -> None:
+    """
+    Routes every call of a ccxt or pybit client through the shared rate limits, in place of the ccxt throttle.
+    """
+    if rate_limits_path(config) is None:
+        return
+    install_rate_limits(session, rate_limits_path(config))
+    if hasattr(exchange, "enableRateLimit"):
+        exchange.enableRateLimit = False
+
+
+def timing_path(config: dict) -> str:
+    """
+    Returns the directory of the call timing records, None when timing is off in config.
+    """
+    timing_config = (config or {}).get("timing") or {}
+    if not timing_config.get("enabled"):
+        return None
+    return timing_config.get("path", "../timings")
+
+
+def use_timing(config: dict, exchange, session, venue: str = None) -> None:
+    """
+    Records every call of a ccxt or pybit client and of its requests session when timing is on in config.
+    """
+    if timing_path(config) is None:
+        return
+    use_history(config, get_call_timer(timing_path(config)))
+    if exchange is not None:
+        instrument_client(exchange, venue)
+    if session is not None:
+        install_timing(session)
+
+
+def start_profiler(config: dict, test: str):
+    """
+    Starts profiling `test` when profiling is on in config and returns the profiler, otherwise returns None.
+    """
+    profiling_config = (config or {}).get("profiling") or {}
+    if not profiling_config.get("enabled"):
+        return None
+    from exchanges.profiling import TestProfiler
+
+    profiler = TestProfiler(profiling_config.get("path", "profiles"), profiling_config.get("mode", "sample"),
+                            profiling_config.get("interval", 0.005), profiling_config.get("memory", False))
+    profiler.start(test)
+    return profiler
+
+
+def use_history(config: dict, timer) -> None:
+    """
+    Appends the call durations of every test to the history store when history is on in config. All tests of a
+    process, or of the processes sharing $CRYPTO_TESTS_RUN_ID, are one run.
+    """
+    history_config = (config or {}).get("history") or {}
+    if timer.history is not None or not history_config.get("enabled"):
+        return
+    from exchanges.history import RUN_ENV, RunRecorder
+
+    target = "simulator" if simulator_enabled(config) else "exchange"
+    timer.history = RunRecorder(history_config.get("path", "history.sqlite"), "suite", target,
+                                os.environ.get(RUN_ENV))
+
+
+def timed_calls(cls):
+    """
+    Class decorator tagging every exchange call made by the tests of `cls` with its phase (setUp, test, tearDown)
+    and printing a summary of the calls after each test. With profiling on in config every test is profiled as well.
+    """
+    def phase_wrapper(method, phase: str):
+        if inspect.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def wrapper(self, *args, **kwargs):
+                get_call_timer().enter(self.id(), phase)
+                return await method(self, *args, **kwargs)
+        else:
+            @functools.wraps(method)
+            def wrapper(self, *args, **kwargs):
+                get_call_timer().enter(self.id(), phase)
+                return method(self, *args, **kwargs)
+        return wrapper
+
+    run = cls.run
+
+    def timed_run(self, result=None):
+        profiler = start_profiler(load_config(), self.id())
+        get_call_timer().enter(self.id(), "setUp")
         try:
-            parsed_yaml = yaml.safe_load(stream)
-            return parsed_yaml
-        except yaml.YAMLError as exc:
-            print(exc)
+            return run(self, result)
+        finally:
+            get_call_timer().finish()
+            if profiler is not None:
+                profiler.stop()
+
+    for name, method in list(vars(cls).items()):
+        if name.startswith("test") and callable(method):
+            setattr(cls, name, phase_wrapper(method, "test"))
+        elif name in ("tearDown", "asyncTearDown"):
+            setattr(cls, name, phase_wrapper(method, "tearDown"))
+    cls.run = timed_run
+    return cls
+
+
+def use_cassette(config: dict, session) -> None:
+    """
+    Records or replays every call of a requests session when `cassette.mode` is record or replay in config.
+    """
+    cassette_config = (config or {}).get("cassette") or {}
+    if cassette_config.get("mode") not in ("record", "replay"):
+        return
+    install_cassette(session, get_cassette(cassette_config.get("path", "../cassettes"), cassette_config["mode"]))
+
+
+def api_credentials(config: dict, venue: str) -> Credentials:
+    """
+    Returns the sub-account leased to this process from the pool of `venue`, or the main account without a pool.
+    """
+    leased = lease_account(config, venue)
+    if leased is not None:
+        return leased
+    api_config = config["{}Api".format(venue)]
+    return Credentials(api_config["apiKey"], api_config["secretKey"])
+
+
+def exchange_client(config: dict, venue: str):
+    """
+    Returns an isolated view of the warm client of `venue`. The client is built, routed and has its markets loaded
+    only once per process, every test reuses its connection pool.
+    """
+    return get_registry().view(venue, lambda: _build_client(config, venue))
+
+
+def async_exchange_client(config: dict, venue: str):
+    """
+    Builds a ccxt.async_support client of `venue`, its aiohttp session is opened on the event loop of its first call.
+    Markets are taken over from the warm sync client, so they are downloaded once per process for both flavours. The
+    caller must close the client.
+    """
+    if ((config or {}).get("cassette") or {}).get("mode") == "replay":
+        raise unittest.SkipTest("aiohttp calls of the async clients are not recorded in cassettes")
+    import ccxt.async_support as ccxt_async
+
+    warm = get_registry().client(venue, lambda: _build_client(config, venue))
+    credentials = api_credentials(config, venue)
+    exchange = getattr(ccxt_async, venue)({
+        "apiKey": credentials.api_key,
+        "secret": credentials.secret
+    })
+    exchange.set_sandbox_mode(True)
+    route_exchange(config, exchange, venue)
+    use_timing(config, exchange, None, venue)
+    if rate_limits_path(config) is not None:
+        install_async_rate_limits(exchange, rate_limits_path(config))
+    exchange.set_markets(warm.markets, warm.currencies)
+    return exchange
+
+
+class SharedLoopTestCase(unittest.IsolatedAsyncioTestCase):
+    """
+    IsolatedAsyncioTestCase running every test of the class on one event loop instead of a new loop per test, so a
+    client built in setUpClass keeps its aiohttp session and connections for the whole class. Subclasses build their
+    clients before calling setUpClass of this class and close them with `run_async` in tearDownClass before calling
+    tearDownClass of this class.
+    """
+    _runner = None
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls._runner = asyncio.Runner()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls._runner.close()
+        cls._runner = None
+
+    @classmethod
+    def run_async(cls, coroutine):
+        return cls._runner.run(coroutine)
+
+    # The runner hooks of IsolatedAsyncioTestCase create and close a runner, and with it a loop, for every test
+    def _setupAsyncioRunner(self) -> None:
+        self._asyncioRunner = type(self)._runner
+
+    def _tearDownAsyncioRunner(self) -> None:
+        self._asyncioRunner = None
+
+
+def _build_client(config: dict, venue: str):
+    # The client libraries are imported here, a run of one exchange loads only the library of that exchange
+    print("Build {} client".format(venue))
+    if venue == "bybit":
+        from pybit.unified_trading import HTTP
+
+        credentials = api_credentials(config, venue)
+        exchange = HTTP(
+            testnet=config["bybitApi"]["testnet"],
+            api_key=credentials.api_key,
+            api_secret=credentials.secret
+        )
+        route_exchange(config, exchange, venue)
+        use_cassette(config, exchange.client)
+        use_rate_limits(config, exchange, exchange.client)
+        use_timing(config, exchange, exchange.client, venue)
+        return exchange
+
+    import ccxt
+
+    if venue == "btcex":
+        # NotSupported: btcex does not have a sandbox URL
+        exchange = ccxt.btcex()
+        route_exchange(config, exchange, venue)
+        use_cassette(config, exchange.session)
+        use_rate_limits(config, exchange, exchange.session)
+        use_timing(config, exchange, exchange.session, venue)
+        return exchange
+
+    credentials = api_credentials(config, venue)
+    exchange = getattr(ccxt, venue)({
+        "apiKey": credentials.api_key,
+        "secret": credentials.secret
+    })
+    exchange.set_sandbox_mode(True)
+    route_exchange(config, exchange, venue)
+    use_cassette(config, exchange.session)
+    use_rate_limits(config, exchange, exchange.session)
+    use_timing(config, exchange, exchange.session, venue)
+    exchange.load_markets()
+    return exchange
+
+
+def mutates_account_settings(venue: str):
+    """
+    Marks a test which changes account settings by hand, the cached settings of `venue` are dropped after it runs.
+    """
+    def decorator(test):
+        @functools.wraps(test)
+        def wrapper(*args, **kwargs):
+            try:
+                return test(*args, **kwargs)
+            finally:
+                get_settings_cache().invalidate(venue)
+        return wrapper
+    return decorator
@@ -0,0 +1,43 @@
+import argparse
+import time
+
+from exchanges.klines import INTERVALS_MS, SOURCES, KlineStore, update_klines
+from tests.integration.utils import load_config, public_client, public_url
+
+
+def http_get(config: dict):
+    """
+    Returns a get(url, params) function over the shared public client, routed to the simulator when it is enabled.
+    """
+    http = public_client(config)
+    return lambda url, params: http.get(public_url(config, url), params=params).json()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fetch new klines of the exchanges into the local kline store")
+    parser.add_argument("-c", "--config", default=None,
+                        help="Path to config.yaml, defaults to $CRYPTO_TESTS_CONFIG or tests/config.yaml")
+    parser.add_argument("-e", "--exchanges", nargs="+", default=list(SOURCES), choices=list(SOURCES))
+    parser.add_argument("-s", "--symbols", nargs="+", default=["BTCUSDT", "ETHUSDT"])
+    parser.add_argument("-i", "--interval", default="1d", choices=list(INTERVALS_MS))
+    parser.add_argument("-d", "--days", type=int, default=30, help="History fetched for a series not stored yet")
+    parser.add_argument("--store", default="klines", help="Directory of the kline store")
+    parser.add_argument("--simulator", action="store_true", help="Run against the local simulator")
+    args = parser.parse_args()
+
+    config = load_config(args.config, {"simulator": {"enabled": True}} if args.simulator else None)
+
+    store = KlineStore(args.store)
+    get = http_get(config)
+    since_ms = int((time.time() - args.days * 24 * 60 * 60) * 1000)
+    for exchange in args.exchanges:
+        for symbol in args.symbols:
+            started = time.perf_counter()
+            bars, requests = update_klines(store, get, exchange, symbol, args.interval, since_ms)
+            print("{} {} {}: {} bars fetched with {} requests in {:.2f}s, last open time {}".format(
+                exchange, symbol, args.interval, bars, requests, time.perf_counter() - started,
+                store.last_open_time(exchange, symbol, args.interval)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from exchanges.account_pool import pool_accounts, release_accounts
+from exchanges.account_settings import get_settings_cache
+from exchanges.history import RUN_ENV, new_run_key
+from exchanges.registry import get_registry
+from exchanges.settings import CONFIG_ENV, load_settings
+
+
+def collect_groups(start_dir: str, pattern: str = "test*.py", config: dict = None) -> list:
+    """
+    Returns [(group name, [test ids])] of the tests found under `start_dir`, one group per exchange account, in
+    discovery order.
+
+    The classes of one `VENUE` (e.g. the sync and the async Binance suites) trade on the same account, their tests run
+    in order inside one worker. A venue with sub-accounts listed in config is split into one contiguous shard per
+    sub-account, every shard runs on the sub-account leased by its worker. A class without `VENUE` is a group of its
+    own.
+    """
+    groups = {}
+    venues = {}
+    for test in _flatten(unittest.defaultTestLoader.discover(start_dir, pattern=pattern)):
+        venue = getattr(type(test), "VENUE", None)
+        name = venue or "{}.{}".format(type(test).__module__, type(test).__name__)
+        groups.setdefault(name, []).append(test.id())
+        venues[name] = venue
+
+    shards = []
+    for name, test_ids in groups.items():
+        count = min(len(pool_accounts(config, venues[name])), len(test_ids)) if venues[name] else 0
+        if count < 2:
+            shards.append((name, test_ids))
+            continue
+        # Contiguous shards keep the tests of a class together, the class fixtures only run again in a shard a class
+        # is cut into
+        bounds = [len(test_ids) * x // count for x in range(count + 1)]
+        for index in range(count):
+            shards.append(("{}[{}/{}]".format(name, index + 1, count), test_ids[bounds[index]:bounds[index + 1]]))
+    return shards
+
+
+def run_group(start_dir: str, name: str, test_ids: list, verbosity: int = 1, release: bool = True) -> dict:
+    """
+    Runs the tests of one group in the current process and returns a picklable summary of the result. With `release`
+    the sub-accounts leased by the tests are given back and their clients dropped afterwards.
+    """
+    if start_dir not in sys.path:
+        sys.path.insert(0, start_dir)
+
+    stream = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(stream), contextlib.redirect_stderr(stream):
+        suite = unittest.defaultTestLoader.loadTestsFromNames(test_ids)
+        result = unittest.TextTestRunner(stream=stream, verbosity=verbosity).run(suite)
+        # The worker may run another group next, on another sub-account
+        for venue in release_accounts() if release else []:
+            get_registry().discard(venue)
+            get_settings_cache().invalidate(venue)
+
+    return {
+        "name": name,
+        "output": stream.getvalue(),
+        "duration": time.perf_counter() - started,
+        "tests_run": result.testsRun,
+        "failures": [(test.id(), trace) for test, trace in result.failures],
+        "errors": [(test.id(), trace) for test, trace in result.errors],
+        "skipped": len(result.skipped),
+        "expected_failures": len(result.expectedFailures),
+        "unexpected_successes": len(result.unexpectedSuccesses),
+    }
+
+
+def run_parallel(start_dir: str, pattern: str = "test*.py", workers: int = None, verbosity: int = 1,
+                 config_file: str = None) -> bool:
+    """
+    Shards the tests under `start_dir` across a process pool and prints one merged report.
+
+    By default there is one worker per shard, i.e. per exchange account or sub-account, so the wall clock of a full
+    run is the one of the slowest shard.
+    """
+    start_dir = os.path.abspath(start_dir)
+    if start_dir not in sys.path:
+        sys.path.insert(0, start_dir)
+
+    config = load_settings(config_file)
+    # The workers append to one run of the history store
+    os.environ.setdefault(RUN_ENV, new_run_key())
+    if config_file is not None:
+        # The workers read the same config
+        os.environ[CONFIG_ENV] = os.path.abspath(config_file)
+    groups = collect_groups(start_dir, pattern, config)
+    if not groups:
+        print("No tests found in {}".format(start_dir))
+        return True
+
+    workers = workers or len(groups)
+    print("Run {} test groups in {} workers".format(len(groups), workers))
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_group, start_dir, name, test_ids, verbosity) for name, test_ids in groups]
+        results = [future.result() for future in futures]
+    duration = time.perf_counter() - started
+
+    for result in results:
+        print("=" * 70)
+        print("{} ({:.3f}s)".format(result["name"], result["duration"]))
+        print("=" * 70)
+        print(result["output"])
+
+    return print_summary(results, duration)
+
+
+def print_summary(results: list, duration: float) -> bool:
+    tests_run = sum(x["tests_run"] for x in results)
+    failures = [failure for x in results for failure in x["failures"]]
+    errors = [error for x in results for error in x["errors"]]
+    counts = (("failures", len(failures)),
+              ("errors", len(errors)),
+              ("skipped", sum(x["skipped"] for x in results)),
+              ("expected failures", sum(x["expected_failures"] for x in results)),
+              ("unexpected successes", sum(x["unexpected_successes"] for x in results)))
+
+    for test_id, _ in failures:
+        print("FAIL: {}".format(test_id))
+    for test_id, _ in errors:
+        print("ERROR: {}".format(test_id))
+    print("-" * 70)
+    print("Ran {} tests in {:.3f}s".format(tests_run, duration))
+    print()
+
+    details = ", ".join("{}={}".format(name, count) for name, count in counts if count)
+    successful = not failures and not errors and not sum(x["unexpected_successes"] for x in results)
+    status = "OK" if successful else "FAILED"
+    print("{} ({})".format(status, details) if details else status)
+    return successful
+
+
+def _flatten(suite) -> list:
+    tests = []
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            tests.extend(_flatten(test))
+        else:
+            tests.append(test)
+    return tests
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the exchange test suites in parallel worker processes")
+    parser.add_argument("-s", "--start-directory", default="tests/integration", help="Directory to start discovery")
+    parser.add_argument("-p", "--pattern", default="test*.py", help="Pattern to match tests")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="Number of worker processes, defaults to one per exchange account")
+    parser.add_argument("-c", "--config", default=None,
+                        help="Config with the sub-account pools, defaults to $CRYPTO_TESTS_CONFIG or tests/config.yaml")
+    parser.add_argument("-v", "--verbose", action="store_const", const=2, default=1, help="Verbose output")
+    args = parser.parse_args()
+
+    successful = run_parallel(args.start_directory, args.pattern, args.workers, args.verbose, args.config)
+    sys.exit(0 if successful else 1)
+
+
+if __name__ == "__main__":
+    main()
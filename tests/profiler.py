@@ -0,0 +1,47 @@
+import argparse
+import os
+import sys
+import unittest
+
+from exchanges.settings import CONFIG_ENV, ENV_PREFIX
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TESTS = os.path.join(ROOT, "tests", "integration")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run tests with every test profiled, see the profiling section of "
+                                                 "the config for the same switch without this command")
+    parser.add_argument("tests", nargs="+",
+                        help="Test modules, classes or methods, e.g. test_bybit_futures.BybitFuturesTest")
+    parser.add_argument("-c", "--config", default=None,
+                        help="Config of the tests, defaults to $CRYPTO_TESTS_CONFIG or tests/config.yaml")
+    parser.add_argument("-m", "--mode", default="sample", choices=("sample", "cprofile"),
+                        help="Sample the stacks (collapsed stacks for flamegraphs) or run under cProfile")
+    parser.add_argument("-i", "--interval", type=float, default=0.005, help="Seconds between two stack samples")
+    parser.add_argument("--memory", action="store_true", help="Trace the allocations with tracemalloc")
+    parser.add_argument("-o", "--output", default=None, help="Directory of the profile files")
+    parser.add_argument("--simulator", action="store_true", help="Run against the local simulator")
+    parser.add_argument("-v", "--verbose", action="store_const", const=2, default=1, help="Verbose output")
+    args = parser.parse_args()
+
+    # The tests read their settings on their own, the switches reach them as environment overrides
+    overrides = {"profiling_enabled": "True", "profiling_mode": args.mode, "profiling_interval": str(args.interval),
+                 "profiling_memory": str(args.memory)}
+    if args.output:
+        overrides["profiling_path"] = os.path.abspath(args.output)
+    if args.simulator:
+        overrides["simulator_enabled"] = "True"
+    for name, value in overrides.items():
+        os.environ[(ENV_PREFIX + name).upper()] = value
+    if args.config:
+        os.environ[CONFIG_ENV] = os.path.abspath(args.config)
+
+    sys.path.insert(0, TESTS)
+    suite = unittest.defaultTestLoader.loadTestsFromNames(args.tests)
+    result = unittest.TextTestRunner(verbosity=args.verbose).run(suite)
+    sys.exit(0 if result.wasSuccessful() else 1)
+
+
+if __name__ == "__main__":
+    main()
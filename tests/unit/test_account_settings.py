@@ -0,0 +1,23 @@
+import unittest
+
+from exchanges.account_settings import AccountSettings, ISOLATED, SymbolSettings
+
+
+class AccountSettingsTest(unittest.TestCase):
+
+    def test_symbol(self):
+        settings = AccountSettings(hedged=False, symbols={
+            "BTCUSDT": SymbolSettings(margin_mode=ISOLATED, buy_leverage=20, sell_leverage=20)})
+
+        self.assertEqual(SymbolSettings(margin_mode=ISOLATED, buy_leverage=20, sell_leverage=20),
+                         settings.symbol("BTCUSDT"))
+
+    def test_symbol_not_read_is_an_error(self):
+        settings = AccountSettings(hedged=False)
+
+        with self.assertRaises(KeyError):
+            settings.symbol("BTCUSDT")
+
+
+if __name__ == "__main__":
+    unittest.main()
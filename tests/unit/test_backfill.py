@@ -0,0 +1,87 @@
+import os
+import tempfile
+import time
+import unittest
+
+from exchanges.backfill import CHECKPOINTS, Backfill, plan_chunks
+from exchanges.klines import INTERVALS_MS, KlineSeries, KlineStore
+
+MINUTE = INTERVALS_MS["1m"]
+# Binance pages hold 1000 bars
+PAGE = 1000 * MINUTE
+
+
+class BackfillTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = KlineStore(self.directory.name)
+        self.requests = []
+        self.failing = set()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def get(self, url: str, params: dict) -> list:
+        self.requests.append(params["startTime"])
+        if params["startTime"] in self.failing:
+            raise ConnectionError("chunk at {} failed".format(params["startTime"]))
+        return [[x, "1", "2", "0.5", "1", "10"] for x in range(params["startTime"], params["endTime"] + 1, MINUTE)]
+
+    def test_chunks_are_aligned_to_pages(self):
+        chunks = plan_chunks(self.store, "binance", "BTCUSDT", "1m", PAGE - 5 * MINUTE, 3 * PAGE + 10 * MINUTE)
+
+        self.assertEqual([(PAGE - 5 * MINUTE, PAGE - MINUTE), (PAGE, 2 * PAGE - MINUTE), (2 * PAGE, 3 * PAGE - MINUTE),
+                          (3 * PAGE, 3 * PAGE + 10 * MINUTE)], chunks)
+
+    def test_stored_chunks_are_left_out(self):
+        self.store.write("binance", "BTCUSDT", "1m", KlineSeries.from_rows(
+            (x, 1, 1, 1, 1, 1) for x in range(PAGE, 2 * PAGE + 10 * MINUTE, MINUTE)))
+
+        chunks = plan_chunks(self.store, "binance", "BTCUSDT", "1m", 0, 2 * PAGE + 10 * MINUTE)
+
+        # The chunk of the last stored bar is fetched again, the bar may have been open
+        self.assertEqual([(0, PAGE - MINUTE), (2 * PAGE, 2 * PAGE + 10 * MINUTE)], chunks)
+
+    def test_rerun_with_a_later_end_resumes(self):
+        self.failing.add(PAGE)
+        first = Backfill(self.store, self.get, workers=2, retries=0).run(
+            [("binance", "BTCUSDT", "1m", 0)], 2 * PAGE + 10 * MINUTE)[0]
+        self.assertEqual([(PAGE, 2 * PAGE - MINUTE)], first.failed)
+        self.assertIsNone(self.store.last_open_time("binance", "BTCUSDT", "1m"))
+
+        self.failing.clear()
+        self.requests.clear()
+        second = Backfill(self.store, self.get, workers=2, retries=0).run(
+            [("binance", "BTCUSDT", "1m", 0)], 2 * PAGE + 20 * MINUTE)[0]
+
+        # The first chunk is taken from its checkpoint, the grown last one is fetched again
+        self.assertEqual((3, 1, 2), (second.chunks, second.resumed, second.fetched))
+        self.assertEqual([PAGE, 2 * PAGE], sorted(self.requests))
+        self.assertEqual(2021, second.bars)
+        self.assertEqual(list(range(0, 2 * PAGE + 21 * MINUTE, MINUTE)),
+                         list(self.store.load("binance", "BTCUSDT", "1m").open_time))
+
+
+    def test_chunk_with_an_open_bar_is_not_checkpointed(self):
+        now = int(time.time() * 1000)
+        now -= now % MINUTE
+        start = now - now % PAGE - PAGE
+        self.failing.add(start)
+
+        result = Backfill(self.store, self.get, workers=2, retries=0).run([("binance", "BTCUSDT", "1m", start)],
+                                                                          now)[0]
+
+        self.assertEqual([(start, start + PAGE - MINUTE)], result.failed)
+        self.assertFalse(os.path.exists(os.path.join(self.store.path("binance", "BTCUSDT", "1m"), CHECKPOINTS)))
+
+        self.failing.clear()
+        result = Backfill(self.store, self.get, workers=2, retries=0).run([("binance", "BTCUSDT", "1m", start)],
+                                                                          now)[0]
+
+        self.assertEqual((2, 0, 2), (result.chunks, result.resumed, result.fetched))
+        self.assertEqual(now, self.store.last_open_time("binance", "BTCUSDT", "1m"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+import unittest
+
+from exchanges.instruments import SOURCES, InstrumentRegistry
+
+LIVE = SOURCES["binance"].url
+SIMULATOR = "http://127.0.0.1:{}/binance/fapi/v1/exchangeInfo"
+
+
+class Response:
+
+    def __init__(self, status_code: int, body: dict = None, etag: str = None) -> None:
+        self.status_code = status_code
+        self.content = json.dumps(body or {}).encode("utf-8")
+        self.headers = {"ETag": etag} if etag else {}
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise IOError("HTTP {}".format(self.status_code))
+
+
+def exchange_info(tick_size: str) -> dict:
+    return {"symbols": [{"symbol": "BTCUSDT", "contractType": "PERPETUAL", "marginAsset": "USDT",
+                         "filters": [{"filterType": "PRICE_FILTER", "tickSize": tick_size},
+                                     {"filterType": "LOT_SIZE", "stepSize": "0.001", "minQty": "0.001",
+                                      "maxQty": "1000"}]}]}
+
+
+class InstrumentRegistryTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.requests = []
+        # Every base url serves its own list and ETag, a matching If-None-Match is answered with 304
+        self.served = {LIVE: ("0.10", "live"), SIMULATOR.format(1): ("0.50", "simulator"),
+                       SIMULATOR.format(2): ("0.50", "simulator")}
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def request(self, url: str, headers: dict) -> Response:
+        self.requests.append((url, headers))
+        tick_size, etag = self.served[url]
+        if headers.get("If-None-Match") == etag:
+            return Response(304)
+        return Response(200, exchange_info(tick_size), etag)
+
+    def registry(self, url: str, ttl: float = 3600) -> InstrumentRegistry:
+        return InstrumentRegistry(self.request, self.directory.name, ttl, {"binance": url})
+
+    def test_one_directory_with_two_base_urls(self):
+        self.assertEqual(0.5, self.registry(SIMULATOR.format(1)).instrument("binance", "BTCUSDT").tick_size)
+        self.assertEqual(0.1, self.registry(LIVE).instrument("binance", "BTCUSDT").tick_size)
+
+        self.assertEqual([SIMULATOR.format(1), LIVE], [x for x, _ in self.requests])
+        self.assertEqual(["binance.127.0.0.1.body.json", "binance.127.0.0.1.instruments.json",
+                          "binance.fapi.binance.com.body.json", "binance.fapi.binance.com.instruments.json"],
+                         sorted(os.listdir(self.directory.name)))
+
+    def test_cached_list_of_the_same_host(self):
+        self.registry(LIVE).instruments("binance")
+        self.registry(SIMULATOR.format(1)).instruments("binance")
+
+        # Another simulator port, the list of the simulator host is still the cached one
+        self.assertEqual(0.5, self.registry(SIMULATOR.format(2)).instrument("binance", "BTCUSDT").tick_size)
+        self.assertEqual(0.1, self.registry(LIVE).instrument("binance", "BTCUSDT").tick_size)
+        self.assertEqual(2, len(self.requests))
+
+    def test_etag_is_sent_to_its_own_host(self):
+        self.registry(LIVE, ttl=0).instruments("binance")
+        self.registry(SIMULATOR.format(1), ttl=0).instruments("binance")
+
+        self.registry(LIVE, ttl=0).instruments("binance")
+        self.registry(SIMULATOR.format(1), ttl=0).instruments("binance")
+
+        self.assertEqual([{}, {}, {"If-None-Match": "live"}, {"If-None-Match": "simulator"}],
+                         [x for _, x in self.requests])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import tempfile
+import unittest
+
+from exchanges.klines import INTERVALS_MS, KlineSeries, KlineStore, fetch_klines, update_klines
+
+MINUTE = INTERVALS_MS["1m"]
+
+
+def bars(*open_times, close: float = 1.0) -> KlineSeries:
+    return KlineSeries.from_rows((x, 1, 2, 0.5, close, 10) for x in open_times)
+
+
+class KlineSeriesTest(unittest.TestCase):
+
+    def test_from_rows_sorts_and_drops_duplicates(self):
+        series = KlineSeries.from_rows([(3, 1, 1, 1, 1, 1), (1, 1, 1, 1, 1, 1), (3, 2, 2, 2, 2, 2)])
+
+        self.assertEqual([1, 3], list(series.open_time))
+        self.assertEqual([1, 2], list(series.open))
+
+    def test_between(self):
+        series = bars(0, MINUTE, 2 * MINUTE, 3 * MINUTE)
+
+        self.assertEqual([MINUTE, 2 * MINUTE], list(series.between(MINUTE, 2 * MINUTE).open_time))
+        self.assertEqual([MINUTE, 2 * MINUTE, 3 * MINUTE], list(series.between(MINUTE - 1).open_time))
+        self.assertEqual([0], list(series.between(end_ms=MINUTE - 1).open_time))
+        self.assertEqual(0, len(series.between(4 * MINUTE)))
+
+    def test_merge_appends_newer_bars(self):
+        merged = bars(0, MINUTE).merge(bars(2 * MINUTE))
+
+        self.assertEqual([0, MINUTE, 2 * MINUTE], list(merged.open_time))
+
+    def test_merge_replaces_overlapping_bars(self):
+        merged = bars(0, MINUTE, close=1.0).merge(bars(MINUTE, 2 * MINUTE, close=5.0))
+
+        self.assertEqual([0, MINUTE, 2 * MINUTE], list(merged.open_time))
+        self.assertEqual([1.0, 5.0, 5.0], list(merged.close))
+
+
+class KlineStoreTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = KlineStore(self.directory.name)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_empty_store(self):
+        self.assertIsNone(self.store.last_open_time("binance", "BTCUSDT", "1m"))
+        self.assertEqual(0, len(self.store.load("binance", "BTCUSDT", "1m")))
+
+    def test_append_and_range_load(self):
+        self.store.write("binance", "BTCUSDT", "1m", bars(0, MINUTE))
+        self.store.write("binance", "BTCUSDT", "1m", bars(2 * MINUTE, 3 * MINUTE))
+
+        self.assertEqual(3 * MINUTE, self.store.last_open_time("binance", "BTCUSDT", "1m"))
+        self.assertEqual(4, len(self.store.load("binance", "BTCUSDT", "1m")))
+        self.assertEqual([MINUTE, 2 * MINUTE],
+                         list(self.store.load("binance", "BTCUSDT", "1m", MINUTE, 2 * MINUTE).open_time))
+
+    def test_last_bar_is_replaced(self):
+        self.store.write("binance", "BTCUSDT", "1m", bars(0, MINUTE, close=1.0))
+        self.store.write("binance", "BTCUSDT", "1m", bars(MINUTE, 2 * MINUTE, close=5.0))
+
+        series = self.store.load("binance", "BTCUSDT", "1m")
+        self.assertEqual([0, MINUTE, 2 * MINUTE], list(series.open_time))
+        self.assertEqual([1.0, 5.0, 5.0], list(series.close))
+
+    def test_out_of_order_write_rewrites(self):
+        self.store.write("binance", "BTCUSDT", "1m", bars(2 * MINUTE, 3 * MINUTE))
+        self.store.write("binance", "BTCUSDT", "1m", bars(0, 2 * MINUTE, close=5.0))
+
+        series = self.store.load("binance", "BTCUSDT", "1m")
+        self.assertEqual([0, 2 * MINUTE, 3 * MINUTE], list(series.open_time))
+        self.assertEqual([5.0, 5.0, 1.0], list(series.close))
+
+    def test_torn_append_is_ignored(self):
+        self.store.write("binance", "BTCUSDT", "1m", bars(0, MINUTE))
+        with open(os.path.join(self.store.path("binance", "BTCUSDT", "1m"), "open_time"), "ab") as stream:
+            stream.write(b"\0" * 8)
+
+        self.assertEqual(MINUTE, self.store.last_open_time("binance", "BTCUSDT", "1m"))
+        self.store.write("binance", "BTCUSDT", "1m", bars(2 * MINUTE))
+        self.assertEqual([0, MINUTE, 2 * MINUTE], list(self.store.load("binance", "BTCUSDT", "1m").open_time))
+
+
+class FetchKlinesTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.requests = []
+
+    def get(self, url: str, params: dict) -> list:
+        # Binance style pages of every bar in the window
+        self.requests.append((params["startTime"], params["endTime"]))
+        return [[x, "1", "2", "0.5", "1", "10"] for x in range(params["startTime"], params["endTime"] + 1, MINUTE)]
+
+    def test_windows_of_one_page(self):
+        series, requests = fetch_klines(self.get, "binance", "BTCUSDT", "1m", 30, 2499 * MINUTE)
+
+        self.assertEqual(3, requests)
+        self.assertEqual([(0, 999 * MINUTE), (1000 * MINUTE, 1999 * MINUTE), (2000 * MINUTE, 2499 * MINUTE)],
+                         self.requests)
+        self.assertEqual(2500, len(series))
+        self.assertEqual(2499 * MINUTE, series.last_open_time)
+
+    def test_update_fetches_from_the_last_stored_bar(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = KlineStore(directory)
+            self.assertEqual((10, 1), update_klines(store, self.get, "binance", "BTCUSDT", "1m", 0, 9 * MINUTE))
+            self.assertEqual((6, 1), update_klines(store, self.get, "binance", "BTCUSDT", "1m", 0, 14 * MINUTE))
+
+            self.assertEqual((9 * MINUTE, 14 * MINUTE), self.requests[-1])
+            self.assertEqual(list(range(0, 15 * MINUTE, MINUTE)),
+                             list(store.load("binance", "BTCUSDT", "1m").open_time))
+
+
+if __name__ == "__main__":
+    unittest.main()
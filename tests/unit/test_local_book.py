@@ -0,0 +1,89 @@
+import unittest
+
+from exchanges.local_book import LocalOrderBook, SequenceGap
+
+
+class LocalOrderBookTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.book = LocalOrderBook("BTCUSDT")
+        self.book.reset([(99, 2), (100, 1), (98, 0)], [(102, 2), (101, 1)], sequence=10)
+
+    def levels(self, side: str) -> list:
+        side = self.book.bids if side == "bids" else self.book.asks
+        return list(zip(side.prices, side.sizes))
+
+    def test_snapshot_is_sorted_best_first(self):
+        self.assertEqual([(100, 1), (99, 2)], self.levels("bids"))
+        self.assertEqual([(101, 1), (102, 2)], self.levels("asks"))
+
+    def test_levels_are_inserted_changed_and_removed(self):
+        self.assertTrue(self.book.update([(99.5, 3), (100, 0), (97, 1)], [(101, 4), (103, 1), (100.5, 1)], 11))
+
+        self.assertEqual([(99.5, 3), (99, 2), (97, 1)], self.levels("bids"))
+        self.assertEqual([(100.5, 1), (101, 4), (102, 2), (103, 1)], self.levels("asks"))
+        self.assertEqual(11, self.book.sequence)
+
+    def test_removing_a_missing_level_changes_nothing(self):
+        self.book.update([(95, 0)], [(110, 0)], 11)
+
+        self.assertEqual([(100, 1), (99, 2)], self.levels("bids"))
+        self.assertEqual([(101, 1), (102, 2)], self.levels("asks"))
+
+    def test_diff_without_snapshot(self):
+        with self.assertRaises(SequenceGap):
+            LocalOrderBook("BTCUSDT").update([], [], 1)
+
+    def test_old_diff_is_skipped(self):
+        self.assertFalse(self.book.update([(100, 5)], [], 10))
+        self.assertEqual([(100, 1), (99, 2)], self.levels("bids"))
+
+    def test_growing_sequence(self):
+        self.assertTrue(self.book.update([], [], 15))
+        self.assertTrue(self.book.update([], [], 20))
+
+    def test_previous_sequence_gap(self):
+        self.assertTrue(self.book.update([], [], 12, previous=10))
+        with self.assertRaises(SequenceGap):
+            self.book.update([(100, 5)], [], 14, previous=13)
+        self.assertEqual(12, self.book.sequence)
+        self.assertEqual([(100, 1), (99, 2)], self.levels("bids"))
+
+    def test_first_update_gap(self):
+        self.assertTrue(self.book.update([], [], 13, first=11))
+        with self.assertRaises(SequenceGap):
+            self.book.update([], [], 20, first=15)
+
+    def test_overlapping_snapshot(self):
+        # The first diff after a REST snapshot covers the snapshot sequence, its previous sequence is older
+        self.book.reset([(100, 1)], [(101, 1)], sequence=10, overlapping=True)
+
+        self.assertTrue(self.book.update([(100, 2)], [], 12, first=9, previous=8))
+        with self.assertRaises(SequenceGap):
+            self.book.update([], [], 14, first=13, previous=13)
+
+    def test_resync_after_gap(self):
+        with self.assertRaises(SequenceGap):
+            self.book.update([], [], 14, first=12)
+
+        self.book.reset([(100, 7)], [(101, 7)], sequence=14)
+
+        self.assertTrue(self.book.update([(100, 8)], [], 15, first=15, previous=14))
+        self.assertEqual([(100, 8)], self.levels("bids"))
+
+    def test_snapshot_is_not_changed_by_later_diffs(self):
+        snapshot = self.book.snapshot()
+        self.book.update([(100, 0)], [(101, 9)], 11)
+
+        self.assertEqual([100, 99], list(snapshot.bid_prices))
+        self.assertEqual([1, 2], list(snapshot.ask_sizes))
+        self.assertEqual(99, self.book.snapshot().best_bid)
+
+    def test_snapshot_depth(self):
+        snapshot = self.book.snapshot(depth=1)
+
+        self.assertEqual(([100], [101]), (list(snapshot.bid_prices), list(snapshot.ask_prices)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import unittest
+
+from exchanges.simulator.account import Order
+from exchanges.simulator.matching import BUY, SELL, MatchingEngine
+
+
+def limit(order_id: str, side: str, qty: float, price: float, **kwargs) -> Order:
+    return Order(id=order_id, symbol="BTCUSDT", side=side, type="limit", qty=qty, price=price, **kwargs)
+
+
+def market(order_id: str, side: str, qty: float) -> Order:
+    return Order(id=order_id, symbol="BTCUSDT", side=side, type="market", qty=qty)
+
+
+class MatchingEngineTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.engine = MatchingEngine()
+
+    def test_best_price_trades_first(self):
+        self.engine.submit(limit("a1", SELL, 1, 101))
+        self.engine.submit(limit("a2", SELL, 1, 100))
+        self.engine.submit(limit("a3", SELL, 1, 102))
+
+        fills = self.engine.submit(market("t", BUY, 2))
+
+        self.assertEqual([("a2", 100), ("a1", 101)], [(x.maker.id, x.price) for x in fills])
+        self.assertEqual(102, self.engine.book("BTCUSDT").best_ask())
+
+    def test_earlier_order_trades_first_at_one_price(self):
+        self.engine.submit(limit("b1", BUY, 1, 100))
+        self.engine.submit(limit("b2", BUY, 1, 100))
+
+        fills = self.engine.submit(market("t", SELL, 1.5))
+
+        self.assertEqual([("b1", 1), ("b2", 0.5)], [(x.maker.id, x.qty) for x in fills])
+        self.assertEqual("filled", self.engine.orders["b1"].status)
+        self.assertEqual("partially_filled", self.engine.orders["b2"].status)
+        self.assertEqual([(100, 0.5)], self.engine.book("BTCUSDT").depth(BUY))
+
+    def test_partially_filled_limit_order_rests(self):
+        self.engine.submit(limit("a1", SELL, 1, 100))
+        self.engine.submit(limit("a2", SELL, 1, 105))
+
+        taker = limit("t", BUY, 3, 101)
+        fills = self.engine.submit(taker)
+
+        self.assertEqual([("a1", 100, 1)], [(x.maker.id, x.price, x.qty) for x in fills])
+        self.assertEqual("partially_filled", taker.status)
+        self.assertEqual(1, taker.filled)
+        self.assertEqual(100, taker.avg_price)
+        self.assertEqual([(101, 2)], self.engine.book("BTCUSDT").depth(BUY))
+        self.assertEqual(100, self.engine.last_prices["BTCUSDT"])
+
+    def test_average_price_over_levels(self):
+        self.engine.submit(limit("a1", SELL, 1, 100))
+        self.engine.submit(limit("a2", SELL, 3, 104))
+
+        taker = market("t", BUY, 2)
+        self.engine.submit(taker)
+
+        self.assertEqual("filled", taker.status)
+        self.assertAlmostEqual(102, taker.avg_price)
+        self.assertEqual([(104, 2)], self.engine.book("BTCUSDT").depth(SELL))
+
+    def test_cancelled_order_is_skipped(self):
+        self.engine.submit(limit("a1", SELL, 1, 100))
+        self.engine.submit(limit("a2", SELL, 1, 100))
+        self.assertTrue(self.engine.cancel(self.engine.orders["a1"]))
+        self.assertFalse(self.engine.cancel(self.engine.orders["a1"]))
+
+        fills = self.engine.submit(market("t", BUY, 1))
+
+        self.assertEqual(["a2"], [x.maker.id for x in fills])
+        self.assertIsNone(self.engine.book("BTCUSDT").best_ask())
+
+    def test_immediate_or_cancel_remainder_is_cancelled(self):
+        self.engine.submit(limit("a1", SELL, 1, 100))
+
+        taker = limit("t", BUY, 2, 100, time_in_force="IOC")
+        self.engine.submit(taker)
+
+        self.assertEqual(1, taker.filled)
+        self.assertEqual("canceled", taker.status)
+        self.assertIsNone(self.engine.book("BTCUSDT").best_bid())
+
+    def test_market_order_remainder_is_cancelled(self):
+        self.engine.submit(limit("a1", SELL, 0.5, 100))
+
+        taker = market("t", BUY, 2)
+        self.engine.submit(taker)
+
+        self.assertEqual((0.5, "canceled"), (taker.filled, taker.status))
+        self.assertIsNone(self.engine.book("BTCUSDT").best_bid())
+
+    def test_fill_within_float_tolerance(self):
+        for i in range(8):
+            self.engine.submit(limit("a{}".format(i), SELL, 0.1, 100))
+
+        # Eight fills of 0.1 add up to 0.7999999999999999
+        taker = market("t", BUY, 0.8)
+        self.engine.submit(taker)
+
+        self.assertEqual("filled", taker.status)
+
+    def test_fill_or_kill_without_enough_quantity(self):
+        self.engine.submit(limit("a1", SELL, 1, 100))
+
+        taker = limit("t", BUY, 2, 100, time_in_force="FOK")
+
+        self.assertEqual([], self.engine.submit(taker))
+        self.assertEqual("canceled", taker.status)
+        self.assertEqual([(100, 1)], self.engine.book("BTCUSDT").depth(SELL))
+
+    def test_post_only_crossing_the_book_is_rejected(self):
+        self.engine.submit(limit("a1", SELL, 1, 100))
+
+        crossing = limit("p1", BUY, 1, 100, time_in_force="PostOnly")
+        passive = limit("p2", BUY, 1, 99, time_in_force="PostOnly")
+
+        self.assertEqual([], self.engine.submit(crossing))
+        self.assertEqual("rejected", crossing.status)
+        self.assertEqual([], self.engine.submit(passive))
+        self.assertEqual("new", passive.status)
+        self.assertEqual(99, self.engine.book("BTCUSDT").best_bid())
+
+    def test_house_liquidity_is_restored(self):
+        self.engine.submit(limit("h1", SELL, 1, 100, owner="house"))
+
+        self.engine.submit(market("t1", BUY, 1))
+        fills = self.engine.submit(market("t2", BUY, 1))
+
+        self.assertEqual(["h1"], [x.maker.id for x in fills])
+        self.assertEqual([(100, 1)], self.engine.book("BTCUSDT").depth(SELL))
+
+    def test_stop_order_is_released_by_a_trade(self):
+        self.engine.last_prices["BTCUSDT"] = 100
+        stop = Order(id="s", symbol="BTCUSDT", side=SELL, type="stop_market", qty=1, stop_price=95)
+        self.assertEqual([], self.engine.submit(stop))
+        self.assertEqual("untriggered", stop.status)
+        self.engine.submit(limit("b1", BUY, 1, 94))
+        self.engine.submit(limit("b2", BUY, 1, 90))
+
+        fills = self.engine.submit(limit("a1", SELL, 1, 94))
+
+        self.assertEqual([("b1", "a1"), ("b2", "s")], [(x.maker.id, x.taker.id) for x in fills])
+        self.assertEqual("filled", stop.status)
+        self.assertEqual(90, self.engine.last_prices["BTCUSDT"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+
+from exchanges.order_book import ASK, BID, OrderBook, from_binance, from_btcex, from_bybit, from_phemex
+
+
+class OrderBookTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.book = OrderBook.from_levels("BTCUSDT", [["100", "1"], ["99", "2"], ["97", "3"]],
+                                          [["101", "0.5"], ["102", "1.5"], ["105", "4"]], timestamp=1)
+
+    def test_best_levels(self):
+        self.assertEqual(100, self.book.best_bid)
+        self.assertEqual(101, self.book.best_ask)
+        self.assertEqual(1, self.book.spread)
+        self.assertEqual(100.5, self.book.mid)
+
+    def test_empty_side(self):
+        book = OrderBook.from_levels("BTCUSDT", [], [[101, 1]])
+
+        self.assertIsNone(book.best_bid)
+        self.assertIsNone(book.spread)
+        self.assertIsNone(book.mid)
+        self.assertEqual(0.0, book.depth_at_price(BID, 100))
+        self.assertEqual(0, book.cumulative_size(BID))
+
+    def test_depth_at_price(self):
+        self.assertEqual(2, self.book.depth_at_price(BID, 99))
+        self.assertEqual(0.0, self.book.depth_at_price(BID, 98))
+        self.assertEqual(0.0, self.book.depth_at_price(BID, 101))
+        self.assertEqual(1.5, self.book.depth_at_price(ASK, 102))
+        self.assertEqual(0.0, self.book.depth_at_price(ASK, 106))
+
+    def test_cumulative_size(self):
+        self.assertEqual(3, self.book.cumulative_size(BID, 99))
+        self.assertEqual(3, self.book.cumulative_size(BID, 98))
+        self.assertEqual(6, self.book.cumulative_size(BID))
+        self.assertEqual(0, self.book.cumulative_size(BID, 100.5))
+        self.assertEqual(2, self.book.cumulative_size(ASK, 102))
+        self.assertEqual(6, self.book.cumulative_size(ASK))
+        self.assertEqual([0.5, 2, 6], list(self.book.cumulative_sizes(ASK)))
+
+    def test_price_for_size(self):
+        self.assertEqual(101, self.book.price_for_size(ASK, 0.5))
+        self.assertEqual(102, self.book.price_for_size(ASK, 1))
+        self.assertEqual(97, self.book.price_for_size(BID, 6))
+        self.assertIsNone(self.book.price_for_size(BID, 6.5))
+
+    def test_from_binance(self):
+        book = from_binance({"E": 5, "bids": [["100.5", "1"]], "asks": [["101", "2"]]}, "BTCUSDT")
+
+        self.assertEqual((100.5, 101, 5), (book.best_bid, book.best_ask, book.timestamp))
+
+    def test_from_bybit(self):
+        book = from_bybit({"result": {"s": "BTCUSDT", "b": [["100", "1"]], "a": [["101", "2"]], "ts": 7}})
+
+        self.assertEqual(("BTCUSDT", 100, 101, 7), (book.symbol, book.best_bid, book.best_ask, book.timestamp))
+
+    def test_from_phemex_unscales_prices(self):
+        book = from_phemex({"result": {"symbol": "BTCUSD", "timestamp": 9,
+                                       "book": {"bids": [[1000000, 10]], "asks": [[1000500, 20]]}}})
+
+        self.assertEqual((100, 100.05), (book.best_bid, book.best_ask))
+        self.assertEqual(20, book.depth_at_price(ASK, 100.05))
+
+    def test_from_btcex(self):
+        book = from_btcex({"result": {"instrument_name": "BTC-USDT-PERPETUAL", "timestamp": "11",
+                                      "bids": [["100", "1"]], "asks": [["101", "2"]]}})
+
+        self.assertEqual(("BTC-USDT-PERPETUAL", 11), (book.symbol, book.timestamp))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from exchanges.rate_limit import install_async_rate_limits
+
+
+class Limits:
+
+    def __init__(self) -> None:
+        self.updates = []
+
+    def acquire(self, method: str, url: str) -> float:
+        return 0.0
+
+    def update(self, method: str, url: str, status: int, headers) -> None:
+        self.updates.append((url, status, dict(headers)))
+
+
+class Exchange:
+    """
+    Stands in for a ccxt.async_support client: the response is handed to on_rest_response, last_response_headers is
+    set a little later and a 429 raises after that, as ccxt does.
+    """
+
+    # url: (status, headers, seconds until the response is done)
+    served = {
+        "https://fapi.binance.com/limited": (429, {"Retry-After": "3"}, 0.03),
+        "https://fapi.binance.com/ok": (200, {"X-MBX-USED-WEIGHT-1M": "7"}, 0.0),
+    }
+
+    def __init__(self) -> None:
+        self.last_response_headers = None
+        self.enableRateLimit = True
+
+    def on_rest_response(self, code, reason, url, method, response_headers, response_body, request_headers,
+                         request_body):
+        return response_body
+
+    async def fetch(self, url, method="GET", headers=None, body=None):
+        status, response_headers, delay = self.served[url]
+        self.on_rest_response(status, "", url, method, response_headers, "{}", headers, body)
+        await asyncio.sleep(0.01)
+        self.last_response_headers = response_headers
+        await asyncio.sleep(delay)
+        if status == 429:
+            raise IOError("429 Too Many Requests")
+        return {}
+
+
+class AsyncRateLimitsTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrent_calls_update_with_their_own_response(self):
+        limits = Limits()
+        exchange = Exchange()
+        with mock.patch("exchanges.rate_limit.rate_limits_for_url", return_value=limits):
+            install_async_rate_limits(exchange)
+            results = await asyncio.gather(exchange.fetch("https://fapi.binance.com/limited"),
+                                           exchange.fetch("https://fapi.binance.com/ok"), return_exceptions=True)
+
+        self.assertIsInstance(results[0], IOError)
+        self.assertFalse(exchange.enableRateLimit)
+        self.assertEqual([("https://fapi.binance.com/ok", 200, {"X-MBX-USED-WEIGHT-1M": "7"}),
+                          ("https://fapi.binance.com/limited", 429, {"Retry-After": "3"})], limits.updates)
+
+
+if __name__ == "__main__":
+    unittest.main()
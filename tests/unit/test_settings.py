@@ -0,0 +1,119 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from exchanges.settings import ENV_PREFIX, Settings, SettingsError, load_settings, validate
+
+
+class SettingsTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        environment = mock.patch.dict(os.environ)
+        environment.start()
+        self.addCleanup(environment.stop)
+        for name in [x for x in os.environ if x.startswith(ENV_PREFIX)]:
+            del os.environ[name]
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def config(self, text: str) -> str:
+        # Settings are cached per file, every test reads a file of its own
+        handle, path = tempfile.mkstemp(suffix=".yaml", dir=self.directory.name)
+        with os.fdopen(handle, "w") as stream:
+            stream.write(text)
+        return path
+
+    def test_defaults(self):
+        settings = load_settings(self.config(""))
+
+        self.assertFalse(settings.simulator.enabled)
+        self.assertEqual(0, settings["simulator"]["port"])
+        self.assertTrue(settings.rateLimit.enabled)
+        self.assertEqual((), settings.bybitApi.subAccounts)
+        self.assertEqual(os.path.join(self.directory.name, "timings"), settings.timing.path)
+
+    def test_read_once(self):
+        path = self.config("simulator:\n  port: 1234\n")
+
+        self.assertIs(load_settings(path), load_settings(path))
+
+    def test_read_only(self):
+        settings = load_settings(self.config(""))
+
+        with self.assertRaises(AttributeError):
+            settings.simulator = None
+        with self.assertRaises(TypeError):
+            settings["simulator"] = None
+        self.assertEqual(4321, settings.replace({"simulator": {"port": 4321}}).simulator.port)
+        self.assertEqual(0, settings.simulator.port)
+
+    def test_every_problem_is_reported(self):
+        path = self.config("simulator:\n  enabled: yes please\n  port: 70000\n"
+                           "profiling:\n  mode: trace\ntimng:\n  enabled: True\n"
+                           "binanceApi:\n  apiKey: key\n  url: fapi.binance.com\n")
+
+        with self.assertRaises(SettingsError) as context:
+            load_settings(path)
+        message = str(context.exception)
+        self.assertIn("simulator.enabled must be True or False", message)
+        self.assertIn("simulator.port must be at most 65535", message)
+        self.assertIn("profiling.mode must be one of sample, cprofile", message)
+        self.assertIn("timng is not a known setting, did you mean timing?", message)
+        self.assertIn("binanceApi: apiKey and secretKey must be set together", message)
+        self.assertIn("binanceApi.url must be an absolute URL", message)
+
+    def test_sub_accounts(self):
+        settings = validate({"bybitApi": {"subAccounts": [{"apiKey": 123, "secretKey": "a"}]}}, "/")
+
+        self.assertIsInstance(settings.bybitApi.subAccounts[0], Settings)
+        self.assertEqual("123", settings.bybitApi.subAccounts[0].apiKey)
+        with self.assertRaises(SettingsError):
+            validate({"bybitApi": {"subAccounts": [{"apiKey": "a", "secretKey": "b"},
+                                                   {"apiKey": "a", "secretKey": "c"}]}}, "/")
+
+    def test_environment_overrides_are_read_as_yaml(self):
+        os.environ["CRYPTO_TESTS_SIMULATOR_ENABLED"] = "True"
+        os.environ["CRYPTO_TESTS_SIMULATOR_PORT"] = "18765"
+        os.environ["CRYPTO_TESTS_SIMULATOR_LATENCY"] = "0.25"
+        os.environ["CRYPTO_TESTS_BYBITAPI_APIKEY"] = "0123"
+        os.environ["CRYPTO_TESTS_BYBITAPI_SECRETKEY"] = "secret"
+
+        settings = load_settings(self.config("simulator:\n  enabled: False\n  port: 1\n"))
+
+        self.assertIs(True, settings.simulator.enabled)
+        self.assertEqual(18765, settings.simulator.port)
+        self.assertEqual(0.25, settings.simulator.latency)
+        self.assertEqual("0123", settings.bybitApi.apiKey)
+
+    def test_environment_override_is_validated(self):
+        os.environ["CRYPTO_TESTS_SIMULATOR_PORT"] = "many"
+
+        with self.assertRaises(SettingsError) as context:
+            load_settings(self.config(""))
+        self.assertIn("simulator.port must be an integer, got 'many'", str(context.exception))
+
+    def test_overrides_win_over_environment(self):
+        os.environ["CRYPTO_TESTS_CASSETTE_MODE"] = "record"
+
+        settings = load_settings(self.config(""), {"cassette": {"mode": "replay"}})
+
+        self.assertEqual("replay", settings.cassette.mode)
+
+    def test_config_from_environment(self):
+        path = self.config("history:\n  path: runs/history.sqlite\n")
+        os.environ["CRYPTO_TESTS_CONFIG"] = path
+
+        settings = load_settings()
+
+        self.assertEqual(os.path.join(self.directory.name, "runs", "history.sqlite"), settings.history.path)
+
+    def test_missing_config(self):
+        with self.assertRaises(SettingsError):
+            load_settings(os.path.join(self.directory.name, "missing.yaml"))
+
+
+if __name__ == "__main__":
+    unittest.main()
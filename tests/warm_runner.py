@@ -0,0 +1,248 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "crypto-exchanges-tests-{}.sock".format(
+    os.getuid() if hasattr(os, "getuid") else "user"))
+
+
+class ModuleWatcher:
+    """
+    Remembers the modification times of the sources under `directories` and reports the ones changed since the last
+    check.
+    """
+
+    def __init__(self, directories: list) -> None:
+        self.directories = directories
+        self.mtimes = self._scan()
+
+    def changed(self) -> list:
+        mtimes = self._scan()
+        changed = [path for path, mtime in mtimes.items() if self.mtimes.get(path) != mtime]
+        self.mtimes = mtimes
+        return sorted(changed)
+
+    def _scan(self) -> dict:
+        mtimes = {}
+        for directory in self.directories:
+            for name in os.listdir(directory):
+                if name.endswith(".py"):
+                    path = os.path.join(directory, name)
+                    mtimes[path] = os.stat(path).st_mtime_ns
+        return mtimes
+
+
+class WarmRunner:
+    """
+    Runs tests on request inside one long-lived process, so the exchange clients with their loaded markets and
+    connection pools, the instrument registry and the simulator stay warm between runs.
+
+    Changed test modules, and every test module after a change of a helper module next to them (utils.py), are
+    reloaded before a run. The clients live in the exchanges package, which is never reloaded, so they survive the
+    reload. Changes of the exchanges package need a restart of the runner.
+    """
+
+    def __init__(self, start_dir: str, pattern: str = "test*.py") -> None:
+        self.start_dir = os.path.abspath(start_dir)
+        self.pattern = pattern
+        self.started = time.time()
+        self.runs = 0
+        self.watcher = ModuleWatcher([self.start_dir, os.path.join(ROOT, "exchanges")])
+        if self.start_dir not in sys.path:
+            sys.path.insert(0, self.start_dir)
+
+    def test_ids(self) -> list:
+        from tests.parallel import collect_groups
+
+        return [test_id for _, test_ids in collect_groups(self.start_dir, self.pattern) for test_id in test_ids]
+
+    def resolve(self, names: list) -> list:
+        """
+        Returns the ids of the tests named by `names`, each a test id or any dotted part of one: a module, a class
+        (BybitFuturesTest), a class and test (BybitFuturesTest.test_place_trailing_stop) or a test name.
+        """
+        test_ids = self.test_ids()
+        selected = []
+        for name in names:
+            matches = [x for x in test_ids if ".{}.".format(name) in ".{}.".format(x)]
+            if not matches:
+                raise ValueError("No test matches {}".format(name))
+            selected.extend(x for x in matches if x not in selected)
+        return selected
+
+    def reload(self) -> tuple:
+        """
+        Reloads the changed modules of the start directory, returns the reloaded module names and the changed files
+        which need a restart.
+        """
+        import importlib
+
+        changed = self.watcher.changed()
+        stale = [x for x in changed if os.path.dirname(x) != self.start_dir]
+        changed = [x for x in changed if os.path.dirname(x) == self.start_dir]
+        if not changed:
+            return [], stale
+
+        modules = [(name, module) for name, module in list(sys.modules.items())
+                   if os.path.dirname(os.path.abspath(getattr(module, "__file__", None) or "")) == self.start_dir]
+        helpers_changed = any(not os.path.basename(x).startswith("test") for x in changed)
+        reloaded = []
+        # Helpers first, the test modules import names from them
+        for name, module in sorted(modules, key=lambda x: os.path.basename(x[1].__file__).startswith("test")):
+            is_test = os.path.basename(module.__file__).startswith("test")
+            if os.path.abspath(module.__file__) in changed or (is_test and helpers_changed):
+                importlib.reload(module)
+                reloaded.append(name)
+        return reloaded, stale
+
+    def run(self, names: list, verbosity: int = 1) -> dict:
+        from tests.parallel import print_summary, run_group
+
+        reloaded, stale = self.reload()
+        test_ids = self.resolve(names)
+        result = run_group(self.start_dir, " ".join(names), test_ids, verbosity, release=False)
+        self.runs += 1
+
+        report = io.StringIO()
+        with contextlib.redirect_stdout(report):
+            print(result["output"])
+            successful = print_summary([result], result["duration"])
+        print("Ran {} tests of {} in {:.3f}s{}".format(result["tests_run"], " ".join(names), result["duration"],
+                                                       ", reloaded {}".format(", ".join(reloaded)) if reloaded else ""))
+        return {"ok": True, "successful": successful, "report": report.getvalue(), "reloaded": reloaded,
+                "restart": stale, "result": result}
+
+    def status(self) -> dict:
+        from exchanges.registry import get_registry
+
+        return {"ok": True, "pid": os.getpid(), "uptime": round(time.time() - self.started, 1), "runs": self.runs,
+                "clients": get_registry().keys(), "startDirectory": self.start_dir}
+
+
+def serve(address: str, start_dir: str, pattern: str) -> None:
+    if os.path.exists(address):
+        try:
+            request(address, {"command": "status"})
+            print("A runner already listens on {}".format(address))
+            sys.exit(1)
+        except OSError:
+            os.unlink(address)
+
+    runner = WarmRunner(start_dir, pattern)
+    print("Load {} tests".format(len(runner.test_ids())))
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(address)
+    server.listen()
+    print("Warm runner listening on {}".format(address))
+    try:
+        while True:
+            connection, _ = server.accept()
+            message = {}
+            with connection, connection.makefile("rwb") as stream:
+                line = stream.readline()
+                if not line:
+                    continue
+                try:
+                    message = json.loads(line)
+                    if not isinstance(message, dict):
+                        raise ValueError("a request is a JSON object")
+                except ValueError as e:
+                    # A bad request must not end the runner and its warm clients
+                    message = {}
+                    response = {"ok": False, "error": "Invalid request: {}".format(e)}
+                else:
+                    response = _handle(runner, message)
+                try:
+                    stream.write(json.dumps(response).encode("utf-8") + b"\n")
+                    stream.flush()
+                except OSError as e:
+                    print("Client went away before the response: {}".format(e))
+            if message.get("command") == "stop":
+                break
+    finally:
+        server.close()
+        os.unlink(address)
+    print("Warm runner stopped")
+
+
+def _handle(runner: WarmRunner, message: dict) -> dict:
+    command = message.get("command")
+    try:
+        if command == "run":
+            return runner.run(message.get("names") or [], message.get("verbosity", 1))
+        if command == "status":
+            return runner.status()
+        if command == "stop":
+            return {"ok": True}
+        return {"ok": False, "error": "Unknown command {}".format(command)}
+    except Exception as e:
+        return {"ok": False, "error": "{}: {}".format(type(e).__name__, e)}
+
+
+def request(address: str, message: dict) -> dict:
+    """
+    Sends one command to the runner listening on `address` and returns its response.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(address)
+        with connection.makefile("rwb") as stream:
+            stream.write(json.dumps(message).encode("utf-8") + b"\n")
+            stream.flush()
+            line = stream.readline()
+    if not line:
+        raise ConnectionError("The runner closed the connection")
+    return json.loads(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Keep the exchange clients warm in one process and run tests in it")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket of the runner")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="Start the runner in the foreground")
+    serve_parser.add_argument("-s", "--start-directory", default=os.path.join(ROOT, "tests", "integration"))
+    serve_parser.add_argument("-p", "--pattern", default="test*.py", help="Pattern to match tests")
+    run_parser = commands.add_parser("run", help="Run tests in the runner, e.g. BybitFuturesTest.test_get_btcusdt_info")
+    run_parser.add_argument("names", nargs="+", help="Test ids or any dotted part of them")
+    run_parser.add_argument("-v", "--verbose", action="store_const", const=2, default=1, help="Verbose output")
+    commands.add_parser("status", help="Show the uptime, runs and warm clients of the runner")
+    commands.add_parser("stop", help="Stop the runner")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.socket, args.start_directory, args.pattern)
+        return
+
+    message = {"command": args.command}
+    if args.command == "run":
+        message.update(names=args.names, verbosity=args.verbose)
+    try:
+        response = request(args.socket, message)
+    except OSError as e:
+        print("No runner on {} ({}), start one with: python -m tests.warm_runner serve".format(args.socket, e))
+        sys.exit(2)
+
+    if not response.get("ok"):
+        print(response.get("error"))
+        sys.exit(1)
+    if args.command == "run":
+        if response["reloaded"]:
+            print("Reloaded {}".format(", ".join(response["reloaded"])))
+        if response["restart"]:
+            print("Restart the runner to load the changes of {}".format(", ".join(response["restart"])))
+        print(response["report"], end="")
+        sys.exit(0 if response["successful"] else 1)
+    if args.command == "stop":
+        print("Warm runner on {} stopped".format(args.socket))
+        return
+    print(json.dumps({x: y for x, y in response.items() if x != "ok"}, indent=2))
+
+
+if __name__ == "__main__":
+    main()